@@ -1,8 +1,10 @@
 import streamlit as st
+from contextlib import closing
 from rag_backend import get_rag_backend
 import os
 import time
 import random
+import uuid
 
 st.set_page_config(
     page_title="TrustTroiAI",
@@ -406,6 +408,10 @@ if not check_password():
 if "current_page" not in st.session_state:
     st.session_state.current_page = None
 
+# ✅ Eigene Konversation pro Browser-Session (Backend ist geteilt)
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 def switch_page(page_name):
     st.session_state.current_page = page_name
     st.rerun()
@@ -552,7 +558,7 @@ def show_sidebar(current_page="assistant"):
             with col1:
                 if st.button("🆕 Neu", use_container_width=True, key="new_conv"):
                     if 'backend' in st.session_state and st.session_state.backend:
-                        st.session_state.backend.clear_memory()
+                        st.session_state.backend.clear_memory(st.session_state.session_id)
                         st.session_state.messages = []
                         st.success("✅")
                         st.rerun()
@@ -560,7 +566,9 @@ def show_sidebar(current_page="assistant"):
             with col2:
                 if st.button("📊 Stats", use_container_width=True, key="stats"):
                     if 'backend' in st.session_state and st.session_state.backend:
-                        stats = st.session_state.backend.get_memory_stats()
+                        stats = st.session_state.backend.get_memory_stats(st.session_state.session_id)
+                        stats['answer_cache'] = st.session_state.backend.get_answer_cache_stats()
+                        stats['context_tokens'] = st.session_state.backend.get_context_stats()
                         st.json(stats)
             
             # ✅ VERSION-ANZEIGE 
@@ -637,18 +645,8 @@ def show_assistant_page():
             with col:
                 if st.button(suggestion["question"], key=f"card_{hash(suggestion['question'])}", use_container_width=True):
                     st.session_state.messages.append({"role": "user", "content": suggestion["question"]})
-                    
-                    with st.spinner("Recherchiere..."):
-                        try:
-                            response = backend.query(question=suggestion["question"], filter_law=filter_law, show_sources=show_sources)
-                            st.session_state.messages.append({
-                                "role": "assistant",
-                                "content": response['answer'],
-                                "sources": response.get('sources', [])
-                            })
-                        except Exception as e:
-                            st.error(f"❌ {e}")
-                    
+                    # ✅ Antwort wird nach dem Rerun im Chat gestreamt
+                    st.session_state.pending_question = suggestion["question"]
                     st.rerun()
     
     for message in st.session_state.messages:
@@ -663,32 +661,50 @@ def show_assistant_page():
                         st.markdown(f"**{i}. {law} - {artikel}**")
                         st.caption(f"_{source.page_content[:200]}..._")
     
+    question = st.session_state.pop("pending_question", None)
+    
     if prompt := st.chat_input("Ihre Frage zur KI-VO oder DSGVO..."):
         st.session_state.messages.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
-        
+        question = prompt
+    
+    if question:
         with st.chat_message("assistant"):
-            with st.spinner("Recherchiere..."):
-                try:
-                    response = backend.query(question=prompt, filter_law=filter_law, show_sources=show_sources)
-                    st.markdown(response['answer'])
-                    
-                    if response.get('sources') and show_sources:
-                        with st.expander("📚 Quellen"):
-                            for i, source in enumerate(response['sources'][:3], 1):
-                                law = source.metadata.get('source_law', 'N/A')
-                                artikel = source.metadata.get('artikel', source.metadata.get('source_type', 'N/A'))
-                                st.markdown(f"**{i}. {law} - {artikel}**")
-                                st.caption(f"_{source.page_content[:200]}..._")
-                    
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response['answer'],
-                        "sources": response.get('sources', [])
-                    })
-                except Exception as e:
-                    st.error(f"❌ {e}")
+            placeholder = st.empty()
+            placeholder.markdown("_Recherchiere..._")
+            
+            try:
+                # ✅ Token-Streaming: Antwort wächst, während das LLM generiert
+                answer = ""
+                response = {}
+                # closing(): bei Rerun/Stop/Navigation bricht Streamlit die Schleife ab → LLM-Slot sofort frei
+                with closing(backend.stream_query(question=question, filter_law=filter_law, show_sources=show_sources, session_id=st.session_state.session_id)) as events:
+                    for event in events:
+                        if event['type'] == 'token':
+                            answer += event['content']
+                            placeholder.markdown(answer + "▌")
+                        else:
+                            response = event
+                
+                placeholder.markdown(response['answer'])
+                st.caption(f"⏱️ Erste Antwort nach {response['time_to_first_token']:.1f}s · gesamt {response['total_latency']:.1f}s")
+                
+                if response.get('sources') and show_sources:
+                    with st.expander("📚 Quellen"):
+                        for i, source in enumerate(response['sources'][:3], 1):
+                            law = source.metadata.get('source_law', 'N/A')
+                            artikel = source.metadata.get('artikel', source.metadata.get('source_type', 'N/A'))
+                            st.markdown(f"**{i}. {law} - {artikel}**")
+                            st.caption(f"_{source.page_content[:200]}..._")
+                
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": response['answer'],
+                    "sources": response.get('sources', [])
+                })
+            except Exception as e:
+                st.error(f"❌ {e}")
     
     st.markdown("<br><br>", unsafe_allow_html=True)
     st.markdown('<div class="disclaimer">⚠️ TrustTroiAI dient ausschließlich Informationszwecken und ersetzt keine Rechtsberatung.</div>', unsafe_allow_html=True)
@@ -0,0 +1,3 @@
+"""
+Offline-Werkzeuge für TrustTroiAI (Fakes, Benchmarks)
+"""
@@ -0,0 +1,78 @@
+"""
+Durchsatz-Benchmark: RAGBackend.aquery (Event-Loop) vs. RAGBackend.query (Threads)
+
+Fake-LLM mit künstlicher Latenz. Erwartung: Async-Durchsatz skaliert mit der
+Anzahl gleichzeitiger Anfragen, Thread-Durchsatz mit der Anzahl Threads.
+
+Aufruf:
+    python -m benchmarks.bench_async --llm-latency 0.1 --concurrency 1 8 32 128
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import time
+
+from benchmarks.offline import build_offline_backend
+
+QUERIES = [
+    "Was bedeutet KI-System?",
+    "Was regelt Artikel 6 DSGVO?",
+    "Welche Pflichten haben Anbieter von Hochrisiko-KI-Systemen?",
+    "Was steht in Erwägungsgrund 47 der DSGVO?",
+]
+
+
+async def run_async(backend, total: int, concurrency: int) -> float:
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with slots:
+            await backend.aquery(QUERIES[i % len(QUERIES)], session_id=f"async-{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+def run_threads(backend, total: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(
+            lambda i: backend.query(QUERIES[i % len(QUERIES)], session_id=f"thread-{i}"),
+            range(total)
+        ))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--threads", type=int, default=8, help="Thread-Pool-Größe für den Sync-Vergleich")
+    parser.add_argument("--requests-per-level", type=int, default=4, help="Anfragen = Concurrency × Faktor")
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    backend, _ = build_offline_backend(
+        cache_dir=args.cache_dir,
+        llm_latency=args.llm_latency,
+        max_concurrent_llm_calls=max(args.concurrency),
+        # Gemessen wird der LLM-Pfad, nicht der Antwort-Cache
+        answer_cache_size=0
+    )
+
+    print(f"\n{'Modus':<22}{'Parallel':>10}{'Anfragen':>10}{'Zeit [s]':>10}{'Anfr./s':>10}")
+    for concurrency in args.concurrency:
+        total = concurrency * args.requests_per_level
+        elapsed = asyncio.run(run_async(backend, total, concurrency))
+        print(f"{'aquery (1 Loop)':<22}{concurrency:>10}{total:>10}{elapsed:>10.2f}{total / elapsed:>10.1f}")
+
+    for concurrency in args.concurrency:
+        total = concurrency * args.requests_per_level
+        elapsed = run_threads(backend, total, args.threads)
+        print(f"{f'query ({args.threads} Threads)':<22}{concurrency:>10}{total:>10}{elapsed:>10.2f}{total / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
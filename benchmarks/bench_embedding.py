@@ -0,0 +1,64 @@
+"""
+Embedding-Benchmark: BatchEmbedder über die echten Korpus-Chunks
+
+Fake-Embeddings mit künstlicher Latenz (pro Request + pro Text) und einem Anteil
+von HTTP-429-Antworten. Erwartung: Wall-Time sinkt mit der Concurrency, alle
+Rate-Limits werden per Retry aufgefangen, Vektoren sind identisch zur seriellen
+Referenz.
+
+Aufruf:
+    python -m benchmarks.bench_embedding --concurrency 1 2 4 8 --rate-limit-rate 0.1
+"""
+
+import argparse
+import logging
+import time
+
+from rag_backend import BatchEmbedder
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.offline import build_offline_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.2, help="Sekunden pro Request")
+    parser.add_argument("--latency-per-text", type=float, default=0.005, help="Sekunden pro Text im Batch")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.1, help="Anteil der Requests mit HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--max-batch-tokens", type=int, default=8000)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    backend, _ = build_offline_backend(cache_dir=args.cache_dir)
+    texts = [chunk.page_content for chunk in backend.all_chunks]
+    reference = FakeEmbeddings().embed_documents(texts)
+
+    # Retry-Warnungen würden die Tabelle zerreißen
+    logging.getLogger("rag_backend").setLevel(logging.ERROR)
+
+    print(f"\n{len(texts)} Chunks, Latenz {args.latency}s + {args.latency_per_text}s/Text, "
+          f"{args.rate_limit_rate:.0%} Rate-Limits")
+    print(f"{'Parallel':>10}{'Batches':>10}{'429':>8}{'Retries':>10}{'Peak':>8}{'Zeit [s]':>10}{'Texte/s':>10}{'Identisch':>12}")
+
+    for concurrency in args.concurrency:
+        embeddings = FakeEmbeddings(
+            latency=args.latency,
+            latency_per_text=args.latency_per_text,
+            rate_limit_rate=args.rate_limit_rate,
+            retry_after=args.retry_after
+        )
+        batcher = BatchEmbedder(embeddings, max_batch_tokens=args.max_batch_tokens, max_concurrency=concurrency)
+
+        start = time.perf_counter()
+        vectors = batcher.embed(texts)
+        elapsed = time.perf_counter() - start
+
+        stats = batcher.get_stats()
+        print(f"{concurrency:>10}{stats['batches']:>10}{embeddings.rate_limited:>8}{stats['retries']:>10}"
+              f"{embeddings.peak_in_flight:>8}{elapsed:>10.2f}{len(texts) / elapsed:>10.1f}"
+              f"{'ja' if vectors == reference else 'NEIN':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Ingestion-Benchmark: RAGBackend._load_all_documents mit 1..N Worker-Prozessen
+
+Misst nur Parsing + Splitting der Korpora (kein Embedding). Erwartung: Wall-Time
+sinkt mit der Anzahl Kerne bis zur Dauer des größten Dokuments.
+
+Aufruf:
+    python -m benchmarks.bench_ingest --workers 1 2 4 7
+"""
+
+import argparse
+import os
+import time
+
+from rag_backend import RAGBackend
+from benchmarks.offline import DOCUMENT_PATHS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 7])
+    args = parser.parse_args()
+
+    reference = None
+    rows = []
+
+    for workers in args.workers:
+        backend = RAGBackend("offline", ingest_workers=workers)
+        start = time.perf_counter()
+        chunks = backend._load_all_documents(DOCUMENT_PATHS)
+        elapsed = time.perf_counter() - start
+
+        signature = [(chunk.page_content, chunk.metadata) for chunk in chunks]
+        if reference is None:
+            reference = signature
+        rows.append((workers, len(chunks), elapsed, signature == reference))
+
+    print(f"\nCPU-Kerne: {os.cpu_count()}")
+    print(f"{'Prozesse':>10}{'Chunks':>10}{'Zeit [s]':>10}{'Speedup':>10}{'Identisch':>12}")
+    for workers, count, elapsed, identical in rows:
+        print(f"{workers:>10}{count:>10}{elapsed:>10.2f}{rows[0][2] / elapsed:>10.2f}{'ja' if identical else 'NEIN':>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+End-to-End-Benchmark der Triple Pipeline (Fake-LLM + Fake-Embeddings, echte Korpora)
+
+Baut RAGBackend aus data/*.docx (Snapshot oder mit --cold komplett neu), spielt das
+Query-Log (Definitionen, Artikel/EWG/Anhang-Referenzen, freie Fragen) mit 1..N
+parallelen Clients ab und misst:
+- Setup-Zeit
+- Latenz-Perzentile pro Pipeline und Stufe (aus dem Request-Trace)
+- Durchsatz pro Client-Zahl
+- Peak-RSS des Prozesses
+
+Ergebnisse landen als JSON in benchmarks/results/ (Dateiname mit Git-Revision);
+mit --compare wird gegen ein früheres Ergebnis verglichen.
+
+Aufruf:
+    python -m benchmarks.bench_pipeline --clients 1 4 16 --llm-latency 0.05
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/pipeline-abc1234.json
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_routing import DEFAULT_QUERY_LOG, REPO_DIR, load_queries
+from benchmarks.offline import build_offline_backend
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: Linux in KiB, macOS in Bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_level(backend, queries, clients: int, rounds: int) -> dict:
+    """Alle Queries rounds-mal mit `clients` parallelen Threads, jede Anfrage in eigener Session"""
+    jobs = [(i, query) for i, query in enumerate(queries * rounds)]
+
+    def run_one(job):
+        i, query = job
+        return backend.query(query, session_id=f"bench-{clients}-{i}")['pipeline_used']
+
+    backend.latency.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        pipelines = list(pool.map(run_one, jobs))
+    elapsed = time.perf_counter() - start
+
+    stats = backend.get_latency_stats()
+    return {
+        'clients': clients,
+        'requests': len(jobs),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(jobs) / elapsed, 2),
+        'pipelines': {
+            pipeline: {
+                'count': pipelines.count(pipeline),
+                **{
+                    stage: {key: value for key, value in series.items() if key != 'buckets'}
+                    for stage, series in stats.get(pipeline, {}).items()
+                }
+            }
+            for pipeline in sorted(set(pipelines))
+        }
+    }
+
+
+def print_level(level: dict):
+    print(f"\n👥 {level['clients']} Clients: {level['requests']} Anfragen in {level['seconds']:.2f}s "
+          f"({level['throughput']:.1f} Anfragen/s)")
+    print(f"   {'Pipeline':<34}{'Anzahl':>8}{'p50 [ms]':>10}{'p95 [ms]':>10}{'p99 [ms]':>10}  Langsamste Stufe (p95)")
+    for pipeline, stats in level['pipelines'].items():
+        total = stats.get('total')
+        if total is None:
+            continue
+        stages = {name: series for name, series in stats.items() if name not in ('count', 'total')}
+        slowest = max(stages, key=lambda name: stages[name]['p95_ms']) if stages else '-'
+        slowest_ms = f" {stages[slowest]['p95_ms']:.1f}ms" if stages else ''
+        print(f"   {pipeline:<34}{stats['count']:>8}{total['p50_ms']:>10.1f}{total['p95_ms']:>10.1f}"
+              f"{total['p99_ms']:>10.1f}  {slowest}{slowest_ms}")
+
+
+def print_comparison(baseline: dict, result: dict):
+    print(f"\n📈 Vergleich mit {baseline['revision']} ({baseline['timestamp']})")
+    print(f"   Setup: {baseline['setup']['seconds']:.2f}s → {result['setup']['seconds']:.2f}s, "
+          f"Peak-RSS: {baseline['peak_rss_mb']:.0f} → {result['peak_rss_mb']:.0f} MB")
+
+    previous = {level['clients']: level for level in baseline['levels']}
+    for level in result['levels']:
+        before = previous.get(level['clients'])
+        if before is None:
+            continue
+        print(f"   {level['clients']:>3} Clients: {before['throughput']:.1f} → {level['throughput']:.1f} Anfragen/s "
+              f"({level['throughput'] / before['throughput'] - 1:+.0%})")
+        for pipeline, stats in level['pipelines'].items():
+            old = before['pipelines'].get(pipeline, {}).get('total')
+            if old and 'total' in stats:
+                print(f"       {pipeline:<34} p95 {old['p95_ms']:>8.1f} → {stats['total']['p95_ms']:>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERY_LOG)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=1, help="Durchläufe des Query-Logs pro Client-Zahl")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Sekunden bis zur Antwort des Fake-LLM")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Sekunden pro Embedding-Call")
+    parser.add_argument("--max-llm-calls", type=int, default=8)
+    parser.add_argument("--answer-cache", action="store_true", help="Antwort-Caches aktiv lassen (Default: aus)")
+    parser.add_argument("--cold", action="store_true", help="Setup ohne Snapshot in frischem Cache-Verzeichnis")
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--output", default=None, help="JSON-Datei (Default: benchmarks/results/pipeline-<rev>.json)")
+    parser.add_argument("--compare", default=None, help="Früheres JSON-Ergebnis zum Vergleich")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    revision = git_revision()
+
+    with tempfile.TemporaryDirectory() as cold_dir:
+        start = time.perf_counter()
+        backend, llm = build_offline_backend(
+            cache_dir=cold_dir if args.cold else args.cache_dir,
+            llm_latency=args.llm_latency,
+            embedding_latency=args.embedding_latency,
+            max_concurrent_llm_calls=args.max_llm_calls,
+            use_snapshot=not args.cold,
+            answer_cache_size=512 if args.answer_cache else 0
+        )
+        setup_seconds = time.perf_counter() - start
+
+        # Pro-Anfrage-Logs (inkl. Fallback-Warnungen) würden die Ausgabe zerreißen
+        logging.getLogger("rag_backend").setLevel(logging.ERROR)
+
+        print(f"\n🏗️ Setup ({'cold' if args.cold else 'snapshot'}): {setup_seconds:.2f}s, "
+              f"{len(backend.all_chunks)} Chunks | {len(queries)} Queries, Fake-LLM {args.llm_latency * 1000:.0f}ms")
+
+        levels = []
+        for clients in args.clients:
+            level = run_level(backend, queries, clients, args.rounds)
+            levels.append(level)
+            print_level(level)
+
+    result = {
+        'revision': revision,
+        'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'config': vars(args),
+        'setup': {
+            'mode': 'cold' if args.cold else 'snapshot',
+            'seconds': round(setup_seconds, 3),
+            'chunks': len(backend.all_chunks)
+        },
+        'levels': levels,
+        'llm': llm.get_stats(),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+    print(f"\n💾 Peak-RSS: {result['peak_rss_mb']:.0f} MB | LLM-Calls: {result['llm']['calls']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f"📄 Ergebnis: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Rerank-Benchmark: Over-Fetch + Reranking der Semantic-Pipeline über das Query-Log
+
+Misst pro Kandidatenzahl die Latenz der Rerank-Stufe (Scorer + Auswahl, ohne
+Embedding/Qdrant), die geschätzten Kontext-Tokens der Top-k und wie stark sich
+die Top-k gegenüber dem Retrieval ohne Reranking ändern. Damit lässt sich die
+Kandidatenzahl gegen Latenz (und mit einem Gold-Set gegen Qualität) abwägen.
+
+Aufruf:
+    python -m benchmarks.bench_rerank --candidates 10 20 30 50
+"""
+
+import argparse
+import logging
+import statistics
+
+from rag_backend import LexicalScorer, Reranker, estimate_tokens
+from benchmarks.bench_routing import DEFAULT_QUERY_LOG, load_queries
+from benchmarks.offline import build_offline_backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERY_LOG)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 30, 50])
+    parser.add_argument("--max-tokens", type=int, default=6000)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    backend, _ = build_offline_backend(cache_dir=args.cache_dir)
+    retriever = backend.triple_pipeline.retriever
+    vectors = backend.embeddings.embed_documents(queries)
+
+    # Pro-Aufruf-Logs würden die Tabelle zerreißen
+    logging.getLogger("rag_backend").setLevel(logging.WARNING)
+
+    retriever.reranker = None
+    reference = [retriever.retrieve(query, vector) for query, vector in zip(queries, vectors)]
+    reference_tokens = [sum(estimate_tokens(doc.page_content) for doc in docs) for docs in reference]
+
+    print(f"\n{len(queries)} Queries, Top-{retriever.k}, Token-Budget {args.max_tokens}")
+    print(f"{'Kandidaten':>12}{'Mittel [ms]':>14}{'p50 [ms]':>12}{'p95 [ms]':>12}{'Tokens':>10}{'Top-k neu':>12}")
+    print(f"{'ohne':>12}{'-':>14}{'-':>12}{'-':>12}{statistics.mean(reference_tokens):>10.0f}{'-':>12}")
+
+    for candidates in args.candidates:
+        # Aufwärmen: Token-Statistik der Chunks liegt danach im Cache (wie im laufenden Betrieb)
+        retriever.reranker = Reranker(LexicalScorer(retriever.sparse_index), candidates=candidates)
+        for query, vector in zip(queries, vectors):
+            retriever.retrieve(query, vector)
+
+        reranker = Reranker(LexicalScorer(retriever.sparse_index), candidates=candidates, max_tokens=args.max_tokens)
+        retriever.reranker = reranker
+        tokens = []
+        changed = 0
+        for query, vector, before in zip(queries, vectors, reference):
+            docs = retriever.retrieve(query, vector)
+            tokens.append(sum(estimate_tokens(doc.page_content) for doc in docs))
+            before_contents = {doc.page_content for doc in before}
+            changed += sum(doc.page_content not in before_contents for doc in docs)
+
+        stats = reranker.get_stats()
+        print(f"{candidates:>12}{stats['latency_ms_mean']:>14.2f}{stats['latency_ms_p50']:>12.2f}"
+              f"{stats['latency_ms_p95']:>12.2f}{statistics.mean(tokens):>10.0f}"
+              f"{changed / (len(queries) * retriever.k):>12.0%}")
+
+if __name__ == "__main__":
+    main()
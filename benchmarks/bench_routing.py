@@ -0,0 +1,123 @@
+"""
+Routing-Benchmark: AdvancedQueryRouter.analyze_query über ein realistisches Query-Log
+
+Misst die reinen CPU-Kosten pro Query (Preprocessing + Pattern-Matching, ohne
+LLM/Embeddings). Mit --baseline wird zusätzlich der Router aus einer früheren
+Git-Revision geladen, gegen dieselben Queries gemessen und auf identische
+Routing-Ergebnisse geprüft (Pipeline, Referenzen, normalisierte Query, Confidence).
+
+Aufruf:
+    python -m benchmarks.bench_routing
+    python -m benchmarks.bench_routing --baseline HEAD~1 --repeat 500
+"""
+
+import argparse
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import rag_backend
+from benchmarks.offline import build_offline_backend
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_QUERY_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "query_log.txt")
+
+
+def load_queries(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def load_baseline(rev: str):
+    """Lade rag_backend.py aus einer Git-Revision als eigenes Modul"""
+    source = subprocess.run(
+        ["git", "show", f"{rev}:rag_backend.py"],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    ).stdout
+
+    name = "rag_backend_baseline"
+    module = importlib.util.module_from_spec(importlib.util.spec_from_loader(name, loader=None))
+    sys.modules[name] = module
+    exec(compile(source, f"{rev}:rag_backend.py", "exec"), module.__dict__)
+    return module
+
+
+def signature(analysis):
+    return (
+        analysis.pipeline_type.value,
+        analysis.extracted_references,
+        analysis.normalized_query,
+        analysis.confidence
+    )
+
+
+def measure(router, queries, repeat: int):
+    """Mittlere Zeit pro analyze_query je Query in µs"""
+    for query in queries:
+        router.analyze_query(query)
+
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            router.analyze_query(query)
+        timings.append((time.perf_counter() - start) / repeat * 1e6)
+    return timings
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERY_LOG)
+    parser.add_argument("--repeat", type=int, default=200, help="Wiederholungen pro Query")
+    parser.add_argument("--baseline", default=None, help="Git-Revision für den Vorher-Vergleich")
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    backend, _ = build_offline_backend(cache_dir=args.cache_dir)
+    terms_ki_vo = list(backend.triple_pipeline.router.defined_terms_ki_vo)
+    terms_dsgvo = list(backend.triple_pipeline.router.defined_terms_dsgvo)
+
+    routers = [("aktuell", rag_backend.AdvancedQueryRouter(terms_ki_vo, terms_dsgvo))]
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        routers.insert(0, (args.baseline, baseline.AdvancedQueryRouter(terms_ki_vo, terms_dsgvo)))
+
+    print(f"\n{len(queries)} Queries, {args.repeat} Wiederholungen, "
+          f"{len(terms_ki_vo)} + {len(terms_dsgvo)} definierte Begriffe")
+    print(f"{'Router':>12}{'Mittel [µs]':>14}{'p50 [µs]':>12}{'p95 [µs]':>12}{'Max [µs]':>12}{'Speedup':>10}")
+
+    results = []
+    for label, router in routers:
+        timings = measure(router, queries, args.repeat)
+        results.append((label, router, timings))
+
+    reference_mean = statistics.mean(results[0][2])
+    for label, _, timings in results:
+        mean = statistics.mean(timings)
+        print(f"{label:>12}{mean:>14.1f}{percentile(timings, 0.5):>12.1f}{percentile(timings, 0.95):>12.1f}"
+              f"{max(timings):>12.1f}{reference_mean / mean:>10.2f}")
+
+    if args.baseline:
+        baseline_router, current_router = results[0][1], results[1][1]
+        mismatches = [
+            query for query in queries
+            if signature(baseline_router.analyze_query(query)) != signature(current_router.analyze_query(query))
+        ]
+        print(f"\nIdentische Routing-Ergebnisse: {len(queries) - len(mismatches)}/{len(queries)}")
+        for query in mismatches:
+            print(f"   ❌ {query}")
+            print(f"      vorher:  {signature(baseline_router.analyze_query(query))}")
+            print(f"      aktuell: {signature(current_router.analyze_query(query))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Prüfung der Antwort-Caches (exakter Cache + Ähnlichkeits-Cache) mit Fake-Modellen
+
+Jede Frage kommt aus einer eigenen Session. Geprüft wird:
+- Umformulierte Fragen treffen: "Was bedeutet KI-System?" → "Definition von KI-System laut KI-VO",
+  Semantic-Fragen mit anderer Wortstellung/Stoppwörtern (Ähnlichkeits-Cache)
+- Fragen mit anderem Namen oder anderer Firma treffen NIE die Antwort einer anderen Session
+- Definitions- und Keyword-Anfragen lösen keinen Query-Embedding-Call aus
+- Chat-Verlauf (eine Session mit wachsender Historie): eigenständige Definitions-/Keyword-Fragen
+  treffen weiterhin, Folgefragen mit Kontext-Bezug umgehen den Cache; Trefferquote wird ausgegeben
+
+Aufruf:
+    python -m benchmarks.check_answer_cache
+"""
+
+import argparse
+import logging
+import sys
+
+from benchmarks.offline import build_offline_backend
+
+# (Frage, Cache-Treffer erwartet?) - in dieser Reihenfolge, jede Frage in eigener Session
+CASES = [
+    ("Was bedeutet KI-System?", False),
+    ("Definition von KI-System laut KI-VO", True),
+    ("Was ist ein KI-System?", True),
+    ("Was ist ein KI-System laut Acme GmbH?", False),
+    ("Welche Pflichten haben Anbieter von Hochrisiko-KI-Systemen?", False),
+    ("Welche Pflichten haben die Anbieter von Hochrisiko-KI-Systemen", True),
+    ("Welche Pflichten hat die Müller AG als Anbieter von Hochrisiko-KI-Systemen?", False),
+    ("Welche Pflichten hat die Schmidt GmbH als Anbieter von Hochrisiko-KI-Systemen?", False),
+]
+
+# Pipelines ohne Vektor-Retrieval → kein Query-Embedding
+NO_EMBEDDING_QUERIES = [
+    "Was regelt Artikel 6 DSGVO?",
+    "Was bedeutet Einwilligung laut DSGVO?",
+]
+
+# Eine Session, Fragen in dieser Reihenfolge (Historie wächst) - (Frage, Cache-Treffer erwartet?)
+# Kurze Fragen (< 5 Wörter) gelten mit Historie als Folgefrage → Condense, daher ausformuliert
+CHAT_FLOW = [
+    ("Welche Risiken birgt eine automatisierte Bewerberauswahl?", False),
+    ("Definition von KI-System laut KI-VO", True),
+    ("Was regelt Artikel 6 DSGVO?", True),
+    ("Und was gilt zusätzlich?", False),
+    ("Was bedeutet Einwilligung laut DSGVO?", True),
+    ("Welche Pflichten haben Anbieter von Hochrisiko-KI-Systemen?", True),
+]
+
+
+def run_cases(backend, cases, session_id=None) -> list:
+    errors = []
+    for i, (question, expect_hit) in enumerate(cases):
+        response = backend.query(question, session_id=session_id or f"cache-check-{i}")
+        ok = response['cache_hit'] == expect_hit
+        print(f"{'✅' if ok else '❌'} {'Treffer' if response['cache_hit'] else 'neu    '}  {question}")
+        if not ok:
+            errors.append(f"{question}: Treffer {response['cache_hit']}, erwartet {expect_hit}")
+    return errors
+
+
+def cache_hits(backend) -> int:
+    """Treffer beider Cache-Stufen"""
+    stats = backend.get_answer_cache_stats()
+    return stats['hits'] + stats.get('similar', {}).get('hits', 0)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    backend, _ = build_offline_backend(cache_dir=args.cache_dir)
+    logging.getLogger("rag_backend").setLevel(logging.WARNING)
+    fake_embeddings = backend.triple_pipeline.embeddings.embeddings
+
+    print("\n🔁 Umformulierungen und fremde Namen/Firmen (je eigene Session):")
+    errors = run_cases(backend, CASES)
+
+    print("\n🧮 Query-Embeddings ohne Vektor-Retrieval:")
+    for i, question in enumerate(NO_EMBEDDING_QUERIES):
+        calls = fake_embeddings.calls
+        response = backend.query(question, session_id=f"embedding-check-{i}")
+        extra = fake_embeddings.calls - calls
+        print(f"{'✅' if extra == 0 else '❌'} {extra} Query-Embeddings  {question} ({response['pipeline_used']})")
+        if extra:
+            errors.append(f"{question}: {extra} Query-Embedding-Calls ohne Vektor-Retrieval")
+
+    print("\n💬 Chat-Verlauf (eine Session, Historie wächst):")
+    hits_before = cache_hits(backend)
+    errors += run_cases(backend, CHAT_FLOW, session_id="chat-check")
+    hits = cache_hits(backend) - hits_before
+    print(f"   Trefferquote im Chat-Verlauf: {hits}/{len(CHAT_FLOW)}")
+
+    if errors:
+        print(f"\n❌ {len(errors)} Fehler:")
+        for error in errors:
+            print(f"   {error}")
+        return 1
+
+    print("\n✅ Antwort-Caches verhalten sich wie erwartet")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
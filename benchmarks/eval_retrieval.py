@@ -0,0 +1,218 @@
+"""
+Retrieval-Evaluation: Recall@k, MRR und Latenz pro Retriever gegen ein Gold-Set
+
+benchmarks/data/retrieval_gold.jsonl ordnet jeder Frage die erwarteten Chunks zu,
+beschrieben über ihre Identität statt über Chunk-Texte:
+    {"law": "DSGVO", "artikel": "6"}, {"law": "KI-Verordnung", "erwägungsgrund": "47"},
+    {"law": "KI-Verordnung", "anhang": "3"}, {"law": "DSGVO", "begriff": "einwilligung"}
+Relevant sind alle Chunks mit einer dieser Identitäten (Metadata-Index bzw. Term-Index).
+Optional "filter_law" simuliert den Gesetzesfilter der UI.
+
+Bewertet werden die Retriever einzeln, jeweils mit den Eingaben der Pipeline:
+- keyword:     KeywordMetadataRetriever mit den Referenzen des Routers (Keyword-Queries)
+- definitions: DefinitionsRetriever mit Term + Gesetz des Routers (Definitions-Queries)
+- vektor / hybrid / hybrid+rerank: HybridRetriever ohne BM25, mit BM25, mit BM25 + Reranker (alle Queries)
+Top-k für kleinere k sind die Präfixe der Top-max(k). Markiert (*) ist das im Code genutzte k.
+
+Offline mit Fake-Embeddings (Default) oder mit echten Mistral-Embeddings aus dem Disk-Cache
+(--mistral-api-key): Chunk- und Query-Vektoren landen im Embedding-Cache, Folgeläufe
+brauchen keine API-Calls mehr.
+
+Aufruf:
+    python -m benchmarks.eval_retrieval --k 1 2 3 5 10
+    python -m benchmarks.eval_retrieval --mistral-api-key $MISTRAL_API_KEY --cache-dir .cache
+"""
+
+from collections import defaultdict
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+
+from rag_backend import HybridRetriever, PipelineType, RAGBackend
+from benchmarks.bench_routing import percentile
+from benchmarks.offline import DOCUMENT_PATHS, build_offline_backend
+
+DEFAULT_GOLD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "retrieval_gold.jsonl")
+
+IDENTITY_KINDS = ('artikel', 'erwägungsgrund', 'anhang', 'begriff')
+
+# k wie in TriplePipelineManager / RAGBackend._create_triple_pipeline
+PIPELINE_K = {'keyword': 5, 'definitions': 2, 'vektor': 3, 'hybrid': 3, 'hybrid+rerank': 3}
+
+DEFINITION_PIPELINES = (
+    PipelineType.DEFINITIONS_KI_VO, PipelineType.DEFINITIONS_DSGVO, PipelineType.DEFINITIONS_GENERIC
+)
+
+
+def load_gold(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip() and not line.startswith("#")]
+
+
+def identity(expected: dict):
+    kind = next((kind for kind in IDENTITY_KINDS if kind in expected), None)
+    if kind is None:
+        raise ValueError(f"Gold-Eintrag ohne Identität: {expected}")
+    return expected['law'], kind, str(expected[kind])
+
+
+def build_identity_index(pipeline):
+    """Identität → Chunk-IDs, aus Metadata-Index (ohne Begriffsbestimmungen) und Term-Index"""
+    keyword_retriever = pipeline.keyword_retriever
+    chunks = defaultdict(set)
+    for kind, sub_index in keyword_retriever.metadata_index.items():
+        for number, chunk_ids in sub_index.items():
+            for doc in keyword_retriever.chunk_store.get_many(chunk_ids):
+                if doc.metadata.get('source_type') != 'Begriffsbestimmungen':
+                    chunks[(doc.metadata.get('source_law'), kind, number)].add(doc.metadata['chunk_id'])
+    for defined_term in pipeline.definitions_retriever.term_index.terms:
+        for doc in defined_term.docs:
+            chunks[(defined_term.law, 'begriff', defined_term.term)].add(doc.metadata['chunk_id'])
+    return chunks
+
+
+def score(docs, relevant, ks):
+    keys = [doc.metadata['chunk_id'] for doc in docs]
+    recall = {k: len(relevant.intersection(keys[:k])) / len(relevant) for k in ks}
+    rank = next((i + 1 for i, key in enumerate(keys) if key in relevant), None)
+    return recall, (1 / rank if rank else 0.0)
+
+
+def evaluate(name, retrieve, cases, ks, repeat):
+    """retrieve(case, k) → Dokumente; cases: Gold-Einträge mit 'relevant'"""
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks, timings, misses = [], [], []
+    max_k = max(ks)
+
+    for case in cases:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            docs = retrieve(case, max_k)
+        timings.append((time.perf_counter() - start) / repeat * 1000)
+
+        recall, reciprocal_rank = score(docs, case['relevant'], ks)
+        for k in ks:
+            recalls[k].append(recall[k])
+        reciprocal_ranks.append(reciprocal_rank)
+        if reciprocal_rank < 1 / PIPELINE_K[name]:
+            misses.append(case['query'])
+
+    return {
+        'queries': len(cases),
+        'recall': {k: statistics.mean(values) if values else 0.0 for k, values in recalls.items()},
+        'mrr': statistics.mean(reciprocal_ranks) if reciprocal_ranks else 0.0,
+        'latency_ms_mean': statistics.mean(timings) if timings else 0.0,
+        'latency_ms_p95': percentile(timings, 0.95) if timings else 0.0,
+        'misses': misses
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gold", default=DEFAULT_GOLD)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 3, 5, 10])
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen pro Query für die Zeitmessung")
+    parser.add_argument("--mistral-api-key", default=None, help="Echte Mistral-Embeddings (Disk-Cache) statt Fakes")
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--misses", action="store_true", help="Queries ohne Treffer im Pipeline-k auflisten")
+    parser.add_argument("--output", default=None, help="Ergebnisse zusätzlich als JSON")
+    args = parser.parse_args()
+
+    ks = sorted(set(args.k))
+    gold = load_gold(args.gold)
+
+    if args.mistral_api_key:
+        backend = RAGBackend(args.mistral_api_key, cache_dir=args.cache_dir)
+        backend.setup(DOCUMENT_PATHS)
+    else:
+        backend, _ = build_offline_backend(cache_dir=args.cache_dir)
+    pipeline = backend.triple_pipeline
+
+    # Pro-Aufruf-Logs würden die Tabelle zerreißen
+    logging.getLogger("rag_backend").setLevel(logging.WARNING)
+
+    identities = build_identity_index(pipeline)
+    for case in gold:
+        expected = [identity(entry) for entry in case['expected']]
+        unknown = [entry for entry in expected if entry not in identities]
+        if unknown:
+            raise ValueError(f"Unbekannte Identität {unknown} für: {case['query']}")
+        case['relevant'] = set().union(*(identities[entry] for entry in expected))
+        case['analysis'] = pipeline.router.analyze_query(case['query'])
+
+    # Query-Vektoren über den Embedding-Cache (mit echten Embeddings nur beim ersten Lauf API-Calls)
+    vectors = backend.embeddings.embed_documents([case['query'] for case in gold])
+    for case, vector in zip(gold, vectors):
+        case['vector'] = vector
+
+    semantic = pipeline.retriever
+    retrievers = {
+        'keyword': (
+            lambda case, k: pipeline.keyword_retriever.retrieve_by_metadata(
+                case['analysis'].extracted_references, k=k, filter_law=case.get('filter_law')
+            ),
+            [case for case in gold if case['analysis'].pipeline_type == PipelineType.KEYWORD_METADATA]
+        ),
+        'definitions': (
+            lambda case, k: pipeline.definitions_retriever.retrieve_definition(
+                case['analysis'].extracted_references.get('term'),
+                case['analysis'].extracted_references.get('law') or case.get('filter_law'),
+                k=k
+            ),
+            [case for case in gold if case['analysis'].pipeline_type in DEFINITION_PIPELINES]
+        )
+    }
+    for name, sparse_index, reranker in (
+        ('vektor', None, None),
+        ('hybrid', semantic.sparse_index, None),
+        ('hybrid+rerank', semantic.sparse_index, semantic.reranker)
+    ):
+        if (name != 'vektor' and sparse_index is None) or (name == 'hybrid+rerank' and reranker is None):
+            continue
+        retriever = HybridRetriever(
+            vectorstore=semantic.vectorstore, sparse_index=sparse_index, reranker=reranker, k=max(ks)
+        )
+        retrievers[name] = (
+            lambda case, k, retriever=retriever: retriever.retrieve(
+                case['query'], case['vector'], case.get('filter_law')
+            ),
+            gold
+        )
+
+    print(f"\n{len(gold)} Gold-Queries, {len(backend.all_chunks)} Chunks, "
+          f"Embeddings: {'Mistral (Cache)' if args.mistral_api_key else 'Fake'}")
+    print(f"{'Retriever':<16}{'Queries':>8}" + "".join(f"{f'R@{k}':>8}" for k in ks)
+          + f"{'MRR':>8}{'Mittel [ms]':>13}{'p95 [ms]':>10}")
+
+    results = {}
+    for name, (retrieve, cases) in retrievers.items():
+        result = evaluate(name, retrieve, cases, ks, args.repeat)
+        results[name] = result
+        recall_columns = "".join(
+            f"{result['recall'][k]:>7.0%}{'*' if k == PIPELINE_K[name] else ' '}" for k in ks
+        )
+        print(f"{name:<16}{result['queries']:>8}{recall_columns}{result['mrr']:>8.2f}"
+              f"{result['latency_ms_mean']:>13.2f}{result['latency_ms_p95']:>10.2f}")
+
+    print(f"\n(*) k im Code | nicht bewertet (Router wählt andere Pipeline): "
+          f"keyword {len(gold) - results['keyword']['queries']}, "
+          f"definitions {len(gold) - results['definitions']['queries']}")
+
+    if args.misses:
+        for name, result in results.items():
+            if result['misses']:
+                print(f"\n❌ {name}: kein relevanter Chunk in den Top-{PIPELINE_K[name]}")
+                for query in result['misses']:
+                    print(f"   {query}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\n📄 Ergebnis: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Routing-Regressionstest: AdvancedQueryRouter gegen ein gelabeltes Query-Korpus
+
+benchmarks/data/routing_labels.jsonl enthält pro Zeile die Query, die erwartete
+Pipeline und die erwarteten Referenzen:
+- Keyword: vollständiges Referenz-Dict ({"artikel": ["5"], "anhang": ["3"]}),
+  zusätzliche oder fehlende Schlüssel zählen als Fehler
+- Definitionen: {"term": <Begriff wie im Index>, "law": ...}; der extrahierte Term
+  wird über den DefinedTermIndex aufgelöst (wie im DefinitionsRetriever)
+- Semantic: {}
+
+Gelabelt ist das GEWÜNSCHTE Routing, nicht das aktuelle. Ausgegeben werden:
+- Confusion-Matrix über alle Pipelines
+- Pipeline- und Referenz-Genauigkeit
+- Anteil der Anfragen auf den günstigen Pfaden (Keyword/Definitionen statt Semantic)
+- Routing-Zeit pro Query (Mittel/p95, langsamste Queries)
+- Liste aller Fehlrouting-Fälle
+Mit --baseline wird der Router einer früheren Git-Revision mitbewertet, mit
+--min-accuracy endet der Lauf bei zu niedriger Genauigkeit mit Exit-Code 1.
+
+Aufruf:
+    python -m benchmarks.eval_routing
+    python -m benchmarks.eval_routing --baseline HEAD~1 --min-accuracy 0.9
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+
+import rag_backend
+from rag_backend import PipelineType
+from benchmarks.bench_routing import load_baseline, measure, percentile
+from benchmarks.offline import build_offline_backend
+
+DEFAULT_LABELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_labels.jsonl")
+
+PIPELINES = [pipeline.value for pipeline in PipelineType]
+SHORT_NAMES = {
+    'semantic': 'sem',
+    'keyword_metadata': 'kw',
+    'definitions_ki_vo': 'def-ki',
+    'definitions_dsgvo': 'def-ds',
+    'definitions_generic': 'def-gen'
+}
+
+
+def load_labels(path: str):
+    with open(path, encoding="utf-8") as f:
+        labels = [json.loads(line) for line in f if line.strip() and not line.startswith("#")]
+    for label in labels:
+        if label['pipeline'] not in PIPELINES:
+            raise ValueError(f"Unbekannte Pipeline '{label['pipeline']}' für: {label['query']}")
+    return labels
+
+
+def normalize_references(references: dict, term_index) -> dict:
+    """Vergleichbare Form: Definitionen → aufgelöster Begriff, Keyword-Listen → sortierte Mengen"""
+    if 'term' in references:
+        defined_term = term_index.match(references['term'], references.get('law'))
+        return {
+            'term': defined_term.term if defined_term else rag_backend.normalize_term(references['term']),
+            'law': references.get('law')
+        }
+    return {key: sorted(set(values)) for key, values in references.items() if values}
+
+
+def evaluate(router, labels, term_index) -> dict:
+    confusion = {expected: {predicted: 0 for predicted in PIPELINES} for expected in PIPELINES}
+    errors = []
+    predictions = []
+    pipeline_hits = reference_hits = 0
+
+    for label in labels:
+        analysis = router.analyze_query(label['query'])
+        predicted = analysis.pipeline_type.value
+        predictions.append(predicted)
+        references = normalize_references(analysis.extracted_references, term_index)
+        confusion[label['pipeline']][predicted] += 1
+
+        pipeline_ok = predicted == label['pipeline']
+        references_ok = pipeline_ok and references == normalize_references(label['references'], term_index)
+        pipeline_hits += pipeline_ok
+        reference_hits += references_ok
+        if not references_ok:
+            errors.append({
+                'query': label['query'],
+                'expected': label['pipeline'],
+                'predicted': predicted,
+                'expected_references': label['references'],
+                'references': analysis.extracted_references
+            })
+
+    def cheap_share(pipelines):
+        return sum(pipeline != PipelineType.SEMANTIC.value for pipeline in pipelines) / len(labels)
+
+    return {
+        'confusion': confusion,
+        'pipeline_accuracy': pipeline_hits / len(labels),
+        'reference_accuracy': reference_hits / len(labels),
+        'cheap_share_expected': cheap_share(label['pipeline'] for label in labels),
+        'cheap_share_predicted': cheap_share(predictions),
+        'errors': errors
+    }
+
+
+def print_confusion(confusion: dict):
+    print(f"\n{'erwartet ↓ / geroutet →':<26}" + "".join(f"{SHORT_NAMES[p]:>9}" for p in PIPELINES) + f"{'Recall':>9}")
+    for expected in PIPELINES:
+        row = confusion[expected]
+        total = sum(row.values())
+        recall = f"{row[expected] / total:.0%}" if total else "-"
+        print(f"{expected:<26}" + "".join(f"{row[p]:>9}" for p in PIPELINES) + f"{recall:>9}")
+
+
+def print_summary(name: str, result: dict, timings):
+    print(f"\n🧭 {name}: Pipeline {result['pipeline_accuracy']:.1%} | Pipeline + Referenzen "
+          f"{result['reference_accuracy']:.1%} | günstige Pfade {result['cheap_share_predicted']:.0%} "
+          f"(Soll {result['cheap_share_expected']:.0%})")
+    print(f"   Routing-Zeit: Mittel {statistics.mean(timings):.1f}µs, p95 {percentile(timings, 0.95):.1f}µs, "
+          f"Max {max(timings):.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", default=DEFAULT_LABELS)
+    parser.add_argument("--repeat", type=int, default=50, help="Wiederholungen pro Query für die Zeitmessung")
+    parser.add_argument("--baseline", default=None, help="Git-Revision, deren Router mitbewertet wird")
+    parser.add_argument("--min-accuracy", type=float, default=None,
+                        help="Mindestgenauigkeit (Pipeline + Referenzen), sonst Exit-Code 1")
+    parser.add_argument("--slowest", type=int, default=5, help="Anzahl der langsamsten Queries in der Ausgabe")
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels)
+    backend, _ = build_offline_backend(cache_dir=args.cache_dir)
+    router = backend.triple_pipeline.router
+    term_index = router.term_index
+
+    # Debug-Logs des Routers würden die Tabelle zerreißen
+    logging.getLogger("rag_backend").setLevel(logging.WARNING)
+
+    queries = [label['query'] for label in labels]
+    routers = [("aktuell", router)]
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        routers.insert(0, (args.baseline, baseline.AdvancedQueryRouter(
+            list(router.defined_terms_ki_vo), list(router.defined_terms_dsgvo)
+        )))
+
+    print(f"\n{len(labels)} gelabelte Queries, {args.repeat} Wiederholungen für die Zeitmessung")
+
+    results, timings = {}, {}
+    for name, candidate in routers:
+        results[name] = evaluate(candidate, labels, term_index)
+        timings[name] = measure(candidate, queries, args.repeat)
+        print_summary(name, results[name], timings[name])
+
+    current = results["aktuell"]
+    print_confusion(current['confusion'])
+
+    print("\n🐢 Langsamste Queries:")
+    for query, timing in sorted(zip(queries, timings["aktuell"]), key=lambda item: -item[1])[:args.slowest]:
+        print(f"   {timing:>8.1f}µs  {query}")
+
+    print(f"\n❌ Fehlrouting ({len(current['errors'])}):")
+    for error in current['errors']:
+        print(f"   {error['query']}")
+        print(f"      erwartet: {error['expected']} {error['expected_references']}")
+        print(f"      geroutet: {error['predicted']} {error['references']}")
+
+    if args.baseline:
+        before = {error['query'] for error in results[args.baseline]['errors']}
+        after = {error['query'] for error in current['errors']}
+        print(f"\n🔁 Gegenüber {args.baseline}: {len(before - after)} behoben, {len(after - before)} neu falsch")
+        for query in sorted(after - before):
+            print(f"   ⚠️ {query}")
+
+    if args.min_accuracy is not None and current['reference_accuracy'] < args.min_accuracy:
+        print(f"\n🚫 Genauigkeit {current['reference_accuracy']:.1%} unter {args.min_accuracy:.1%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Fake-Modelle für Offline-Betrieb (ohne Mistral API)
+
+Verwendung:
+    from rag_backend import RAGBackend
+    from benchmarks.fakes import FakeEmbeddings, FakeChatModel
+
+    backend = RAGBackend("offline", embeddings=FakeEmbeddings(), llm=FakeChatModel())
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministische Embeddings per Feature-Hashing über Tokens
+    - Gleicher Text → gleicher Vektor (reproduzierbar)
+    - Texte mit gemeinsamen Wörtern sind sich ähnlich
+    - Optionale künstliche Latenz pro Aufruf (+ pro Text für Batch-Requests)
+    - Optionale Rate-Limits: Anteil rate_limit_rate der Batch-Requests → HTTP 429
+    """
+
+    def __init__(
+        self,
+        size: int = 1024,
+        latency: float = 0.0,
+        latency_per_text: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: Optional[float] = None,
+        seed: int = 0
+    ):
+        self.size = size
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.model = f"fake-embed-{size}"
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.embedded_texts = 0
+        self.rate_limited = 0
+        self._in_flight = 0
+        self.peak_in_flight = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+
+        for token in re.findall(r'\w+', text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.size] += 1.0
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            vector[0] = 1.0
+            return vector
+
+        return [v / norm for v in vector]
+
+    def _record(self, count: int):
+        with self._lock:
+            self.calls += 1
+            self.embedded_texts += count
+
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _rate_limit(self):
+        """Simuliere HTTP 429 wie von der Mistral API (mit optionalem Retry-After)"""
+        with self._lock:
+            if not self.rate_limit_rate or self._random.random() >= self.rate_limit_rate:
+                return
+            self.rate_limited += 1
+
+        headers = {'retry-after': str(self.retry_after)} if self.retry_after is not None else {}
+        request = httpx.Request("POST", "http://fake-embeddings/v1/embeddings")
+        response = httpx.Response(429, headers=headers, request=request)
+        raise httpx.HTTPStatusError("429 Too Many Requests", request=request, response=response)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._rate_limit()
+
+        with self._lock:
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+        try:
+            self._record(len(texts))
+            if self.latency_per_text:
+                time.sleep(self.latency_per_text * len(texts))
+            return [self._embed(text) for text in texts]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def embed_query(self, text: str) -> List[float]:
+        self._record(1)
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Fake-Chat-Modell mit künstlicher Latenz
+    - Antwort: "Antwort auf: <FRAGE aus dem Prompt>" (deterministisch)
+    - latency: Zeit bis zum ersten Token, token_latency: Zeit pro weiterem Token
+    - Zählt Calls und die maximale Parallelität
+    - keep_prompts: die letzten N Prompts bleiben für Prüfungen erhalten (0 = keine,
+      sonst treiben Prompts mit bis zu ~8k Tokens das gemessene Peak-RSS hoch)
+    """
+
+    latency: float = 0.0
+    token_latency: float = 0.0
+    keep_prompts: int = 0
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _prompts: Deque[str] = PrivateAttr(default=None)
+    _calls: int = PrivateAttr(default=0)
+    _in_flight: int = PrivateAttr(default=0)
+    _peak_in_flight: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._prompts = deque(maxlen=self.keep_prompts)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @staticmethod
+    def _extract_question(prompt: str) -> str:
+        matches = re.findall(r'FRAGE:\s*(.+?)\s*(?:ANTWORT:|$)', prompt, re.DOTALL)
+        if matches:
+            return matches[-1].strip()
+        return prompt.strip()[-200:]
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = messages[-1].content
+        with self._lock:
+            self._calls += 1
+            self._prompts.append(prompt)
+        return f"Antwort auf: {self._extract_question(prompt)}"
+
+    def _enter(self):
+        with self._lock:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    @staticmethod
+    def _tokens(content: str) -> List[str]:
+        return re.findall(r'\S+\s*', content)
+
+    def _duration(self, content: str) -> float:
+        return self.latency + self.token_latency * len(self._tokens(content))
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._enter()
+        try:
+            content = self._respond(messages)
+            if self._duration(content):
+                time.sleep(self._duration(content))
+        finally:
+            self._exit()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        self._enter()
+        try:
+            content = self._respond(messages)
+            if self.latency:
+                time.sleep(self.latency)
+            for i, token in enumerate(self._tokens(content)):
+                if i and self.token_latency:
+                    time.sleep(self.token_latency)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        finally:
+            self._exit()
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._enter()
+        try:
+            content = self._respond(messages)
+            if self._duration(content):
+                await asyncio.sleep(self._duration(content))
+        finally:
+            self._exit()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    @property
+    def prompts(self) -> List[str]:
+        """Die letzten keep_prompts Prompts"""
+        with self._lock:
+            return list(self._prompts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'peak_in_flight': self._peak_in_flight
+            }
@@ -0,0 +1,47 @@
+"""
+Offline-Backend für Benchmarks und Stresstests (Fake-Modelle, echte Korpora)
+"""
+
+from typing import Optional, Tuple
+import os
+
+from rag_backend import RAGBackend
+from benchmarks.fakes import FakeEmbeddings, FakeChatModel
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+DOCUMENT_PATHS = {
+    'ki_vo_corpus': os.path.join(DATA_DIR, 'KI_Verordnung_07_2025_Corpus.docx'),
+    'ki_vo_anhaenge': os.path.join(DATA_DIR, 'KI_Verordnung_Stand_07_2025 Extract[124-144]_Anhänge conv_chunkready.docx'),
+    'ki_vo_ewg': os.path.join(DATA_DIR, 'KI_Verordnung_18_09_2025_EWG_chunk ready .docx'),
+    'ki_vo_begriffe': os.path.join(DATA_DIR, 'KI_Verordnung_Begriffbestimmung.docx'),
+    'dsgvo_corpus': os.path.join(DATA_DIR, 'DSGVO_Corpus_StandOktober2025_chunk ready.docx'),
+    'dsgvo_ewg': os.path.join(DATA_DIR, 'DSGVO_EWG_StandOktober2025_Chunkready.docx'),
+    'dsgvo_begriffe': os.path.join(DATA_DIR, 'DSGVO_Begriffbestimmung.docx'),
+}
+
+# Eigenes Cache-Verzeichnis, damit Fake-Vektoren nie den Produktions-Snapshot überschreiben
+DEFAULT_CACHE_DIR = os.path.join(".cache", "offline")
+
+
+def build_offline_backend(
+    cache_dir: Optional[str] = None,
+    llm_latency: float = 0.0,
+    embedding_latency: float = 0.0,
+    max_concurrent_llm_calls: int = 8,
+    use_snapshot: bool = True,
+    answer_cache_size: int = 512,
+    keep_prompts: int = 0
+) -> Tuple[RAGBackend, FakeChatModel]:
+    """Baue RAGBackend mit Fake-Modellen über den echten data/*.docx Korpora"""
+    llm = FakeChatModel(latency=llm_latency, keep_prompts=keep_prompts)
+    backend = RAGBackend(
+        "offline",
+        cache_dir=cache_dir or DEFAULT_CACHE_DIR,
+        embeddings=FakeEmbeddings(latency=embedding_latency),
+        llm=llm,
+        max_concurrent_llm_calls=max_concurrent_llm_calls,
+        answer_cache_size=answer_cache_size
+    )
+    backend.setup(DOCUMENT_PATHS, use_snapshot=use_snapshot)
+    return backend, llm
@@ -0,0 +1,138 @@
+"""
+Concurrency-Stresstest für TriplePipelineManager.process_query
+
+Viele Sessions stellen parallel Fragen (Fake-LLM mit Latenz). Geprüft wird:
+- Keine Antwort enthält die Frage einer fremden Session
+- Kein Prompt mischt Historien mehrerer Sessions
+- Jede Session-Historie enthält nur eigene Nachrichten
+- Die Zahl paralleler LLM-Calls bleibt unter dem Limit
+- Nach dem ersten Token abgebrochene Streams (Streamlit-Rerun) geben ihre LLM-Slots sofort frei
+
+Aufruf:
+    python -m benchmarks.stress_concurrency --sessions 60 --queries-per-session 5
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import random
+import re
+import sys
+import time
+
+from benchmarks.offline import build_offline_backend
+
+QUERY_TEMPLATES = [
+    "{token}: Was bedeutet KI-System?",
+    "{token}: Was regelt Artikel 6 DSGVO?",
+    "{token}: Welche Pflichten haben Anbieter von Hochrisiko-KI-Systemen?",
+    "{token}: Und was gilt zusätzlich?",
+    "{token}: Was steht in Erwägungsgrund 47 der DSGVO?",
+    "{token}: Wie wird personenbezogene Daten definiert?",
+]
+
+TOKEN_PATTERN = re.compile(r'nutzer\d{4}', re.IGNORECASE)
+
+
+def find_tokens(text: str) -> set:
+    return {token.lower() for token in TOKEN_PATTERN.findall(text)}
+
+
+def check_abandoned_streams(backend, max_llm_calls: int) -> list:
+    """Alle LLM-Slots mit Streams belegen, nach dem ersten Token abbrechen → Slots wieder voll"""
+    slots = backend.triple_pipeline._llm_slots
+    streams = []
+    for s in range(max_llm_calls):
+        stream = backend.stream_query(f"abbruch{s:04d}: Welche Pflichten haben Anbieter?", session_id=f"abbruch{s:04d}")
+        next(stream)  # erstes Token → Stream hält einen Slot
+        streams.append(stream)
+    busy = max_llm_calls - slots._value
+
+    for stream in streams:
+        stream.close()
+    free = slots._value
+
+    print(f"   🛑 Abgebrochene Streams: {busy} Slots belegt, danach {free}/{max_llm_calls} frei")
+    errors = []
+    if busy != max_llm_calls:
+        errors.append(f"Streams belegen {busy} statt {max_llm_calls} LLM-Slots")
+    if free != max_llm_calls:
+        errors.append(f"Nach abgebrochenen Streams nur {free}/{max_llm_calls} LLM-Slots frei")
+    return errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=60)
+    parser.add_argument("--queries-per-session", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.02)
+    parser.add_argument("--max-llm-calls", type=int, default=8)
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    backend, llm = build_offline_backend(
+        cache_dir=args.cache_dir,
+        llm_latency=args.llm_latency,
+        max_concurrent_llm_calls=args.max_llm_calls,
+        # Höchstens Condense + Antwort pro Anfrage → alle Prompts bleiben für die Prüfung erhalten
+        keep_prompts=2 * args.sessions * args.queries_per_session
+    )
+
+    jobs = [
+        (f"nutzer{s:04d}", QUERY_TEMPLATES[(s + i) % len(QUERY_TEMPLATES)])
+        for i in range(args.queries_per_session)
+        for s in range(args.sessions)
+    ]
+    random.Random(42).shuffle(jobs)
+
+    def run_one(job):
+        token, template = job
+        response = backend.query(template.format(token=token), session_id=token)
+        return token, response
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(run_one, jobs))
+    elapsed = time.perf_counter() - start
+
+    errors = []
+
+    for token, response in results:
+        foreign = find_tokens(response['answer']) - {token}
+        if foreign:
+            errors.append(f"Antwort für {token} enthält fremde Sessions: {sorted(foreign)}")
+
+    for prompt in llm.prompts:
+        tokens = find_tokens(prompt)
+        if len(tokens) > 1:
+            errors.append(f"Prompt mischt Sessions: {sorted(tokens)}")
+
+    for s in range(args.sessions):
+        token = f"nutzer{s:04d}"
+        for message in backend.triple_pipeline.sessions.get(token).get_history():
+            foreign = find_tokens(message.content) - {token}
+            if foreign:
+                errors.append(f"Historie von {token} enthält fremde Sessions: {sorted(foreign)}")
+
+    llm_stats = llm.get_stats()
+    if llm_stats['peak_in_flight'] > args.max_llm_calls:
+        errors.append(f"LLM-Limit überschritten: {llm_stats['peak_in_flight']} > {args.max_llm_calls}")
+
+    print(f"\n📊 {len(results)} Anfragen, {args.sessions} Sessions, {args.threads} Threads")
+    print(f"   ⏱️ {elapsed:.2f}s ({len(results) / elapsed:.0f} Anfragen/s)")
+    print(f"   🤖 LLM-Calls: {llm_stats['calls']}, max. parallel: {llm_stats['peak_in_flight']}/{args.max_llm_calls}")
+
+    errors += check_abandoned_streams(backend, args.max_llm_calls)
+
+    if errors:
+        print(f"\n❌ {len(errors)} Fehler:")
+        for error in errors[:20]:
+            print(f"   {error}")
+        return 1
+
+    print("\n✅ Keine Vermischung zwischen Sessions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
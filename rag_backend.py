@@ -19,24 +19,46 @@ NEUE FEATURES v3.0:
 import warnings
 warnings.filterwarnings("ignore")
 
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator
+from dataclasses import dataclass, field
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial, lru_cache
+from contextlib import closing, contextmanager
 from enum import Enum
+from array import array
 import time
 import re
+import asyncio
+import os
+import hashlib
+import json
+import uuid
+import pickle
+import sqlite3
+import threading
 import logging
+import multiprocessing
+import random
+import bisect
+
+import httpx
+import numpy as np
 
 from langchain_community.document_loaders import Docx2txtLoader
 from langchain_text_splitters import MarkdownHeaderTextSplitter
 from langchain_core.documents import Document
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
 from langchain_mistralai import MistralAIEmbeddings, ChatMistralAI
-from langchain.chains import ConversationalRetrievalChain
 from langchain_core.prompts import PromptTemplate
-from langchain.memory import ConversationBufferWindowMemory
 
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, PayloadSchemaType
+)
 from langchain_qdrant import Qdrant
 
 # ✅ Logging Setup
@@ -90,16 +112,25 @@ class QueryPreprocessor:
             r'\b(kannst du|können sie)\s*',
         ]
         
-        # Präpositionen die entfernt werden können
-        self.preposition_patterns = [
-            r'\s+(der|die|das|den|dem|des)\s+(?=dsgvo|ki-verordnung|ki-vo)',
-            r'\s+(in|aus|von|zu|bei|mit|für|über)\s+(?=dsgvo|ki-verordnung|ki-vo)',
-        ]
-        
         # Varianten für "laut/gemäß" können bleiben, aber markieren
         self.indicator_words = [
             'laut', 'gemäß', 'nach', 'entsprechend', 'aufgrund'
         ]
+        
+        # ✅ NEU IN V3.1: Patterns einmalig vorkompiliert, ein Durchlauf für alle Füllwörter
+        self._filler_regex = re.compile(
+            '|'.join(f'(?:{pattern})' for pattern in self.filler_patterns), re.IGNORECASE
+        )
+        # Präpositionen/Artikel die VOR Gesetzes-Namen entfernt werden können:
+        # "(Präposition) (Artikel) <Gesetz>" in einem Durchlauf
+        self._preposition_regex = re.compile(
+            r'\s+(?:(?:in|aus|von|zu|bei|mit|für|über)\s+)?(?:der|die|das|den|dem|des)\s+(?=dsgvo|ki-verordnung|ki-vo)'
+            r'|\s+(?:in|aus|von|zu|bei|mit|für|über)\s+(?=dsgvo|ki-verordnung|ki-vo)',
+            re.IGNORECASE
+        )
+        self._whitespace_regex = re.compile(r'\s+')
+        self._dsgvo_regex = re.compile(r'\bdsgvo\b')
+        self._ki_vo_regex = re.compile(r'\b(ki-verordnung|ki-vo|kivo)\b')
     
     def preprocess(self, query: str) -> Dict[str, Any]:
         """
@@ -121,20 +152,17 @@ class QueryPreprocessor:
         found_indicators = [word for word in self.indicator_words if word in normalized]
         
         # Entferne Füllwörter
-        cleaned = normalized
-        for pattern in self.filler_patterns:
-            cleaned = re.sub(pattern, '', cleaned, flags=re.IGNORECASE)
+        cleaned = self._filler_regex.sub('', normalized)
         
         # Entferne störende Präpositionen VOR Gesetzes-Namen
-        for pattern in self.preposition_patterns:
-            cleaned = re.sub(pattern, ' ', cleaned, flags=re.IGNORECASE)
+        cleaned = self._preposition_regex.sub(' ', cleaned)
         
         # Normalize Whitespace
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+        cleaned = self._whitespace_regex.sub(' ', cleaned).strip()
         
         # Detect Law Reference
-        has_dsgvo = bool(re.search(r'\bdsgvo\b', cleaned))
-        has_ki_vo = bool(re.search(r'\b(ki-verordnung|ki-vo|kivo)\b', cleaned))
+        has_dsgvo = bool(self._dsgvo_regex.search(cleaned))
+        has_ki_vo = bool(self._ki_vo_regex.search(cleaned))
         
         result = {
             'original': original,
@@ -151,14 +179,371 @@ class QueryPreprocessor:
         return result
 
 
+# ==============================================================================
+# TERM INDEX - ✅ NEU IN V3.1
+# ==============================================================================
+
+TERM_CLOSING_QUOTES = re.compile(r'[“”"]')
+DEFINITION_HEADER = re.compile(r'###\s*(\d+)\.\s*([^\n]+)')
+
+
+def extract_headword(text: str) -> str:
+    """
+    Begriff aus einer Begriffsbestimmung
+    '„Anbieter“ eine natürliche oder juristische Person ...' → 'anbieter'
+    """
+    return TERM_CLOSING_QUOTES.split(text, maxsplit=1)[0].strip(' „"\'.,;:').lower()
+
+
+def normalize_term(text: str) -> str:
+    """Kanonische Form für Term-Vergleiche: klein, Bindestriche → Leerzeichen, ohne Satzzeichen"""
+    text = re.sub(r'[?!.,;:„“”"\'()]', ' ', text.lower().replace('-', ' '))
+    return ' '.join(text.split())
+
+
+def fold_umlauts(text: str) -> str:
+    """ä → ae, ö → oe, ü → ue, ß → ss (str.replace ist deutlich schneller als str.translate mit Dict)"""
+    return text.replace('ä', 'ae').replace('ö', 'oe').replace('ü', 'ue').replace('ß', 'ss')
+
+
+def fold_term(text: str) -> str:
+    """
+    Schreibweisen-unabhängiger Schlüssel für die Fuzzy-Suche
+    - Umlaute/ß transliteriert ("Aufsichtsbehoerde" = "Aufsichtsbehörde")
+    - Ohne Leerzeichen/Bindestriche ("Hochrisiko KI System" = "Hochrisiko-KI-System" = "HochrisikoKISystem")
+    """
+    return fold_umlauts(normalize_term(text)).replace(' ', '')
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Damerau-Levenshtein (OSA) mit Abbruch: > max_distance → max_distance + 1"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+@dataclass(frozen=True)
+class DefinedTerm:
+    term: str                                   # Kanonischer Begriff ("ki system")
+    law: Optional[str]
+    docs: Tuple[Document, ...] = field(default=(), compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class TermMatch:
+    defined_term: DefinedTerm
+    start: int
+    end: int
+
+
+class DefinedTermIndex:
+    """
+    Gemeinsamer Index der definierten Begriffe für Router und DefinitionsRetriever
+    - Exakter Lookup über kanonische Varianten ("ki-system", "ki system", "kisystem")
+    - Aho-Corasick-Automat: alle Begriffe in einem Text in EINEM Durchlauf (nur an Wortgrenzen)
+    - Fragment-Index: Wortanfänge ab 4 Zeichen ("biometrisch" → "biometrische daten")
+    - Fuzzy-Index (SymSpell): Löschvarianten der gefalteten Begriffe für Tippfehler
+      ("hochrisko", "emotionserkenungssystem", "verantwortlichen")
+    - Deterministisch: längster Treffer gewinnt, dann Gesetz-Reihenfolge, dann alphabetisch
+    Nach dem Bau unveränderlich, daher ohne Lock von parallelen Requests nutzbar.
+    """
+    
+    LAW_ORDER = ('KI-Verordnung', 'DSGVO')
+    MIN_PARTIAL_LENGTH = 4
+    MAX_EDIT_DISTANCE = 2
+    FUZZY_PREFIX_LENGTH = 7         # SymSpell: Löschvarianten nur über den Präfix, Prüfung über den ganzen Begriff
+    MAX_FUZZY_WINDOW = 4            # Wörter pro Fenster bei der Fuzzy-Suche in längeren Termen
+    
+    def __init__(self, entries: List[Tuple[str, Optional[str], List[Document]]]):
+        """
+        Args:
+            entries: (Begriff bzw. Begriffsbestimmung, Gesetz, Dokumente)
+        """
+        # Pro Begriff: Chunk-ID → Dokument (Dedup in O(1), Reihenfolge bleibt erhalten)
+        terms: Dict[Tuple[str, Optional[str]], Dict[str, Document]] = {}
+        for text, law, docs in entries:
+            term = normalize_term(extract_headword(text))
+            if not term:
+                continue
+            bucket = terms.setdefault((term, law), {})
+            for doc in docs:
+                bucket.setdefault(doc.metadata['chunk_id'], doc)
+        
+        self.terms = tuple(sorted(
+            (DefinedTerm(term=term, law=law, docs=tuple(docs.values())) for (term, law), docs in terms.items()),
+            key=lambda t: (t.term, self._law_rank(t.law))
+        ))
+        
+        self._exact: Dict[str, List[DefinedTerm]] = {}
+        self._fragments: Dict[str, List[DefinedTerm]] = {}
+        for defined_term in self.terms:
+            for variant in self._variants(defined_term.term):
+                self._exact.setdefault(variant, []).append(defined_term)
+            for fragment in self._word_prefixes(defined_term.term):
+                bucket = self._fragments.setdefault(fragment, [])
+                if defined_term not in bucket:
+                    bucket.append(defined_term)
+        
+        self._build_automaton()
+        self._build_fuzzy_index()
+    
+    @classmethod
+    def from_term_lists(cls, terms_by_law: Dict[str, List[str]]) -> 'DefinedTermIndex':
+        return cls([(term, law, []) for law, terms in terms_by_law.items() for term in terms])
+    
+    @classmethod
+    def from_definitions_index(
+        cls,
+        definitions_index: Dict[str, Tuple[str, ...]],
+        chunk_store: 'ChunkStore'
+    ) -> 'DefinedTermIndex':
+        """Begriffe aus den Überschriften der indexierten Chunks (nicht aus den Varianten-Keys)"""
+        chunk_ids = dict.fromkeys(chunk_id for chunk_ids in definitions_index.values() for chunk_id in chunk_ids)
+        entries = []
+        for doc in chunk_store.get_many(chunk_ids):
+            match = DEFINITION_HEADER.search(doc.page_content)
+            if match:
+                entries.append((match.group(2), doc.metadata.get('source_law'), [doc]))
+        return cls(entries)
+    
+    def _law_rank(self, law: Optional[str]) -> int:
+        return self.LAW_ORDER.index(law) if law in self.LAW_ORDER else len(self.LAW_ORDER)
+    
+    @staticmethod
+    def _variants(term: str) -> List[str]:
+        compact = term.replace(' ', '')
+        return [term] if compact == term else [term, compact]
+    
+    def _word_prefixes(self, term: str) -> List[str]:
+        """Alle Präfixe ab MIN_PARTIAL_LENGTH, beginnend an jedem Wortanfang"""
+        word_starts = [0] + [i + 1 for i, char in enumerate(term) if char == ' ']
+        return [
+            term[start:end]
+            for start in word_starts
+            for end in range(start + self.MIN_PARTIAL_LENGTH, len(term) + 1)
+        ]
+    
+    def _build_automaton(self):
+        """Aho-Corasick: Trie über alle Varianten + Fail-Links (BFS)"""
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        
+        for variant in self._exact:
+            node = 0
+            for char in variant:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._output[node].append(variant)
+        
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+                queue.append(child)
+    
+    def _edit_budget(self, length: int) -> int:
+        """Erlaubte Tippfehler je nach Länge: <5 Zeichen keine, <9 einer, sonst zwei"""
+        if length < 5:
+            return 0
+        return 1 if length < 9 else self.MAX_EDIT_DISTANCE
+    
+    @staticmethod
+    def _deletions(word: str, depth: int) -> set:
+        result = {word}
+        frontier = {word}
+        for _ in range(depth):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            result |= frontier
+        return result
+    
+    def _build_fuzzy_index(self):
+        """SymSpell: Löschvarianten (bis zum Budget) der Präfixe der gefalteten Begriffe → Schlüssel"""
+        self._folded: Dict[str, List[DefinedTerm]] = {}
+        for defined_term in self.terms:
+            self._folded.setdefault(fold_term(defined_term.term), []).append(defined_term)
+        
+        self._deletes: Dict[str, List[str]] = {}
+        for key in self._folded:
+            for deletion in self._deletions(key[:self.FUZZY_PREFIX_LENGTH], self._edit_budget(len(key))):
+                self._deletes.setdefault(deletion, []).append(key)
+    
+    def fuzzy_lookup(self, term: str, law: Optional[str] = None) -> List[Tuple[DefinedTerm, int]]:
+        """
+        Begriffe mit begrenzter Edit-Distanz (Damerau-Levenshtein) zum gefalteten Term
+        
+        Returns:
+            [(Begriff, Distanz)] - kleinste Distanz zuerst, dann Gesetz-Reihenfolge, dann alphabetisch
+        """
+        folded = fold_term(term)
+        budget = self._edit_budget(len(folded))
+        if not budget:
+            return []
+        
+        prefix = folded[:self.FUZZY_PREFIX_LENGTH]
+        keys = {key for deletion in self._deletions(prefix, budget) for key in self._deletes.get(deletion, ())}
+        scored = []
+        for key in keys:
+            limit = min(budget, self._edit_budget(len(key)))
+            distance = bounded_edit_distance(folded, key, limit)
+            if distance <= limit:
+                scored.extend((defined_term, distance) for defined_term in self._pick(self._folded[key], law))
+        
+        return sorted(scored, key=lambda item: (item[1], self._law_rank(item[0].law), item[0].term))
+    
+    def _fuzzy_window_match(self, term: str, law: Optional[str]) -> Optional[DefinedTerm]:
+        """Fuzzy-Suche über Wortfenster eines längeren Terms - längstes Fenster mit kleinster Distanz"""
+        words = normalize_term(term).split()
+        best = None
+        for size in range(min(len(words), self.MAX_FUZZY_WINDOW), 0, -1):
+            for start in range(len(words) - size + 1):
+                matches = self.fuzzy_lookup(' '.join(words[start:start + size]), law)
+                if matches:
+                    defined_term, distance = matches[0]
+                    rank = (distance, -size, start)
+                    if best is None or rank < best[0]:
+                        best = (rank, defined_term)
+        return best[1] if best else None
+    
+    def _pick(self, candidates: List[DefinedTerm], law: Optional[str]) -> List[DefinedTerm]:
+        return [c for c in candidates if law is None or c.law == law]
+    
+    def lookup(self, term: str, law: Optional[str] = None) -> List[DefinedTerm]:
+        """Exakter Lookup (alle Schreibvarianten), sortiert nach Gesetz-Reihenfolge"""
+        normalized = normalize_term(term)
+        for variant in self._variants(normalized):
+            candidates = self._pick(self._exact.get(variant, []), law)
+            if candidates:
+                return sorted(candidates, key=lambda c: self._law_rank(c.law))
+        return []
+    
+    def find_all(self, text: str, law: Optional[str] = None) -> List[TermMatch]:
+        """Alle definierten Begriffe im (normalisierten) Text - ein Durchlauf, nur ganze Wörter"""
+        normalized = normalize_term(text)
+        matches = []
+        node = 0
+        
+        for position, char in enumerate(normalized):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            
+            for variant in self._output[node]:
+                start, end = position + 1 - len(variant), position + 1
+                if start > 0 and normalized[start - 1] != ' ':
+                    continue
+                if end < len(normalized) and normalized[end] != ' ':
+                    continue
+                for defined_term in self._pick(self._exact[variant], law):
+                    matches.append(TermMatch(defined_term, start, end))
+        
+        return matches
+    
+    def longest_matches(self, text: str, law: Optional[str] = None) -> List[TermMatch]:
+        """Nicht überlappende Treffer, längster zuerst (verschachtelte Begriffe werden verworfen)"""
+        candidates = sorted(
+            (m for m in self.find_all(text, law) if m.end - m.start >= self.MIN_PARTIAL_LENGTH),
+            key=lambda m: (-(m.end - m.start), self._law_rank(m.defined_term.law), m.start, m.defined_term.term)
+        )
+        selected = []
+        for candidate in candidates:
+            if all(candidate.end <= m.start or candidate.start >= m.end for m in selected):
+                selected.append(candidate)
+        return selected
+    
+    def longest_match(self, text: str, law: Optional[str] = None) -> Optional[TermMatch]:
+        matches = self.longest_matches(text, law)
+        return matches[0] if matches else None
+    
+    def match_all(self, term: str, law: Optional[str] = None) -> Tuple[List[DefinedTerm], bool]:
+        """
+        Definierte Begriffe für einen extrahierten Term
+        1. Exakt (inkl. Schreibvarianten) → genau ein Begriff
+        2. Tippfehler-tolerant über den ganzen Term ("hochrisko-ki-sytem", "aufsichtsbehoerde")
+        3. Definierte Begriffe IM Term, längster zuerst ("unterschied zwischen anbieter und betreiber")
+        4. Term als Wortanfang eines Begriffs ("biometrisch" → kürzester passender Begriff)
+        5. Tippfehler-tolerant über Wortfenster des Terms ("emotionserkenungssystem im sinne")
+        
+        Returns:
+            (Begriffe, exakt?)
+        """
+        exact = self.lookup(term, law)
+        if exact:
+            return [exact[0]], True
+        
+        fuzzy = self.fuzzy_lookup(term, law)
+        if fuzzy:
+            return [fuzzy[0][0]], False
+        
+        contained = []
+        for match in self.longest_matches(term, law):
+            if match.defined_term not in contained:
+                contained.append(match.defined_term)
+        if contained:
+            return contained, False
+        
+        normalized = normalize_term(term)
+        if len(normalized) >= self.MIN_PARTIAL_LENGTH:
+            candidates = self._pick(self._fragments.get(normalized, []), law)
+            if candidates:
+                return [min(candidates, key=lambda c: (len(c.term), self._law_rank(c.law), c.term))], False
+        
+        window_match = self._fuzzy_window_match(term, law)
+        if window_match:
+            return [window_match], False
+        
+        return [], False
+    
+    def match(self, term: str, law: Optional[str] = None) -> Optional[DefinedTerm]:
+        """Bester definierter Begriff für einen extrahierten Term (siehe match_all)"""
+        defined_terms, _ = self.match_all(term, law)
+        return defined_terms[0] if defined_terms else None
+    
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
 # ==============================================================================
 # QUERY ROUTER - ✅ ENHANCED IN V3.0
 # ==============================================================================
 
 class AdvancedQueryRouter:
-    def __init__(self, defined_terms_ki_vo: List[str], defined_terms_dsgvo: List[str]):
-        self.defined_terms_ki_vo = [t.lower() for t in defined_terms_ki_vo]
-        self.defined_terms_dsgvo = [t.lower() for t in defined_terms_dsgvo]
+    def __init__(
+        self,
+        defined_terms_ki_vo: List[str],
+        defined_terms_dsgvo: List[str],
+        term_index: Optional[DefinedTermIndex] = None
+    ):
+        self.defined_terms_ki_vo = tuple(t.lower() for t in defined_terms_ki_vo)
+        self.defined_terms_dsgvo = tuple(t.lower() for t in defined_terms_dsgvo)
+        
+        # ✅ NEU IN V3.1: Gemeinsamer Term-Index (i.d.R. vom DefinitionsRetriever geteilt)
+        self.term_index = term_index if term_index is not None else DefinedTermIndex.from_term_lists({
+            'KI-Verordnung': self.defined_terms_ki_vo,
+            'DSGVO': self.defined_terms_dsgvo
+        })
         
         # ✅ NEU: Preprocessor integriert
         self.preprocessor = QueryPreprocessor()
@@ -200,20 +585,55 @@ class AdvancedQueryRouter:
                 r'nummer\s+(\d+)',           # "Nummer 15" (im Kontext)
             ],
         }
+        
+        # ✅ NEU IN V3.1: Vorkompilierte Regex-Engine (statt ~25 re.finditer/re.search pro Query)
+        self._definition_regex = re.compile('|'.join(re.escape(kw) for kw in self.definition_keywords))
+        self._keyword_regexes = {
+            pattern_type: self._compile_alternation(patterns)
+            for pattern_type, patterns in self.keyword_patterns.items()
+        }
+        
+        self._term_law_regex = re.compile(r'\b(?:laut|gemäß|nach|der|des)\s+(?:ki-verordnung|ki-vo|dsgvo|art\.?\s*\d+)\b')
+        self._law_name_regex = re.compile(r'\b(?:ki-verordnung|ki-vo|dsgvo)\b')
+        self._term_patterns = [
+            re.compile(r'wie\s+(?:wird|werden)\s+(.+?)\s+(?:definiert|bezeichnet)'),                       # "wie wird X definiert"
+            re.compile(r'was\s+(?:bedeutet|ist|sind)\s+(?:(?:ein|eine|der|die|das)\s+)?(.+?)(?:\?|$)'),     # "was bedeutet X"
+            re.compile(r'definition\s+(?:von|für|des|der)\s+(.+?)(?:\?|$)'),                                # "definition von X"
+        ]
+        self._punctuation_regex = re.compile(r'[?.,!]')
+        self._leading_words_regex = re.compile(r'^(?:ein|eine|der|die|das|den|dem|laut|gemäß|nach)\s+')
+        self._trailing_words_regex = re.compile(r'\s+(?:laut|gemäß|nach|der|des)$')
+    
+    @staticmethod
+    def _compile_alternation(patterns: List[str]) -> re.Pattern:
+        """
+        Kombiniere alle Patterns eines Typs zu EINER Regex
+        - Capture-Gruppe jedes Patterns → benannte Gruppe p0, p1, ... (Pattern-Index)
+        - Alternation im Lookahead: wie bei einzelnen Scans werden auch überlappende
+          Treffer verschiedener Patterns gefunden (pro Position das erste passende)
+        """
+        alternatives = [
+            re.sub(r'(?<!\\)\((?!\?)', f'(?P<p{index}>', pattern, count=1)
+            for index, pattern in enumerate(patterns)
+        ]
+        return re.compile('(?=' + '|'.join(f'(?:{alt})' for alt in alternatives) + ')', re.IGNORECASE)
     
     def analyze_query(self, query: str) -> QueryAnalysis:
         """
         ✅ ENHANCED: Nutzt jetzt Preprocessing
         """
         # ✅ SCHRITT 1: Preprocessing
-        preprocessed = self.preprocessor.preprocess(query)
+        return self.analyze_preprocessed(self.preprocessor.preprocess(query))
+    
+    def analyze_preprocessed(self, preprocessed: Dict[str, Any]) -> QueryAnalysis:
+        """Routing auf bereits vorverarbeiteter Query (Preprocessing separat messbar)"""
         cleaned_query = preprocessed['cleaned']
         original_query = preprocessed['original']
         
         logger.debug(f"📊 Analyzing: '{cleaned_query}'")
         
         # ✅ SCHRITT 2: Definition-Query?
-        is_definition_query = any(kw in cleaned_query for kw in self.definition_keywords)
+        is_definition_query = self._definition_regex.search(cleaned_query) is not None
         
         if is_definition_query:
             return self._analyze_definition_query(cleaned_query, preprocessed, original_query)
@@ -250,29 +670,22 @@ class AdvancedQueryRouter:
         
         detected_law = preprocessed.get('law')
         
-        # Prüfe ob Term in Listen
-        if self._term_in_list(extracted_term, self.defined_terms_ki_vo):
-            return QueryAnalysis(
-                pipeline_type=PipelineType.DEFINITIONS_KI_VO,
-                confidence=0.95,
-                detected_patterns=[f"def_{extracted_term}"],
-                extracted_references={'term': extracted_term, 'law': 'KI-Verordnung'},
-                normalized_query=cleaned_query,
-                original_query=original_query
-            )
+        # Prüfe ob Term definiert ist (im erwähnten Gesetz bevorzugt)
+        defined_term, exact = self._match_defined_term(extracted_term, detected_law)
         
-        elif self._term_in_list(extracted_term, self.defined_terms_dsgvo):
+        if defined_term and defined_term.law in ('KI-Verordnung', 'DSGVO'):
+            pipeline = PipelineType.DEFINITIONS_KI_VO if defined_term.law == 'KI-Verordnung' else PipelineType.DEFINITIONS_DSGVO
             return QueryAnalysis(
-                pipeline_type=PipelineType.DEFINITIONS_DSGVO,
-                confidence=0.95,
+                pipeline_type=pipeline,
+                confidence=0.95 if exact else 0.85,
                 detected_patterns=[f"def_{extracted_term}"],
-                extracted_references={'term': extracted_term, 'law': 'DSGVO'},
+                extracted_references={'term': extracted_term, 'law': defined_term.law},
                 normalized_query=cleaned_query,
                 original_query=original_query
             )
         
         # Law im Query erwähnt → nutze diese Law
-        elif detected_law:
+        if detected_law:
             pipeline = PipelineType.DEFINITIONS_KI_VO if detected_law == 'KI-Verordnung' else PipelineType.DEFINITIONS_DSGVO
             return QueryAnalysis(
                 pipeline_type=pipeline,
@@ -301,22 +714,23 @@ class AdvancedQueryRouter:
         detected_patterns = []
         extracted_references = {}
         
-        # Durchsuche alle Pattern-Typen
-        for pattern_type, patterns in self.keyword_patterns.items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, cleaned_query, re.IGNORECASE)
-                for match in matches:
-                    reference = match.group(1)
-                    
-                    # Normalisiere Römische Zahlen
-                    if pattern_type in ['anhang', 'kapitel']:
-                        reference = self._normalize_number(reference)
-                    
-                    detected_patterns.append(f"{pattern_type}_{reference}")
-                    if pattern_type not in extracted_references:
-                        extracted_references[pattern_type] = []
-                    if reference not in extracted_references[pattern_type]:
-                        extracted_references[pattern_type].append(reference)
+        # Durchsuche alle Pattern-Typen (ein Scan pro Typ)
+        for pattern_type, regex in self._keyword_regexes.items():
+            # Reihenfolge wie bei einzelnen Patterns: erst Pattern-Index, dann Position
+            matches = sorted(
+                (int(match.lastgroup[1:]), match.start(), match.group(match.lastgroup))
+                for match in regex.finditer(cleaned_query)
+            )
+            for _, _, reference in matches:
+                # Normalisiere Römische Zahlen
+                if pattern_type in ['anhang', 'kapitel']:
+                    reference = self._normalize_number(reference)
+                
+                detected_patterns.append(f"{pattern_type}_{reference}")
+                if pattern_type not in extracted_references:
+                    extracted_references[pattern_type] = []
+                if reference not in extracted_references[pattern_type]:
+                    extracted_references[pattern_type].append(reference)
         
         # Wenn Patterns gefunden → Keyword Pipeline
         if detected_patterns:
@@ -339,60 +753,36 @@ class AdvancedQueryRouter:
     def _extract_term(self, query: str) -> Optional[str]:
         """Extrahiere Term aus Definition-Query"""
         query_lower = query.lower()
-        query_clean = re.sub(r'\b(?:laut|gemäß|nach|der|des)\s+(?:ki-verordnung|ki-vo|dsgvo|art\.?\s*\d+)\b', '', query_lower)
-        query_clean = re.sub(r'\b(?:ki-verordnung|ki-vo|dsgvo)\b', '', query_clean)
+        query_clean = self._term_law_regex.sub('', query_lower)
+        query_clean = self._law_name_regex.sub('', query_clean)
         
-        # Pattern 1: "wie wird X definiert"
-        match = re.search(r'wie\s+(?:wird|werden)\s+(.+?)\s+(?:definiert|bezeichnet)', query_clean)
-        if match:
-            return self._clean_term(match.group(1))
-        
-        # Pattern 2: "was bedeutet X"
-        match = re.search(r'was\s+(?:bedeutet|ist|sind)\s+(?:ein|eine|der|die|das)?\s*(.+?)(?:\?|$)', query_clean)
-        if match:
-            return self._clean_term(match.group(1))
-        
-        # Pattern 3: "definition von X"
-        match = re.search(r'definition\s+(?:von|für|des|der)\s+(.+?)(?:\?|$)', query_clean)
-        if match:
-            return self._clean_term(match.group(1))
+        # Pattern 1-3 in Prioritätsreihenfolge: "wie wird X definiert", "was bedeutet X", "definition von X"
+        for pattern in self._term_patterns:
+            match = pattern.search(query_clean)
+            if match:
+                return self._clean_term(match.group(1))
         
         return None
     
     def _clean_term(self, term: str) -> str:
         """Säubere extrahierten Term"""
-        term = re.sub(r'[?.,!]', '', term)
-        term = re.sub(r'^(?:ein|eine|der|die|das|den|dem|laut|gemäß|nach)\s+', '', term)
-        term = re.sub(r'\s+(?:laut|gemäß|nach|der|des)$', '', term)
+        term = self._punctuation_regex.sub('', term)
+        term = self._leading_words_regex.sub('', term)
+        term = self._trailing_words_regex.sub('', term)
         return term.strip()
     
-    def _term_in_list(self, term: str, term_list: List[str]) -> bool:
-        """Prüfe ob Term in Liste (mit Fuzzy-Matching)"""
-        term_clean = term.lower().strip()
-        
-        if term_clean in term_list:
-            return True
-        
-        # Varianten
-        term_variants = [
-            term_clean,
-            term_clean.replace('-', ' '),
-            term_clean.replace(' ', '-'),
-            term_clean.replace('-', ''),
-            term_clean.replace(' ', ''),
-        ]
-        
-        for variant in term_variants:
-            if variant in term_list:
-                return True
-        
-        # Fuzzy (Substring)
-        if len(term_clean) >= 4:
-            for defined_term in term_list:
-                if term_clean in defined_term or (defined_term in term_clean and len(defined_term) >= 4):
-                    return True
+    def _match_defined_term(self, term: str, detected_law: Optional[str]) -> Tuple[Optional[DefinedTerm], bool]:
+        """
+        Definierter Begriff für den Term - Index-Lookup statt linearer Suche über alle Begriffe
         
-        return False
+        Returns:
+            (Begriff oder None, exakter Treffer?)
+        """
+        for law in ([detected_law] if detected_law else []) + [None]:
+            defined_terms, exact = self.term_index.match_all(term, law=law)
+            if defined_terms:
+                return defined_terms[0], exact
+        return None, False
     
     def _normalize_number(self, num_str: str) -> str:
         """Konvertiere römische zu arabischen Zahlen"""
@@ -403,27 +793,75 @@ class AdvancedQueryRouter:
         return roman_to_arabic.get(num_str.strip().lower(), num_str)
 
 
+# ==============================================================================
+# CHUNK STORE - ✅ NEU IN V3.1
+# ==============================================================================
+
+class ChunkStore:
+    """
+    Alle Chunks genau einmal, adressiert über ihre stabile Chunk-ID (metadata['chunk_id'])
+    - Metadata- und Definitions-Index halten nur IDs → Deduplizierung über ID-Sets
+    - Reihenfolge = Ingestion-Reihenfolge
+    Nach dem Bau unveränderlich, daher ohne Lock von parallelen Requests nutzbar.
+    """
+    
+    def __init__(self, chunks: List[Document]):
+        self._chunks: Dict[str, Document] = {}
+        for chunk in chunks:
+            chunk_id = chunk.metadata['chunk_id']
+            if chunk_id in self._chunks:
+                raise ValueError(f"Doppelte Chunk-ID: {chunk_id}")
+            self._chunks[chunk_id] = chunk
+    
+    def __getitem__(self, chunk_id: str) -> Document:
+        return self._chunks[chunk_id]
+    
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._chunks
+    
+    def __iter__(self) -> Iterator[Document]:
+        return iter(self._chunks.values())
+    
+    def __len__(self) -> int:
+        return len(self._chunks)
+    
+    def get_many(self, chunk_ids) -> List[Document]:
+        return [self._chunks[chunk_id] for chunk_id in chunk_ids]
+
+
 # ==============================================================================
 # KEYWORD RETRIEVER - FROM V2.0 (unverändert, funktioniert gut)
 # ==============================================================================
 
 class KeywordMetadataRetriever:
-    def __init__(self, vectorstore, all_chunks: List[Document]):
+    def __init__(
+        self,
+        vectorstore,
+        chunk_store: ChunkStore,
+        metadata_index: Optional[Dict[str, Dict[str, List[str]]]] = None
+    ):
         self.vectorstore = vectorstore
-        self.all_chunks = all_chunks
-        self.metadata_index = self._build_metadata_index()
+        self.chunk_store = chunk_store
+        # ✅ Index aus Snapshot übernehmen statt neu zu bauen
+        index = metadata_index if metadata_index is not None else self._build_metadata_index()
+        # ✅ Unveränderlich (Tuples mit Chunk-IDs), da von parallelen Requests geteilt
+        self.metadata_index = {
+            index_type: {key: tuple(chunk_ids) for key, chunk_ids in sub_index.items()}
+            for index_type, sub_index in index.items()
+        }
         logger.info(f"📊 Metadata-Index erstellt: {self._get_index_stats()}")
     
-    def _build_metadata_index(self) -> Dict[str, Dict[str, List[Document]]]:
-        """Baue Index aus Metadata"""
+    def _build_metadata_index(self) -> Dict[str, Dict[str, List[str]]]:
+        """Baue Index aus Metadata (Nummer → Chunk-IDs)"""
         index = {
             'artikel': {},
             'erwägungsgrund': {},
             'anhang': {}
         }
         
-        for chunk in self.all_chunks:
+        for chunk in self.chunk_store:
             metadata = chunk.metadata
+            chunk_id = metadata['chunk_id']
             source_type = metadata.get('source_type', '').lower()
             
             # Index für Artikel
@@ -436,7 +874,7 @@ class KeywordMetadataRetriever:
                         artikel_num = match.group(1)
                         if artikel_num not in index['artikel']:
                             index['artikel'][artikel_num] = []
-                        index['artikel'][artikel_num].append(chunk)
+                        index['artikel'][artikel_num].append(chunk_id)
                     break
             
             # Index für Erwägungsgründe (Multi-Strategie aus v2.0)
@@ -475,7 +913,7 @@ class KeywordMetadataRetriever:
                 if ewg_num:
                     if ewg_num not in index['erwägungsgrund']:
                         index['erwägungsgrund'][ewg_num] = []
-                    index['erwägungsgrund'][ewg_num].append(chunk)
+                    index['erwägungsgrund'][ewg_num].append(chunk_id)
             
             # Index für Anhänge
             if 'anhang' in source_type:
@@ -488,7 +926,7 @@ class KeywordMetadataRetriever:
                             anhang_num = self._normalize_number(match.group(1))
                             if anhang_num not in index['anhang']:
                                 index['anhang'][anhang_num] = []
-                            index['anhang'][anhang_num].append(chunk)
+                            index['anhang'][anhang_num].append(chunk_id)
                         break
         
         return index
@@ -510,48 +948,47 @@ class KeywordMetadataRetriever:
         }
         return roman_to_arabic.get(num_str.strip().lower(), num_str)
     
-    def retrieve_by_metadata(self, extracted_references: Dict[str, Any], k: int = 5) -> List[Document]:
-        """Retrieve mit Validierung (aus v2.0)"""
-        logger.info(f"🔍 Keyword-Suche: {extracted_references}")
+    def retrieve_by_metadata(
+        self,
+        extracted_references: Dict[str, Any],
+        k: int = 5,
+        filter_law: Optional[str] = None
+    ) -> List[Document]:
+        """Retrieve mit Validierung (aus v2.0), Gesetzesfilter vor dem k-Limit"""
+        logger.info(f"🔍 Keyword-Suche: {extracted_references} (Filter: {filter_law})")
         results = []
         
         # Artikel
         if 'artikel' in extracted_references:
             for artikel_num in extracted_references['artikel']:
-                if str(artikel_num) in self.metadata_index['artikel']:
-                    results.extend(self.metadata_index['artikel'][str(artikel_num)])
+                results.extend(self.metadata_index['artikel'].get(str(artikel_num), ()))
         
         # Erwägungsgründe mit Validierung
         if 'erwägungsgrund' in extracted_references:
             for ewg_num in extracted_references['erwägungsgrund']:
-                if str(ewg_num) in self.metadata_index['erwägungsgrund']:
-                    found_docs = self.metadata_index['erwägungsgrund'][str(ewg_num)]
-                    
-                    validated_docs = []
-                    for doc in found_docs:
-                        if self._validate_ewg_in_content(doc, ewg_num):
-                            validated_docs.append(doc)
-                    
-                    results.extend(validated_docs)
+                for chunk_id in self.metadata_index['erwägungsgrund'].get(str(ewg_num), ()):
+                    if self._validate_ewg_in_content(self.chunk_store[chunk_id], ewg_num):
+                        results.append(chunk_id)
         
         # Anhänge
         if 'anhang' in extracted_references:
             for anhang_num in extracted_references['anhang']:
-                normalized = self._normalize_number(anhang_num)
-                if normalized in self.metadata_index['anhang']:
-                    results.extend(self.metadata_index['anhang'][normalized])
+                results.extend(self.metadata_index['anhang'].get(self._normalize_number(anhang_num), ()))
         
-        # Deduplizieren
+        # Deduplizieren über Chunk-IDs
         unique_results = []
         seen = set()
         
-        for doc in results:
-            h = hash(doc.page_content[:100])
-            if h not in seen:
-                unique_results.append(doc)
-                seen.add(h)
-                if len(unique_results) >= k:
-                    break
+        for chunk_id in results:
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            doc = self.chunk_store[chunk_id]
+            if filter_law and doc.metadata.get('source_law') != filter_law:
+                continue
+            unique_results.append(doc)
+            if len(unique_results) >= k:
+                break
         
         logger.info(f"🎯 Keyword-Retrieval: {len(unique_results)} Dokumente")
         return unique_results
@@ -577,23 +1014,28 @@ class KeywordMetadataRetriever:
 # ==============================================================================
 
 class DefinitionsRetriever:
-    def __init__(self, vectorstore, qdrant_client, collection_name, all_chunks, embeddings):
+    def __init__(self, vectorstore, qdrant_client, collection_name, chunk_store, embeddings, definitions_index=None):
         self.vectorstore = vectorstore
         self.qdrant_client = qdrant_client
         self.collection_name = collection_name
-        self.all_chunks = all_chunks
+        self.chunk_store = chunk_store
         self.embeddings = embeddings
-        self.definitions_index = self._build_index()
+        index = definitions_index if definitions_index is not None else self._build_index()
+        # ✅ Unveränderlich (Tuples mit Chunk-IDs), da von parallelen Requests geteilt
+        self.definitions_index = {variant: tuple(chunk_ids) for variant, chunk_ids in index.items()}
+        # ✅ NEU IN V3.1: Term-Index über die Begriffe (wird mit dem Router geteilt)
+        self.term_index = DefinedTermIndex.from_definitions_index(self.definitions_index, chunk_store)
     
-    def _build_index(self) -> Dict[str, List[Document]]:
+    def _build_index(self) -> Dict[str, List[str]]:
+        """Schreibvariante → Chunk-IDs"""
         index = {}
         definition_chunks = [
-            c for c in self.all_chunks 
+            c for c in self.chunk_store 
             if c.metadata.get('source_type') == 'Begriffsbestimmungen'
         ]
         
         for chunk in definition_chunks:
-            match = re.search(r'###\s*(\d+)\.\s*([^\n]+)', chunk.page_content)
+            match = DEFINITION_HEADER.search(chunk.page_content)
             
             if match:
                 term_raw = match.group(2).strip()
@@ -601,11 +1043,11 @@ class DefinitionsRetriever:
                 term_lower = term_clean.lower()
                 variants = self._generate_variants(term_lower)
                 
+                # Varianten sind eindeutig und jeder Chunk kommt einmal vor → keine Duplikate pro Variante
                 for variant in variants:
                     if variant not in index:
                         index[variant] = []
-                    if chunk not in index[variant]:
-                        index[variant].append(chunk)
+                    index[variant].append(chunk.metadata['chunk_id'])
         
         return index
     
@@ -628,230 +1070,1680 @@ class DefinitionsRetriever:
         return list(variants)
     
     def retrieve_definition(self, term: str, law: Optional[str] = None, k: int = 2) -> List[Document]:
-        search_variants = self._generate_variants(term.lower())
-        
-        found_docs = []
-        
-        for variant in search_variants:
-            if variant in self.definitions_index:
-                docs = self.definitions_index[variant]
-                
-                if law:
-                    docs = [d for d in docs if d.metadata.get('source_law') == law]
-                
-                found_docs.extend(docs)
-                break
-        
-        if not found_docs:
-            found_docs = self._fuzzy_search_in_index(term.lower(), law)
+        # Exakt → enthaltene Begriffe (längster zuerst) → Wortanfang (statt linearer Suche über den Index)
+        defined_terms, _ = self.term_index.match_all(term, law=law)
         
         unique_docs = []
-        seen_hashes = set()
-        
-        for doc in found_docs:
-            doc_hash = hash(doc.page_content[:200])
-            if doc_hash not in seen_hashes:
-                unique_docs.append(doc)
-                seen_hashes.add(doc_hash)
-        
-        return unique_docs[:k] if unique_docs else []
-    
-    def _fuzzy_search_in_index(self, term: str, law: Optional[str]) -> List[Document]:
-        term_clean = term.lower().strip()
-        found_docs = []
+        seen = set()
         
-        for index_key, docs in self.definitions_index.items():
-            if term_clean in index_key or index_key in term_clean:
-                if len(term_clean) >= 4 and len(index_key) >= 4:
-                    if law:
-                        docs = [d for d in docs if d.metadata.get('source_law') == law]
-                    
-                    found_docs.extend(docs)
-                    break
+        for defined_term in defined_terms:
+            for doc in defined_term.docs:
+                chunk_id = doc.metadata['chunk_id']
+                if chunk_id not in seen:
+                    unique_docs.append(doc)
+                    seen.add(chunk_id)
+                    if len(unique_docs) >= k:
+                        return unique_docs
         
-        return found_docs
+        return unique_docs
 
 
 # ==============================================================================
-# TRIPLE PIPELINE MANAGER - ✅ ENHANCED IN V3.0
+# EMBEDDING CACHE - ✅ NEU IN V3.1
 # ==============================================================================
 
-class TriplePipelineManager:
-    def __init__(
-        self,
-        vectorstore,
-        qdrant_client,
-        collection_name,
-        llm,
-        qa_chain,
-        advanced_router,
-        keyword_retriever,
-        definitions_retriever
-    ):
-        self.vectorstore = vectorstore
-        self.qdrant_client = qdrant_client
-        self.collection_name = collection_name
-        self.llm = llm
-        self.qa_chain = qa_chain
-        self.router = advanced_router
-        self.keyword_retriever = keyword_retriever
-        self.definitions_retriever = definitions_retriever
-    
-    def process_query(self, query: str, filter_law: Optional[str] = None) -> Dict[str, Any]:
-        logger.info(f"\n{'='*70}")
-        logger.info(f"📥 NEUE ANFRAGE: {query}")
-        logger.info(f"{'='*70}")
-        
-        # Check if context needed
-        needs_context = self._needs_conversation_context(query)
-        
-        if needs_context:
-            logger.info("🔵 Pipeline: SEMANTIC (Kontext benötigt)")
-            return self._handle_semantic(query, filter_law)
-        
-        # ✅ Routing mit Enhanced Router (inkl. Preprocessing)
-        analysis = self.router.analyze_query(query)
-        
-        logger.info(f"🎯 Query-Analyse: {analysis.pipeline_type.value} (Confidence: {analysis.confidence:.2f})")
-        logger.info(f"   Normalized: '{analysis.normalized_query}'")
-        logger.info(f"   Referenzen: {analysis.extracted_references}")
-        
-        # Route zu Pipeline
-        if analysis.pipeline_type in [
-            PipelineType.DEFINITIONS_KI_VO,
-            PipelineType.DEFINITIONS_DSGVO,
-            PipelineType.DEFINITIONS_GENERIC
-        ]:
-            logger.info("🟡 Pipeline: DEFINITIONS")
-            return self._handle_definitions(query, analysis)
-        
-        elif analysis.pipeline_type == PipelineType.KEYWORD_METADATA:
-            logger.info("🟢 Pipeline: KEYWORD/METADATA")
-            return self._handle_keyword_metadata(query, analysis, filter_law)
-        
-        else:
-            logger.info("🔵 Pipeline: SEMANTIC (Default)")
-            return self._handle_semantic(query, filter_law)
-    
-    def _needs_conversation_context(self, query: str) -> bool:
-        """Prüfe ob Kontext aus Historie benötigt wird"""
-        query_lower = query.lower()
-        
-        context_indicators = [
-            'das', 'dies', 'diese', 'dieser', 'unterschied', 'vergleich',
-            'auch', 'zusätzlich', 'und was', 'wie ist',
-        ]
-        
-        has_indicator = any(indicator in query_lower for indicator in context_indicators)
-        word_count = len(query.split())
-        is_short = word_count < 5
-        has_history = len(self.qa_chain.memory.chat_memory.messages) > 0
-        
-        return (has_indicator or is_short) and has_history
-    
-    def _handle_definitions(self, query: str, analysis: QueryAnalysis) -> Dict[str, Any]:
-        """Handle Definition-Pipeline"""
-        term = analysis.extracted_references.get('term')
-        law = analysis.extracted_references.get('law')
-        
-        logger.info(f"🔍 Definitions-Suche: Term='{term}', Law='{law}'")
-        
-        docs = self.definitions_retriever.retrieve_definition(term, law, k=2)
-        
-        if not docs:
-            logger.warning(f"⚠️ Keine Definition für '{term}' - Fallback zu Semantic")
-            return self._handle_semantic(query, law)
-        
-        logger.info(f"✅ {len(docs)} Definitions-Chunks gefunden")
-        
-        context = "\n\n".join([
-            f"📖 DEFINITION aus {doc.metadata.get('source_law')} {doc.metadata.get('artikel')}:\n{doc.page_content}"
-            for doc in docs
-        ])
-        
-        chat_history = self._get_chat_history_text()
-        
-        prompt = f"""Du bist ein erfahrener Rechtsexperte für EU-Regulierungen. Beantworte die Frage natürlich und verständlich.
+class EmbeddingCacheStore:
+    """
+    Persistenter, content-adressierter Embedding-Speicher (SQLite)
+    - Key: SHA-256 über Embedding-Modell + Chunk-Text
+    - Value: Vektor als float64-Bytes
+    """
 
-ANTWORTSTRUKTUR:
+    SQLITE_BATCH = 500  # SQLite Limit für Platzhalter pro Statement
 
-1. Beginne mit dem vollständigen Originaltext in Anführungszeichen mit Quellenangabe in Klammern.
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
 
-2. Erkläre dann in 2-4 Sätzen die praktische Bedeutung. Nutze wenn möglich ein konkretes Beispiel.
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
 
-3. Schließe mit einer weiterführenden Frage ab.
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Lade alle vorhandenen Vektoren für die Keys"""
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
 
-4. Am Ende liste die Quellen auf.
+        with self._lock:
+            for start in range(0, len(unique_keys), self.SQLITE_BATCH):
+                batch = unique_keys[start:start + self.SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
 
-{chat_history}
+                for key, blob in rows:
+                    found[key] = array('d', blob).tolist()
 
-VERFÜGBARE DEFINITIONEN:
-{context}
+        return found
 
-FRAGE: {query}
+    def put_many(self, vectors: Dict[str, List[float]]):
+        """Speichere Vektoren (überschreibt bestehende Keys)"""
+        if not vectors:
+            return
 
-ANTWORT:"""
-        
-        response = self.llm.invoke(prompt)
-        self._save_to_memory(query, response.content)
-        
-        return {
-            'result': response.content,
-            'source_documents': docs,
-            'pipeline_used': f'definitions_{analysis.pipeline_type.value}'
-        }
-    
-    def _handle_keyword_metadata(self, query: str, analysis: QueryAnalysis, filter_law: Optional[str]) -> Dict[str, Any]:
-        """Handle Keyword/Metadata-Pipeline mit Fallbacks"""
-        
-        docs = self.keyword_retriever.retrieve_by_metadata(
-            analysis.extracted_references,
-            k=5
-        )
-        
-        if filter_law and docs:
-            docs = [d for d in docs if d.metadata.get('source_law') == filter_law]
-        
-        # Fallback wenn nichts gefunden
-        if not docs:
-            logger.warning("❌ Keyword fand NICHTS - Fallback zu Semantic")
-            
-            semantic_result = self._handle_semantic(query, filter_law)
-            semantic_result['result'] = (
-                f"ℹ️ *Ich konnte die angeforderten Rechtstexte nicht direkt finden. "
-                f"Hier ist eine semantische Suche zum Thema:*\n\n" +
-                semantic_result['result']
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array('d', vector).tobytes()) for key, vector in vectors.items()]
             )
-            semantic_result['pipeline_used'] = 'keyword_fallback_to_semantic'
-            
-            return semantic_result
-        
-        # Validierung für EWGs
-        if 'erwägungsgrund' in analysis.extracted_references:
-            requested_ewgs = set(analysis.extracted_references['erwägungsgrund'])
-            found_ewgs = set()
-            
-            for doc in docs:
-                for ewg_num in requested_ewgs:
-                    if self.keyword_retriever._validate_ewg_in_content(doc, str(ewg_num)):
-                        found_ewgs.add(str(ewg_num))
-            
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+# HTTP-Status, bei denen ein erneuter Versuch sinnvoll ist
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def raise_for_status(response: httpx.Response):
+    """httpx Response-Hook: HTTP-Fehler als HTTPStatusError (statt KeyError auf 'data')"""
+    if response.is_error:
+        response.read()
+        response.raise_for_status()
+
+
+async def araise_for_status(response: httpx.Response):
+    """Async-Variante für httpx.AsyncClient (Hooks werden dort awaited)"""
+    if response.is_error:
+        await response.aread()
+        response.raise_for_status()
+
+
+CHARS_PER_TOKEN = 3  # konservativ für deutsche Rechtstexte
+
+
+def estimate_tokens(text: str) -> int:
+    """Token-Schätzung über Zeichen (ohne Tokenizer, für Budgets)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class BatchEmbedder:
+    """
+    Embedding-Stufe für den Index-Aufbau
+    - Batches nach Token-Budget (Schätzung über Zeichen) und max. Texten pro Batch
+    - Begrenzte Anzahl paralleler Requests
+    - Retry mit exponentiellem Backoff bei 429/5xx/Netzwerkfehlern (Retry-After wird beachtet)
+    - Bei 429 pausieren alle Worker gemeinsam (kein Weiterfeuern ins Rate-Limit)
+    - on_batch-Callback pro fertigem Batch im aufrufenden Thread (z.B. Upsert in Qdrant)
+    """
+    
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_batch_tokens: int = 8000,
+        max_batch_size: int = 128,
+        max_concurrency: int = 4,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0
+    ):
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self.batches = 0
+        self.retries = 0
+        self.rate_limited = 0
+    
+    def estimate_tokens(self, text: str) -> int:
+        return estimate_tokens(text)
+    
+    def make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Indizes der Texte in Batches unter Token-Budget und Batch-Größe"""
+        batches = []
+        batch = []
+        batch_tokens = 0
+        
+        for i, text in enumerate(texts):
+            tokens = self.estimate_tokens(text)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def embed(
+        self,
+        texts: List[str],
+        on_batch: Optional[Callable[[List[int], List[List[float]]], None]] = None
+    ) -> List[List[float]]:
+        results = [None] * len(texts)
+        batches = self.make_batches(texts)
+        
+        pool = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            futures = {
+                pool.submit(self._embed_batch, [texts[i] for i in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                vectors = future.result()
+                for i, vector in zip(batch, vectors):
+                    results[i] = vector
+                if on_batch:
+                    on_batch(batch, vectors)
+        finally:
+            # Bei Fehler keine weiteren Batches mehr starten
+            pool.shutdown(wait=True, cancel_futures=True)
+        
+        return results
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            self._wait_if_paused()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                with self._lock:
+                    self.batches += 1
+                return vectors
+            except Exception as e:
+                status, retry_after = self._classify(e)
+                retryable = status in RETRYABLE_STATUS_CODES or isinstance(e, httpx.TransportError)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                
+                delay = retry_after or min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                with self._lock:
+                    self.retries += 1
+                    if status == 429:
+                        self.rate_limited += 1
+                        self._paused_until = max(self._paused_until, time.time() + delay)
+                
+                logger.warning(f"⚠️ Embedding-Batch fehlgeschlagen ({status or type(e).__name__}) - Retry in {delay:.1f}s")
+                if status != 429:
+                    time.sleep(delay)
+    
+    def _wait_if_paused(self):
+        with self._lock:
+            remaining = self._paused_until - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+    
+    @staticmethod
+    def _classify(error: Exception) -> Tuple[Optional[int], Optional[float]]:
+        """(HTTP-Status, Retry-After in Sekunden) aus einem Fehler"""
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None, None
+        
+        retry_after = None
+        try:
+            retry_after = float(response.headers.get('retry-after'))
+        except (TypeError, ValueError):
+            pass
+        return response.status_code, retry_after
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'retries': self.retries,
+                'rate_limited': self.rate_limited,
+                'max_concurrency': self.max_concurrency
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings-Wrapper mit Disk-Cache
+    - Unveränderte Chunks werden von Disk geladen
+    - Nur neue/geänderte Chunks gehen (gebatcht) an das Embedding-Modell
+    - Jeder fertige Batch wird sofort gespeichert → Abbruch verliert keine Arbeit
+    - Queries werden nicht gecacht (immer neu)
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        store: EmbeddingCacheStore,
+        model_name: str,
+        batcher: Optional[BatchEmbedder] = None
+    ):
+        self.embeddings = embeddings
+        self.store = store
+        self.model_name = model_name
+        self.batcher = batcher if batcher is not None else BatchEmbedder(embeddings)
+        self.hits = 0           # Texte, die schon vor dem Aufruf im Store lagen
+        self.misses = 0         # neu eingebettete Texte
+        self.duplicates = 0     # Wiederholungen innerhalb eines Aufrufs (nur einmal eingebettet)
+        self._stats_lock = threading.Lock()
+
+    def cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(
+        self,
+        texts: List[str],
+        on_batch: Optional[Callable[[List[int], List[List[float]]], None]] = None
+    ) -> List[List[float]]:
+        """
+        Args:
+            on_batch: Optionaler Callback (Text-Indizes, Vektoren) - erst für alle
+                      Cache-Treffer, dann pro fertig eingebettetem Batch
+        """
+        keys = [self.cache_key(text) for text in texts]
+        vectors = self.store.get_many(keys)
+        found = sum(1 for key in keys if key in vectors)
+
+        # Nur fehlende (und deduplizierte) Texte einbetten
+        missing = {}
+        positions = {}
+        for i, (key, text) in enumerate(zip(keys, texts)):
+            if key in vectors:
+                continue
+            if key not in missing:
+                missing[key] = text
+                positions[key] = []
+            positions[key].append(i)
+
+        if on_batch:
+            cached = [i for i, key in enumerate(keys) if key in vectors]
+            if cached:
+                on_batch(cached, [vectors[keys[i]] for i in cached])
+
+        if missing:
+            missing_keys = list(missing.keys())
+
+            def store_batch(batch: List[int], batch_vectors: List[List[float]]):
+                new_entries = {missing_keys[j]: vector for j, vector in zip(batch, batch_vectors)}
+                self.store.put_many(new_entries)
+                vectors.update(new_entries)
+                if on_batch:
+                    indices = [i for key in new_entries for i in positions[key]]
+                    on_batch(indices, [vectors[keys[i]] for i in indices])
+
+            self.batcher.embed(list(missing.values()), on_batch=store_batch)
+
+        with self._stats_lock:
+            self.hits += found
+            self.misses += len(missing)
+            self.duplicates += len(texts) - found - len(missing)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'model': self.model_name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'duplicates': self.duplicates,
+            'entries': len(self.store),
+            'batching': self.batcher.get_stats()
+        }
+
+
+# ==============================================================================
+# REQUEST TRACING - ✅ NEU IN V3.1
+# ==============================================================================
+
+class RequestTrace:
+    """
+    Zeitmessung pro Stufe einer Anfrage (Preprocessing, Routing, Retrieval, Kontext, LLM, Memory)
+    - stage() als Context-Manager, liefert den Eintrag für Zusatzinfos (z.B. Tokens)
+    - Gehört zum RequestContext → nie zwischen Anfragen geteilt
+    """
+    
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+    
+    @contextmanager
+    def stage(self, name: str, **info: Any) -> Iterator[Dict[str, Any]]:
+        entry = {'stage': name, **info}
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self.stages.append(entry)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            'stages': list(self.stages)
+        }
+
+
+class LatencyRecorder:
+    """
+    Latenz-Histogramme pro Pipeline und Stufe (über alle Anfragen)
+    - Feste Buckets in ms (kumulativ zählbar, konstanter Speicher)
+    - p50/p95/p99 über ein gleitendes Fenster der letzten Messwerte
+    """
+    
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+    
+    def __init__(self, window: int = 2000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], Tuple[deque, List[int]]] = {}
+    
+    def record(self, pipeline: str, trace: Dict[str, Any]):
+        """trace: RequestTrace.to_dict() einer abgeschlossenen Anfrage"""
+        # Stufen, die mehrfach vorkommen (z.B. zwei LLM-Calls), werden pro Anfrage summiert
+        durations: Dict[str, float] = {'total': trace['total_ms']}
+        for entry in trace['stages']:
+            durations[entry['stage']] = durations.get(entry['stage'], 0.0) + entry['ms']
+        
+        with self._lock:
+            for stage, ms in durations.items():
+                series = self._series.get((pipeline, stage))
+                if series is None:
+                    series = self._series[(pipeline, stage)] = (deque(maxlen=self.window), [0] * (len(self.BUCKETS_MS) + 1))
+                series[0].append(ms)
+                series[1][bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+    
+    def get_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{pipeline: {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms, buckets}}}"""
+        with self._lock:
+            snapshot = {key: (sorted(values), list(buckets)) for key, (values, buckets) in self._series.items()}
+        
+        def percentile(values: List[float], q: float) -> float:
+            return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+        
+        stats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for (pipeline, stage), (values, buckets) in sorted(snapshot.items()):
+            labels = [f"<={bound}" for bound in self.BUCKETS_MS] + ["+Inf"]
+            stats.setdefault(pipeline, {})[stage] = {
+                'count': sum(buckets),
+                'mean_ms': round(sum(values) / len(values), 3),
+                'p50_ms': percentile(values, 0.5),
+                'p95_ms': percentile(values, 0.95),
+                'p99_ms': percentile(values, 0.99),
+                'buckets': dict(zip(labels, buckets))
+            }
+        return stats
+    
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+# ==============================================================================
+# CONVERSATION SESSIONS - ✅ NEU IN V3.1
+# ==============================================================================
+
+DEFAULT_SESSION_ID = "default"
+
+
+class ConversationSession:
+    """
+    Leichtgewichtiger Konversations-Zustand pro User-Session
+    - Sliding Window über die letzten k Frage/Antwort-Paare
+    - Keine geteilten Ressourcen (Vektoren, Indizes, LLM liegen im Manager)
+    """
+    
+    def __init__(self, session_id: str, k: int = 5):
+        self.session_id = session_id
+        self.k = k
+        self.messages = []
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self._lock = threading.Lock()
+    
+    def get_history(self) -> Tuple[BaseMessage, ...]:
+        """Unveränderlicher Snapshot der Historie (für einen Request)"""
+        with self._lock:
+            return tuple(self.messages)
+    
+    def add_exchange(self, query: str, response: str):
+        with self._lock:
+            self.messages.append(HumanMessage(content=query))
+            self.messages.append(AIMessage(content=response))
+            # Nur das Window behalten → Speicher pro Session begrenzt
+            del self.messages[:-2 * self.k]
+    
+    def clear(self):
+        with self._lock:
+            self.messages = []
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'session_id': self.session_id,
+                'total_messages': len(self.messages),
+                'capacity': self.k
+            }
+
+
+@dataclass
+class RequestContext:
+    """Zustand einer einzelnen Anfrage (wird nie zwischen Requests geteilt)"""
+    query: str
+    filter_law: Optional[str]
+    session: ConversationSession
+    history: Tuple[BaseMessage, ...] = ()
+    trace: RequestTrace = field(default_factory=RequestTrace)
+
+
+@dataclass
+class GenerationPlan:
+    """
+    Ergebnis der Planungsphase (Routing + lokales Retrieval)
+    - prompt: fertiger Prompt (Definitions/Keyword)
+    - semantic: (Condense +) Vektor-Retrieval + QA-Prompt bei der Ausführung
+    - condense: Folgefrage mit Kontext-Bezug → vor dem Retrieval eigenständig machen
+    - supplement_prompt: Prompt aus zusätzlich semantisch gefundenen Docs (EWG-Hybrid)
+      → (Prompt, tatsächlich im Prompt verwendete Docs)
+    """
+    pipeline_used: str
+    source_documents: List[Document] = field(default_factory=list)
+    prompt: Optional[str] = None
+    semantic: bool = False
+    filter_law: Optional[str] = None
+    supplement_prompt: Optional[Callable[[List[Document]], Tuple[str, List[Document]]]] = None
+    answer_prefix: str = ""
+    cache_key: Optional[Tuple] = None
+    query_details: Tuple[str, ...] = ()     # frage-spezifische Wörter (Namen, Firmen) für den Ähnlichkeits-Cache
+    cached_result: Optional[Dict[str, Any]] = None
+    query_vector: Optional[List[float]] = None
+    condense: bool = False
+    history_dependent: bool = False     # ein Prompt enthielt die Chat-Historie → Antwort nie cachen
+    prompt_tokens: int = 0      # geschätzte Tokens aller LLM-Prompts dieser Anfrage
+    llm_calls: int = 0
+
+
+class SessionStore:
+    """
+    LRU + TTL Store für ConversationSessions
+    - max_sessions: älteste (least recently used) Session fliegt raus
+    - ttl_seconds: inaktive Sessions verfallen
+    """
+    
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600, k: int = 5):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.k = k
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, session_id: str) -> ConversationSession:
+        """Hole Session (legt neue an falls nicht vorhanden/abgelaufen)"""
+        now = time.time()
+        
+        with self._lock:
+            self._evict_expired(now)
+            
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ConversationSession(session_id, k=self.k)
+                self._sessions[session_id] = session
+                
+                while len(self._sessions) > self.max_sessions:
+                    evicted_id, _ = self._sessions.popitem(last=False)
+                    logger.info(f"🗑️ Session verdrängt (LRU): {evicted_id}")
+            else:
+                self._sessions.move_to_end(session_id)
+            
+            session.last_access = now
+            return session
+    
+    def remove(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+    
+    def _evict_expired(self, now: float):
+        # OrderedDict ist nach last_access sortiert → nur vorne prüfen
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            logger.info(f"⌛ Session abgelaufen (TTL): {session_id}")
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'active_sessions': len(self),
+            'max_sessions': self.max_sessions,
+            'ttl_seconds': self.ttl_seconds
+        }
+
+
+# ==============================================================================
+# ANSWER CACHE - ✅ NEU IN V3.1
+# ==============================================================================
+
+class AnswerCache:
+    """
+    LRU + TTL Cache für fertige Antworten
+    - Key: normalisierte Query + geroutete Pipeline + Referenzen + filter_law
+    - Definitionen: statt der Query die aufgelösten Begriffe + frage-spezifische Details
+      ("Was bedeutet KI-System?" und "Definition von KI-System laut KI-VO" → ein Eintrag)
+    - max_entries / max_total_chars begrenzen den Speicher
+    - Nur für Antworten, deren Prompts die Konversationshistorie nicht enthalten
+      (Bypass im Manager, siehe _prompt_uses_history) – der Key kennt keine Session
+    """
+    
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600, max_total_chars: int = 2_000_000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_total_chars = max_total_chars
+        self._entries = OrderedDict()  # key → (created_at, result)
+        self._total_chars = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(
+        analysis: QueryAnalysis,
+        filter_law: Optional[str],
+        defined_terms: Tuple[DefinedTerm, ...] = (),
+        details: Tuple[str, ...] = ()
+    ) -> Tuple:
+        if defined_terms:
+            # Gleiche Begriffe (und keine abweichenden Namen/Firmen) → gleiche Antwort, egal wie formuliert
+            terms = tuple((defined_term.law, defined_term.term) for defined_term in defined_terms)
+            return (('begriff', terms, details), analysis.pipeline_type.value, (), filter_law)
+        # Satzzeichen/Whitespace spielen für die Antwort keine Rolle
+        query = re.sub(r'[^\w\s-]', ' ', analysis.normalized_query)
+        query = re.sub(r'\s+', ' ', query).strip()
+        references = tuple(sorted(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in analysis.extracted_references.items()
+        ))
+        return (query, analysis.pipeline_type.value, references, filter_law)
+    
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            
+            if entry is not None and now - entry[0] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key: Tuple, result: Dict[str, Any]):
+        size = len(result['result'])
+        if self.max_entries <= 0 or size > self.max_total_chars:
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            
+            self._entries[key] = (time.time(), result)
+            self._total_chars += size
+            
+            while len(self._entries) > self.max_entries or self._total_chars > self.max_total_chars:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+    
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_chars = 0
+    
+    def _remove(self, key: Tuple):
+        _, result = self._entries.pop(key)
+        self._total_chars -= len(result['result'])
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'total_chars': self._total_chars,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class SimilarAnswerCache:
+    """
+    Zweite Cache-Stufe für unterschiedlich formulierte, gleiche Fragen
+    - Eigener kleiner Qdrant-Index (in-memory) mit bereits beantworteten Fragen
+    - Treffer nur ab Cosine-Threshold und im selben Scope (Pipeline + Referenzen + filter_law)
+    - Scope enthält die frage-spezifischen Details (Wörter, die der Korpus nicht kennt: Namen,
+      Firmen, Kennungen) – eine Frage zu einer anderen Person oder Firma bekommt nie die Antwort
+      einer anderen Session, umformulierte Fragen zum selben Thema treffen weiterhin
+    - per_session: Treffer nur innerhalb derselben Session
+    - Nur für Semantic-Pläne: der Query-Vektor wird vom Manager für das Vektor-Retrieval weiterverwendet
+    """
+    
+    COLLECTION_NAME = "answer_cache"
+    
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600,
+        per_session: bool = False
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.per_session = per_session
+        self.client = QdrantClient(":memory:")
+        self._entries = OrderedDict()  # point_id → (created_at, result)
+        self._next_id = 0
+        self._collection_ready = False
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def scope_for(self, cache_key: Tuple, details: Tuple[str, ...], session_id: str) -> str:
+        # Alles aus dem exakten Key außer der Formulierung der Frage, dafür ihre Details
+        scope = (cache_key[1:], details)
+        if self.per_session:
+            scope += (session_id,)
+        return repr(scope)
+    
+    def get(self, vector: List[float], scope: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            
+            points = self.client.query_points(
+                self.COLLECTION_NAME,
+                query=vector,
+                query_filter=Filter(must=[FieldCondition(key="scope", match=MatchValue(value=scope))]),
+                limit=1,
+                score_threshold=self.threshold
+            ).points
+            
+            entry = self._entries.get(points[0].id) if points else None
+            
+            if entry is not None and time.time() - entry[0] > self.ttl_seconds:
+                self._remove(points[0].id)
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(points[0].id)
+            self.hits += 1
+            logger.info(f"   Ähnlichkeit: {points[0].score:.3f}")
+            return entry[1]
+    
+    def put(self, vector: List[float], scope: str, result: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        
+        with self._lock:
+            if not self._collection_ready:
+                self.client.create_collection(
+                    collection_name=self.COLLECTION_NAME,
+                    vectors_config=VectorParams(size=len(vector), distance=Distance.COSINE)
+                )
+                self._collection_ready = True
+            
+            point_id = self._next_id
+            self._next_id += 1
+            self.client.upsert(
+                collection_name=self.COLLECTION_NAME,
+                points=[PointStruct(id=point_id, vector=vector, payload={"scope": scope})]
+            )
+            self._entries[point_id] = (time.time(), result)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def _remove(self, point_id: int):
+        self._entries.pop(point_id)
+        self.client.delete(collection_name=self.COLLECTION_NAME, points_selector=[point_id])
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'threshold': self.threshold,
+                'per_session': self.per_session,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+# ==============================================================================
+# PAYLOAD FILTER - ✅ NEU IN V3.1
+# ==============================================================================
+
+# Metadata-Felder mit Qdrant Payload-Index (Filter direkt in der Vektorsuche)
+# Nur Felder, nach denen ein Retriever tatsächlich filtert – jeder Index kostet beim Upsert
+INDEXED_METADATA_FIELDS = ('source_law',)
+
+
+def build_metadata_filter(**conditions: Optional[str]) -> Optional[Filter]:
+    """
+    Baue Qdrant-Filter über Chunk-Metadata, z.B. build_metadata_filter(source_law='DSGVO')
+    - None-Werte werden ignoriert (kein Filter → None)
+    """
+    must = [
+        FieldCondition(key=f"metadata.{name}", match=MatchValue(value=value))
+        for name, value in conditions.items()
+        if value is not None
+    ]
+    return Filter(must=must) if must else None
+
+
+# ==============================================================================
+# HYBRID RETRIEVAL (BM25 + VEKTOR) - ✅ NEU IN V3.1
+# ==============================================================================
+
+# Werden wie die Tokens nach der Umlaut-Transliteration verglichen
+GERMAN_STOPWORDS = frozenset(fold_umlauts(word) for word in """
+aber alle als also am an auch auf aus bei bis da damit dann das dass dem den denen der des die dies diese
+diesem diesen dieser dieses doch du durch ein eine einem einen einer eines er es für gegen hat hatte
+ich ihr im in ist jede jedem jeden jeder jedes kann kein keine man mit muss nach nicht noch nur ob oder
+ohne sich sie sind so soll sollen über um und uns unter vom von vor war was welche welchem welchen
+welcher welches wenn werden wer wie wird wir wo zu zum zur zwischen
+""".split())
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=65536)
+def german_stem(token: str) -> str:
+    """Leichtgewichtiger Stemmer nach CISTEM (Endungen em/er/nd, dann t/e/s/n iterativ)"""
+    while len(token) > 3:
+        if len(token) > 5 and token[-2:] in ('em', 'er', 'nd'):
+            token = token[:-2]
+        elif token[-1] in 'tesn':
+            token = token[:-1]
+        else:
+            break
+    return token
+
+
+def tokenize_german(text: str) -> List[str]:
+    """Tokens für BM25: klein, Umlaute transliteriert, ohne Stoppwörter, gestemmt"""
+    return [
+        german_stem(token)
+        for token in TOKEN_PATTERN.findall(fold_umlauts(text.lower()))
+        if token not in GERMAN_STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    In-Memory BM25 über alle Chunks
+    - Inverted Index: Token → (Chunk-Indizes, vorberechnete BM25-Gewichte) als numpy-Arrays
+    - Query: pro Query-Token eine vektorisierte Addition, Top-k per argpartition
+    - Gesetzesfilter als vorberechnete Masken (wie der Qdrant Payload-Filter)
+    """
+    
+    def __init__(self, chunks: List[Document], k1: float = 1.5, b: float = 0.75):
+        start = time.perf_counter()
+        self.chunks = chunks
+        
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for doc_index, chunk in enumerate(chunks):
+            tokens = tokenize_german(chunk.page_content)
+            lengths[doc_index] = len(tokens)
+            for token, count in Counter(tokens).items():
+                doc_indices, counts = postings.setdefault(token, ([], []))
+                doc_indices.append(doc_index)
+                counts.append(count)
+        
+        average_length = float(lengths.mean()) if len(chunks) else 0.0
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        for token, (doc_indices, counts) in postings.items():
+            indices = np.array(doc_indices, dtype=np.int32)
+            tf = np.array(counts, dtype=np.float32)
+            idf = np.log(1 + (len(chunks) - len(indices) + 0.5) / (len(indices) + 0.5))
+            norm = k1 * (1 - b + b * lengths[indices] / max(average_length, 1.0))
+            self._postings[token] = (indices, (idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+            self._idf[token] = float(idf)
+        # Unbekannte Tokens sind seltener als alles im Korpus
+        self._max_idf = float(np.log(1 + (len(chunks) + 0.5) / 0.5))
+        
+        laws = np.array([chunk.metadata.get('source_law') or '' for chunk in chunks], dtype=object)
+        self._law_masks = {law: laws == law for law in set(laws) if law}
+        
+        self.build_time = time.perf_counter() - start
+    
+    def search(self, query: str, k: int = 10, filter_law: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Top-k (Chunk-Index, Score), nur Chunks mit Score > 0"""
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in set(tokenize_german(query)):
+            posting = self._postings.get(token)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        
+        if filter_law:
+            mask = self._law_masks.get(filter_law)
+            if mask is None:
+                return []
+            scores[~mask] = 0.0
+        
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]  # Score absteigend, bei Gleichstand Korpus-Reihenfolge
+        return [(int(i), float(scores[i])) for i in top]
+    
+    def get_relevant_documents(self, query: str, k: int = 10, filter_law: Optional[str] = None) -> List[Document]:
+        return [self.chunks[i] for i, _ in self.search(query, k, filter_law)]
+    
+    def idf(self, token: str) -> float:
+        return self._idf.get(token, self._max_idf)
+    
+    def knows(self, token: str) -> bool:
+        return token in self._postings
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'chunks': len(self.chunks),
+            'vocabulary': len(self._postings),
+            'build_time_ms': round(self.build_time * 1000, 1)
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Reciprocal Rank Fusion: score(d) = Σ 1 / (rrf_k + rank)
+    Gleiche Chunks aus verschiedenen Quellen (Qdrant-Payload vs. In-Memory-Chunk)
+    werden über ihre Chunk-ID erkannt.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.metadata['chunk_id']
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, doc)
+    
+    # sorted ist stabil → bei Gleichstand gewinnt die frühere Quelle (Vektor-Suche)
+    ranked = sorted(scores, key=lambda key: -scores[key])
+    return [documents[key] for key in ranked[:k]]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    LangChain-Retriever (BaseRetriever) für die Semantic-Pipeline: Vektor-Suche (Qdrant) + BM25,
+    fusioniert per Reciprocal Rank Fusion
+    - Exakte Fachbegriffe ("Auftragsverarbeiter", "Konformitätsbewertung") kommen über BM25 nach oben
+    - Bereits berechneter Query-Vektor und Gesetzesfilter werden durchgereicht
+    - Ohne BM25-Index (sparse_index=None) reine Vektor-Suche wie bisher
+    - Mit Reranker: Over-Fetch von reranker.candidates Kandidaten, Reranker wählt die Top-k
+    """
+    
+    vectorstore: Any
+    sparse_index: Optional[BM25Index] = None
+    reranker: Any = None    # Optional[Reranker]
+    k: int = 3
+    fetch_k: int = 20       # Kandidaten pro Quelle vor der Fusion
+    rrf_k: int = 60
+    
+    class Config:
+        arbitrary_types_allowed = True
+    
+    def _candidate_k(self) -> int:
+        return max(self.k, self.reranker.candidates) if self.reranker is not None else self.k
+    
+    def _fuse(self, question: str, dense: List[Document], filter_law: Optional[str]) -> List[Document]:
+        if self.sparse_index is None:
+            candidates = dense[:self._candidate_k()]
+        else:
+            sparse = self.sparse_index.get_relevant_documents(question, self._fetch_k(), filter_law)
+            candidates = reciprocal_rank_fusion([dense, sparse], self._candidate_k(), self.rrf_k)
+        
+        if self.reranker is None:
+            return candidates
+        return self.reranker.rerank(question, candidates, self.k)
+    
+    def _fetch_k(self) -> int:
+        if self.sparse_index is None:
+            return self._candidate_k()
+        return max(self.fetch_k, self._candidate_k())
+    
+    def retrieve(
+        self,
+        question: str,
+        vector: Optional[List[float]] = None,
+        filter_law: Optional[str] = None
+    ) -> List[Document]:
+        if vector is None:
+            vector = self.vectorstore.embeddings.embed_query(question)
+        dense = self.vectorstore.similarity_search_by_vector(
+            vector, k=self._fetch_k(), filter=build_metadata_filter(source_law=filter_law)
+        )
+        return self._fuse(question, dense, filter_law)
+    
+    async def aretrieve(
+        self,
+        question: str,
+        vector: Optional[List[float]] = None,
+        filter_law: Optional[str] = None
+    ) -> List[Document]:
+        if vector is None:
+            vector = await self.vectorstore.embeddings.aembed_query(question)
+        dense = await self.vectorstore.asimilarity_search_by_vector(
+            vector, k=self._fetch_k(), filter=build_metadata_filter(source_law=filter_law)
+        )
+        return self._fuse(question, dense, filter_law)
+    
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.retrieve(query)
+    
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.aretrieve(query)
+
+
+# ==============================================================================
+# RERANKING - ✅ NEU IN V3.1
+# ==============================================================================
+
+@lru_cache(maxsize=4096)
+def document_terms(text: str) -> Tuple[Counter, frozenset, frozenset, int]:
+    """Token-Statistik eines Chunks für das Reranking (Häufigkeiten, Bigramme, Titel-Tokens, Länge)"""
+    tokens = tokenize_german(text)
+    title = text.lstrip('#* \n').split('\n', 1)[0][:120]
+    return Counter(tokens), frozenset(zip(tokens, tokens[1:])), frozenset(tokenize_german(title)), len(tokens)
+
+
+class LexicalScorer:
+    """
+    Leichtgewichtiger CPU-Scorer (ohne Modell) für das Reranking der fusionierten Kandidaten
+    - Matrix Kandidaten × Query-Tokens, alle Merkmale vektorisiert per numpy
+    - Abdeckung: Anteil der (IDF-gewichteten) Query-Begriffe, die im Chunk vorkommen
+    - Phrasen: Query-Bigramme, die wörtlich im Chunk stehen ("hohes Risiko", "betroffene Person")
+    - Titel: Query-Begriffe in der Überschrift des Chunks (z.B. "Artikel 5 Verbotene Praktiken")
+    - Rang: Position aus Vektor-Suche + BM25 als Prior (semantisches Signal bleibt erhalten)
+    """
+    
+    WEIGHTS = {'coverage': 0.45, 'phrase': 0.15, 'title': 0.15, 'rank': 0.25}
+    
+    def __init__(self, sparse_index: Optional[BM25Index] = None):
+        # IDF aus dem BM25-Index, ohne Index zählen alle Begriffe gleich
+        self.sparse_index = sparse_index
+    
+    def __call__(self, query: str, documents: List[Document]) -> np.ndarray:
+        query_tokens = list(dict.fromkeys(tokenize_german(query)))
+        rank_prior = 1.0 - np.arange(len(documents), dtype=np.float32) / max(len(documents), 1)
+        if not query_tokens:
+            return rank_prior
+        
+        idf = np.array(
+            [self.sparse_index.idf(token) if self.sparse_index is not None else 1.0 for token in query_tokens],
+            dtype=np.float32
+        )
+        bigrams = list(zip(query_tokens, query_tokens[1:]))
+        bigram_idf = idf[:-1] + idf[1:]
+        
+        terms = [document_terms(doc.page_content) for doc in documents]
+        present = np.array([[token in counts for token in query_tokens] for counts, _, _, _ in terms], dtype=np.float32)
+        in_title = np.array([[token in title for token in query_tokens] for _, _, title, _ in terms], dtype=np.float32)
+        
+        weights = self.WEIGHTS
+        scores = weights['coverage'] * (present @ idf) / idf.sum()
+        scores += weights['title'] * (in_title @ idf) / idf.sum()
+        scores += weights['rank'] * rank_prior
+        if bigrams:
+            phrases = np.array([[bigram in pairs for bigram in bigrams] for _, pairs, _, _ in terms], dtype=np.float32)
+            scores += weights['phrase'] * (phrases @ bigram_idf) / bigram_idf.sum()
+        return scores
+
+
+class CrossEncoderScorer:
+    """
+    Cross-Encoder als Scorer (optional, benötigt sentence-transformers, läuft auf CPU)
+    - Alle Paare (Query, Chunk) in einem predict-Aufruf, intern in Batches
+    """
+    
+    def __init__(self, model_name: str = "cross-encoder/msmarco-MiniLM-L6-en-de-v1", batch_size: int = 32, max_length: int = 512):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        self.batch_size = batch_size
+    
+    def __call__(self, query: str, documents: List[Document]) -> np.ndarray:
+        pairs = [(query, doc.page_content) for doc in documents]
+        return np.asarray(self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False))
+
+
+class Reranker:
+    """
+    Rerank-Stufe zwischen Retrieval und Prompt (Semantic-Pipeline)
+    - Over-Fetch: Retriever liefert `candidates` Kandidaten statt k
+    - Scorer ist austauschbar: Callable (query, docs) → Score pro Doc (Default: LexicalScorer)
+    - Top-k nach Score innerhalb eines Token-Budgets (zu große Chunks werden übersprungen,
+      der beste Chunk ist immer dabei)
+    - Latenz pro Aufruf wird gemessen (get_stats) → Kandidatenzahl gegen Qualität abwägen
+    """
+    
+    def __init__(
+        self,
+        scorer: Optional[Callable[[str, List[Document]], Any]] = None,
+        candidates: int = 30,
+        max_tokens: int = 6000,
+        latency_window: int = 1000
+    ):
+        self.scorer = scorer if scorer is not None else LexicalScorer()
+        self.candidates = candidates
+        self.max_tokens = max_tokens
+        
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self.calls = 0
+        self.scored = 0
+    
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        if len(documents) <= 1:
+            return documents[:k]
+        
+        start = time.perf_counter()
+        scores = np.asarray(self.scorer(query, documents), dtype=np.float32)
+        order = np.argsort(-scores, kind='stable')
+        
+        selected = []
+        tokens = 0
+        for i in order:
+            if len(selected) >= k:
+                break
+            doc_tokens = estimate_tokens(documents[i].page_content)
+            if selected and tokens + doc_tokens > self.max_tokens:
+                continue
+            selected.append(documents[i])
+            tokens += doc_tokens
+        
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latencies.append(elapsed)
+            self.calls += 1
+            self.scored += len(documents)
+        logger.info(f"🔀 Rerank: {len(documents)} → {len(selected)} Chunks (~{tokens} Tokens) in {elapsed * 1000:.1f}ms")
+        return selected
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls, scored = self.calls, self.scored
+        
+        def ms(q: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else 0.0
+        
+        return {
+            'scorer': type(self.scorer).__name__,
+            'candidates': self.candidates,
+            'max_tokens': self.max_tokens,
+            'calls': calls,
+            'avg_candidates': round(scored / calls, 1) if calls else 0.0,
+            'latency_ms_mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'latency_ms_p50': ms(0.5),
+            'latency_ms_p95': ms(0.95)
+        }
+
+
+# ==============================================================================
+# CONTEXT PACKING - ✅ NEU IN V3.1
+# ==============================================================================
+
+@dataclass
+class PackedContext:
+    """Ergebnis des ContextPackers: verwendete Chunks + (ggf. gekürzte) Prompt-Texte"""
+    documents: List[Document] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    tokens: int = 0
+    trimmed: int = 0
+    dropped: int = 0
+    duplicates: int = 0
+
+
+class ContextPacker:
+    """
+    Token-Budget für den Kontext im Prompt (pro Pipeline)
+    - Reihenfolge der Chunks = Relevanz (Retriever/Reranker haben bereits sortiert)
+    - Doppelte Chunks (gleiche Chunk-ID) und doppelte Absätze (z.B. Abschnitt-Chunk enthält
+      den Artikel-Chunk) nur einmal, die Überschrift jedes Chunks bleibt immer erhalten
+    - Passt ein Chunk nicht mehr ganz ins Budget: die Absätze mit den meisten
+      Query-Begriffen werden behalten (Auslassungen als "[…]"), sonst wird er verworfen
+    - Chat-Historie im selben Prompt wird vom Budget abgezogen (reserved_tokens)
+    """
+    
+    DEFAULT_BUDGETS = {'definitions': 3000, 'keyword': 8000, 'supplement': 8000, 'semantic': 6000}
+    MIN_TRIM_TOKENS = 150       # kleinere Reste lohnen keinen gekürzten Chunk
+    MIN_DEDUP_CHARS = 40        # kurze Zeilen ("(1)", Aufzählungen) nie als Duplikat werten
+    OMISSION = "[…]"
+    
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = {**self.DEFAULT_BUDGETS, **(budgets or {})}
+        
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+    
+    def pack(
+        self,
+        documents: List[Document],
+        query: str,
+        pipeline: str,
+        reserved_tokens: int = 0
+    ) -> PackedContext:
+        # Mindestens ein Viertel des Budgets bleibt dem Kontext, auch bei langer Historie
+        budget = max(self.budgets[pipeline] - reserved_tokens, self.budgets[pipeline] // 4)
+        query_tokens = set(tokenize_german(query))
+        packed = PackedContext()
+        seen = set()
+        seen_chunks = set()
+        
+        for doc in documents:
+            # Derselbe Chunk aus mehreren Quellen (z.B. Keyword + Semantic) → ohne Absatz-Vergleich verwerfen
+            chunk_id = doc.metadata.get('chunk_id')
+            if chunk_id is not None:
+                if chunk_id in seen_chunks:
+                    packed.duplicates += 1
+                    continue
+                seen_chunks.add(chunk_id)
+            
+            heading, *paragraphs = [line for line in doc.page_content.split('\n') if line.strip()] or ['']
+            fresh = []
+            for paragraph in paragraphs:
+                key = ' '.join(paragraph.split()).lower()
+                if len(key) >= self.MIN_DEDUP_CHARS and key in seen:
+                    packed.duplicates += 1
+                    continue
+                seen.add(key)
+                fresh.append(paragraph)
+            seen.add(' '.join(heading.split()).lower())
+            
+            if paragraphs and not fresh:
+                continue    # komplett in bereits gepackten Chunks enthalten
+            
+            text = '\n'.join([heading] + fresh)
+            tokens = estimate_tokens(text)
+            remaining = budget - packed.tokens
+            if tokens > remaining:
+                if remaining < self.MIN_TRIM_TOKENS:
+                    packed.dropped += 1
+                    continue
+                text = self._trim(heading, fresh, query_tokens, remaining)
+                tokens = estimate_tokens(text)
+                packed.trimmed += 1
+            
+            packed.documents.append(doc)
+            packed.texts.append(text)
+            packed.tokens += tokens
+        
+        self._record(pipeline, packed)
+        return packed
+    
+    def _trim(self, heading: str, paragraphs: List[str], query_tokens: set, budget: int) -> str:
+        """Überschrift + relevanteste Absätze (Originalreihenfolge) innerhalb des Budgets"""
+        max_chars = budget * CHARS_PER_TOKEN
+        if len(heading) + len(self.OMISSION) >= max_chars:
+            return self._cut(heading, max_chars)
+        
+        used = len(heading) + len(self.OMISSION) + 2
+        ranked = sorted(
+            range(len(paragraphs)),
+            key=lambda i: (-len(query_tokens.intersection(tokenize_german(paragraphs[i]))), i)
+        )
+        keep = set()
+        for i in ranked:
+            if used + len(paragraphs[i]) + 1 <= max_chars:
+                keep.add(i)
+                used += len(paragraphs[i]) + 1
+        
+        if not keep and paragraphs:
+            # Einzelner Absatz größer als das Budget (z.B. EWG in einer Zeile) → am Satzende kürzen
+            return heading + '\n' + self._cut(paragraphs[ranked[0]], max_chars - len(heading) - 1)
+        
+        lines = [heading]
+        for i, paragraph in enumerate(paragraphs):
+            if i in keep:
+                lines.append(paragraph)
+            elif lines[-1] != self.OMISSION:
+                lines.append(self.OMISSION)
+        return '\n'.join(lines)
+    
+    def _cut(self, text: str, max_chars: int) -> str:
+        cut = text[:max(max_chars - len(self.OMISSION) - 1, 0)]
+        sentence_end = cut.rfind('. ')
+        if sentence_end > len(cut) // 2:
+            cut = cut[:sentence_end + 1]
+        return f"{cut} {self.OMISSION}"
+    
+    def _record(self, pipeline: str, packed: PackedContext):
+        with self._lock:
+            stats = self._stats.setdefault(pipeline, {
+                'requests': 0, 'tokens': 0, 'max_tokens': 0, 'trimmed': 0, 'dropped': 0, 'duplicates': 0
+            })
+            stats['requests'] += 1
+            stats['tokens'] += packed.tokens
+            stats['max_tokens'] = max(stats['max_tokens'], packed.tokens)
+            stats['trimmed'] += packed.trimmed
+            stats['dropped'] += packed.dropped
+            stats['duplicates'] += packed.duplicates
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                pipeline: {
+                    'budget': self.budgets[pipeline],
+                    'avg_tokens': round(stats['tokens'] / stats['requests'], 1),
+                    **stats
+                }
+                for pipeline, stats in self._stats.items()
+            }
+
+
+# ==============================================================================
+# TRIPLE PIPELINE MANAGER - ✅ ENHANCED IN V3.0
+# ==============================================================================
+
+# Folgefrage → eigenständige Frage (Wortlaut wie der Default der ConversationalRetrievalChain)
+CONDENSE_QUESTION_PROMPT = PromptTemplate.from_template(
+    "Given the following conversation and a follow up question, rephrase the follow up question "
+    "to be a standalone question, in its original language.\n\n"
+    "Chat History:\n{chat_history}\nFollow Up Input: {question}\nStandalone question:"
+)
+
+
+class TriplePipelineManager:
+    # always: jede Semantic-Anfrage mit Historie per LLM umformulieren (wie ConversationalRetrievalChain)
+    # auto:   nur Folgefragen mit Kontext-Signalen (_needs_conversation_context) per LLM umformulieren
+    # local:  wie auto, aber ohne LLM-Call (vorherige Nutzerfrage als Bezug anhängen)
+    CONDENSE_MODES = ('always', 'auto', 'local')
+    
+    def __init__(
+        self,
+        vectorstore,
+        qdrant_client,
+        collection_name,
+        llm,
+        retriever,
+        semantic_prompt: PromptTemplate,
+        advanced_router,
+        keyword_retriever,
+        definitions_retriever,
+        condense_prompt: PromptTemplate = CONDENSE_QUESTION_PROMPT,
+        session_store: Optional[SessionStore] = None,
+        max_concurrent_llm_calls: int = 8,
+        answer_cache: Optional[AnswerCache] = None,
+        similar_answer_cache: Optional[SimilarAnswerCache] = None,
+        context_packer: Optional[ContextPacker] = None,
+        condense_mode: str = "auto",
+        latency_recorder: Optional[LatencyRecorder] = None
+    ):
+        self.vectorstore = vectorstore
+        self.qdrant_client = qdrant_client
+        self.collection_name = collection_name
+        self.llm = llm
+        # ✅ Semantic-Pipeline: Retriever + Prompts direkt (Condense und QA laufen über _prepare_prompt)
+        self.retriever = retriever
+        self.semantic_prompt = semantic_prompt
+        self.condense_prompt = condense_prompt
+        self.router = advanced_router
+        self.keyword_retriever = keyword_retriever
+        self.definitions_retriever = definitions_retriever
+        # ✅ Konversationen pro Session (Shared: Vektoren, Indizes, LLM)
+        self.sessions = session_store if session_store is not None else SessionStore()
+        # ✅ Begrenzte Anzahl paralleler Mistral-Calls (Slots statt Thread-Pool,
+        #    damit der aufrufende Thread die Antwort direkt erhält)
+        self.max_concurrent_llm_calls = max_concurrent_llm_calls
+        self._llm_slots = threading.BoundedSemaphore(max_concurrent_llm_calls)
+        self._async_llm_slots = None
+        # ✅ Antwort-Cache (gehört zum Index → wird mit der Pipeline neu gebaut)
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+        self.similar_answer_cache = similar_answer_cache  # None = aus
+        # ✅ Token-Budget für den Kontext pro Pipeline
+        self.context_packer = context_packer if context_packer is not None else ContextPacker()
+        # ✅ Latenz pro Stufe und Pipeline (Histogramme über alle Anfragen)
+        self.latency = latency_recorder if latency_recorder is not None else LatencyRecorder()
+        # ✅ Condense-Call nur bei Folgefragen mit Kontext-Bezug (siehe CONDENSE_MODES)
+        if condense_mode not in self.CONDENSE_MODES:
+            raise ValueError(f"Unbekannter condense_mode '{condense_mode}' (erlaubt: {', '.join(self.CONDENSE_MODES)})")
+        self.condense_mode = condense_mode
+        self.embeddings = vectorstore.embeddings
+    
+    def process_query(
+        self,
+        query: str,
+        filter_law: Optional[str] = None,
+        session_id: str = DEFAULT_SESSION_ID
+    ) -> Dict[str, Any]:
+        ctx = self._create_context(query, filter_law, session_id)
+        plan = self._plan_query(ctx)
+        return self._execute_plan(ctx, plan)
+    
+    async def aprocess_query(
+        self,
+        query: str,
+        filter_law: Optional[str] = None,
+        session_id: str = DEFAULT_SESSION_ID
+    ) -> Dict[str, Any]:
+        """Async-Variante: LLM- und Embedding-Calls blockieren keinen Thread"""
+        ctx = self._create_context(query, filter_law, session_id)
+        plan = self._plan_query(ctx)
+        return await self._aexecute_plan(ctx, plan)
+    
+    def stream_query(
+        self,
+        query: str,
+        filter_law: Optional[str] = None,
+        session_id: str = DEFAULT_SESSION_ID
+    ) -> Iterator[Dict[str, Any]]:
+        """Streaming-Variante: yieldet {'type': 'token'} Events und zum Schluss {'type': 'final'}"""
+        ctx = self._create_context(query, filter_law, session_id)
+        plan = self._plan_query(ctx)
+        yield from self._stream_plan(ctx, plan)
+    
+    def _create_context(self, query: str, filter_law: Optional[str], session_id: str) -> RequestContext:
+        logger.info(f"\n{'='*70}")
+        logger.info(f"📥 NEUE ANFRAGE [{session_id}]: {query}")
+        logger.info(f"{'='*70}")
+        
+        # ✅ Alles Request-spezifische lebt im Context (Historie als Snapshot)
+        session = self.sessions.get(session_id)
+        return RequestContext(
+            query=query,
+            filter_law=filter_law,
+            session=session,
+            history=session.get_history()
+        )
+    
+    # --------------------------------------------------------------------------
+    # PLANUNG: Routing + lokales Retrieval (keine LLM-/Netzwerk-Calls)
+    # --------------------------------------------------------------------------
+    
+    def _plan_query(self, ctx: RequestContext) -> GenerationPlan:
+        query = ctx.query
+        filter_law = ctx.filter_law
+        
+        # Check if context needed
+        needs_context = self._needs_conversation_context(query, ctx.history)
+        
+        if needs_context:
+            logger.info("🔵 Pipeline: SEMANTIC (Kontext benötigt)")
+            # Antwort hängt von der Historie ab → nicht cachen
+            self.answer_cache.record_bypass()
+            plan = self._plan_semantic(filter_law)
+            plan.condense = True
+            return plan
+        
+        # ✅ Routing mit Enhanced Router (Preprocessing + Pattern-Matching getrennt gemessen)
+        with ctx.trace.stage('preprocessing'):
+            preprocessed = self.router.preprocessor.preprocess(query)
+        with ctx.trace.stage('routing'):
+            analysis = self.router.analyze_preprocessed(preprocessed)
+        
+        logger.info(f"🎯 Query-Analyse: {analysis.pipeline_type.value} (Confidence: {analysis.confidence:.2f})")
+        logger.info(f"   Normalized: '{analysis.normalized_query}'")
+        logger.info(f"   Referenzen: {analysis.extracted_references}")
+        
+        if self._prompt_uses_history(ctx, analysis):
+            # Historie landet im Condense-Prompt → Antwort gehört zu dieser Session, weder lesen noch schreiben
+            self.answer_cache.record_bypass()
+            return self._route_plan(ctx, analysis)
+        
+        # ✅ Antwort-Cache vor Retrieval und LLM
+        with ctx.trace.stage('answer_cache'):
+            details = self._query_details(analysis)
+            cache_key = AnswerCache.make_key(analysis, filter_law, self._match_defined_terms(ctx, analysis), details)
+            cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            logger.info("⚡ Antwort aus Cache")
+            return GenerationPlan(pipeline_used=cached['pipeline_used'], cached_result=cached)
+        
+        plan = self._route_plan(ctx, analysis)
+        plan.cache_key = cache_key
+        plan.query_details = details
+        return plan
+    
+    def _query_details(self, analysis: QueryAnalysis) -> Tuple[str, ...]:
+        """
+        Frage-spezifische Details (Namen, Firmen, Kennungen): Inhaltswörter, die im Korpus nicht vorkommen
+        - Gesetzesnamen ("KI-VO") zählen nicht dazu
+        - Ohne BM25-Index (hybrid_retrieval=False) zählen alle Inhaltswörter → nur gleiche Wortwahl trifft
+        """
+        query = self.router._law_name_regex.sub(' ', analysis.normalized_query)
+        tokens = set(tokenize_german(query))
+        sparse_index = getattr(self.retriever, 'sparse_index', None)
+        if sparse_index is not None:
+            tokens = {token for token in tokens if not sparse_index.knows(token)}
+        return tuple(sorted(tokens))
+    
+    def _match_defined_terms(self, ctx: RequestContext, analysis: QueryAnalysis) -> Tuple[DefinedTerm, ...]:
+        """Aufgelöste Begriffe einer Definitions-Anfrage (wie im DefinitionsRetriever), sonst ()"""
+        term = analysis.extracted_references.get('term')
+        if not term:
+            return ()
+        law = analysis.extracted_references.get('law') or ctx.filter_law
+        defined_terms, _ = self.definitions_retriever.term_index.match_all(term, law=law)
+        return tuple(defined_terms)
+    
+    def _route_plan(self, ctx: RequestContext, analysis: QueryAnalysis) -> GenerationPlan:
+        filter_law = ctx.filter_law
+        
+        # Route zu Pipeline
+        if analysis.pipeline_type in [
+            PipelineType.DEFINITIONS_KI_VO,
+            PipelineType.DEFINITIONS_DSGVO,
+            PipelineType.DEFINITIONS_GENERIC
+        ]:
+            logger.info("🟡 Pipeline: DEFINITIONS")
+            return self._plan_definitions(ctx, analysis)
+        
+        elif analysis.pipeline_type == PipelineType.KEYWORD_METADATA:
+            logger.info("🟢 Pipeline: KEYWORD/METADATA")
+            return self._plan_keyword_metadata(ctx, analysis)
+        
+        else:
+            logger.info("🔵 Pipeline: SEMANTIC (Default)")
+            return self._plan_semantic(filter_law)
+    
+    def _prompt_uses_history(self, ctx: RequestContext, analysis: QueryAnalysis) -> bool:
+        """
+        Enthält einer der Prompts dieser Anfrage die Chat-Historie?
+        - Definitions/Keyword: nie (eigenständige Fragen, Prompt ohne Historie) → auch mit Historie cachebar
+        - Semantic: nur beim Condense (condense_mode="always")
+        Fallbacks auf Semantic mit Condense markieren den Plan zusätzlich (history_dependent, kein put)
+        """
+        if not ctx.history:
+            return False
+        return analysis.pipeline_type == PipelineType.SEMANTIC and self.condense_mode == 'always'
+    
+    def _needs_conversation_context(self, query: str, history: Tuple[BaseMessage, ...]) -> bool:
+        """Prüfe ob Kontext aus Historie benötigt wird"""
+        query_lower = query.lower()
+        
+        context_indicators = [
+            'das', 'dies', 'diese', 'dieser', 'unterschied', 'vergleich',
+            'auch', 'zusätzlich', 'und was', 'wie ist',
+        ]
+        
+        has_indicator = any(indicator in query_lower for indicator in context_indicators)
+        word_count = len(query.split())
+        is_short = word_count < 5
+        has_history = len(history) > 0
+        
+        return (has_indicator or is_short) and has_history
+    
+    def _plan_definitions(self, ctx: RequestContext, analysis: QueryAnalysis) -> GenerationPlan:
+        """Plan Definition-Pipeline"""
+        query = ctx.query
+        term = analysis.extracted_references.get('term')
+        # Vom Router bestimmtes Gesetz hat Vorrang, sonst Gesetzesfilter aus der UI
+        law = analysis.extracted_references.get('law') or ctx.filter_law
+        
+        logger.info(f"🔍 Definitions-Suche: Term='{term}', Law='{law}'")
+        
+        with ctx.trace.stage('retrieval'):
+            docs = self.definitions_retriever.retrieve_definition(term, law, k=2)
+        
+        if not docs:
+            logger.warning(f"⚠️ Keine Definition für '{term}' - Fallback zu Semantic")
+            return self._plan_semantic(law)
+        
+        logger.info(f"✅ {len(docs)} Definitions-Chunks gefunden")
+        
+        # Ohne Chat-Historie: hierher kommen nur eigenständige Fragen (Folgefragen → Semantic + Condense),
+        # die Antwort hängt nicht von der Session ab und ist cachebar
+        with ctx.trace.stage('context'):
+            packed = self.context_packer.pack(docs, query, 'definitions')
+        
+        context = "\n\n".join([
+            f"📖 DEFINITION aus {doc.metadata.get('source_law')} {doc.metadata.get('artikel')}:\n{text}"
+            for doc, text in zip(packed.documents, packed.texts)
+        ])
+        
+        prompt = f"""Du bist ein erfahrener Rechtsexperte für EU-Regulierungen. Beantworte die Frage natürlich und verständlich.
+
+ANTWORTSTRUKTUR:
+
+1. Beginne mit dem vollständigen Originaltext in Anführungszeichen mit Quellenangabe in Klammern.
+
+2. Erkläre dann in 2-4 Sätzen die praktische Bedeutung. Nutze wenn möglich ein konkretes Beispiel.
+
+3. Schließe mit einer weiterführenden Frage ab.
+
+4. Am Ende liste die Quellen auf.
+
+VERFÜGBARE DEFINITIONEN:
+{context}
+
+FRAGE: {query}
+
+ANTWORT:"""
+        
+        return GenerationPlan(
+            pipeline_used=f'definitions_{analysis.pipeline_type.value}',
+            source_documents=packed.documents,
+            prompt=prompt
+        )
+    
+    def _plan_keyword_metadata(self, ctx: RequestContext, analysis: QueryAnalysis) -> GenerationPlan:
+        """Plan Keyword/Metadata-Pipeline mit Fallbacks"""
+        query = ctx.query
+        filter_law = ctx.filter_law
+        
+        with ctx.trace.stage('retrieval'):
+            docs = self.keyword_retriever.retrieve_by_metadata(
+                analysis.extracted_references,
+                k=5,
+                filter_law=filter_law
+            )
+        
+        # Fallback wenn nichts gefunden
+        if not docs:
+            logger.warning("❌ Keyword fand NICHTS - Fallback zu Semantic")
+            
+            plan = self._plan_semantic(filter_law)
+            plan.answer_prefix = (
+                f"ℹ️ *Ich konnte die angeforderten Rechtstexte nicht direkt finden. "
+                f"Hier ist eine semantische Suche zum Thema:*\n\n"
+            )
+            plan.pipeline_used = 'keyword_fallback_to_semantic'
+            
+            return plan
+        
+        # Validierung für EWGs
+        if 'erwägungsgrund' in analysis.extracted_references:
+            requested_ewgs = set(analysis.extracted_references['erwägungsgrund'])
+            found_ewgs = set()
+            
+            for doc in docs:
+                for ewg_num in requested_ewgs:
+                    if self.keyword_retriever._validate_ewg_in_content(doc, str(ewg_num)):
+                        found_ewgs.add(str(ewg_num))
+            
             missing_ewgs = requested_ewgs - found_ewgs
             
             if missing_ewgs:
                 logger.warning(f"⚠️ Nicht alle EWGs gefunden. Fehlt: {missing_ewgs}")
                 
                 if found_ewgs:
-                    # Hybrid: Keyword + Semantic
-                    semantic_result = self._handle_semantic(query, filter_law)
-                    
-                    combined_prompt = f"""Du bist Rechtsexperte. 
+                    # Hybrid: Keyword + Semantic (nur semantisches Retrieval, keine zweite Antwort)
+                    def combined_prompt(semantic_docs: List[Document]) -> Tuple[str, List[Document]]:
+                        # Gefundene EWGs zuerst → bekommen das Budget vor den semantischen Treffern
+                        packed = self.context_packer.pack(docs + semantic_docs, query, 'supplement')
+                        keyword_ids = {doc.metadata['chunk_id'] for doc in docs}
+                        found = [
+                            text for doc, text in zip(packed.documents, packed.texts)
+                            if doc.metadata['chunk_id'] in keyword_ids
+                        ]
+                        additional = [
+                            text for doc, text in zip(packed.documents, packed.texts)
+                            if doc.metadata['chunk_id'] not in keyword_ids
+                        ]
+                        return f"""Du bist Rechtsexperte. 
 
 GEFUNDENE ERWÄGUNGSGRÜNDE:
-{chr(10).join([doc.page_content for doc in docs])}
+{chr(10).join(found)}
 
 ZUSÄTZLICHE INFORMATIONEN:
-{chr(10).join([doc.page_content for doc in semantic_result.get('source_documents', [])[:2]])}
+{chr(10).join(additional)}
 
 Der Nutzer fragte nach: {query}
 
@@ -859,24 +2751,23 @@ Wir haben EWG {', '.join(found_ewgs)} gefunden, aber EWG {', '.join(missing_ewgs
 
 Gib ZUERST die gefundenen EWGs vollständig wieder, erwähne dann transparent welche fehlen.
 
-ANTWORT:"""
-                    
-                    response = self.llm.invoke(combined_prompt)
-                    self._save_to_memory(query, response.content)
+ANTWORT:""", packed.documents
                     
-                    return {
-                        'result': response.content,
-                        'source_documents': docs + semantic_result.get('source_documents', [])[:2],
-                        'pipeline_used': 'keyword_partial_with_semantic'
-                    }
+                    return GenerationPlan(
+                        pipeline_used='keyword_partial_with_semantic',
+                        source_documents=docs,
+                        filter_law=filter_law,
+                        supplement_prompt=combined_prompt
+                    )
                 
                 else:
                     # Kompletter Fallback
-                    return self._handle_semantic(query, filter_law)
+                    return self._plan_semantic(filter_law)
         
-        # Normal processing
-        context = "\n\n".join([doc.page_content for doc in docs])
-        chat_history = self._get_chat_history_text()
+        # Normal processing (ohne Chat-Historie, wie bei den Definitionen)
+        with ctx.trace.stage('context'):
+            packed = self.context_packer.pack(docs, query, 'keyword')
+        context = "\n\n".join(packed.texts)
         
         # Generate appropriate prompt based on type
         if 'erwägungsgrund' in analysis.extracted_references:
@@ -891,97 +2782,661 @@ ANTWORT:"""
         else:
             prompt_type = "GENERIC"
         
-        prompt = f"""{chat_history}
+        prompt = f"""Du bist Rechtsexperte. Der Nutzer fragt nach {prompt_type} {ewg_nums if prompt_type != "GENERIC" else ""}.
+
+STRUKTUR:
+
+1. Gib den VOLLSTÄNDIGEN Originaltext in Anführungszeichen wieder mit Quellenangabe
+2. Erkläre die Bedeutung in 3-5 Sätzen mit praktischem Beispiel
+3. Stelle eine weiterführende Frage
+4. Liste Quellen auf
+
+KONTEXT:
+{context}
+
+FRAGE: {query}
+
+ANTWORT:"""
+        
+        return GenerationPlan(
+            pipeline_used='keyword_metadata',
+            source_documents=packed.documents,
+            prompt=prompt
+        )
+    
+    def _plan_semantic(self, filter_law: Optional[str]) -> GenerationPlan:
+        """Plan Semantic-Pipeline (Condense + Retrieval passieren bei der Ausführung)"""
+        logger.info("🔵 Semantic Pipeline gestartet")
+        return GenerationPlan(pipeline_used='semantic', filter_law=filter_law, semantic=True)
+    
+    # --------------------------------------------------------------------------
+    # AUSFÜHRUNG: sync (Thread) und async (Event-Loop) mit identischer Logik
+    # --------------------------------------------------------------------------
+    
+    def _execute_plan(self, ctx: RequestContext, plan: GenerationPlan) -> Dict[str, Any]:
+        if not plan.cached_result:
+            self._check_similar_cache(ctx, plan)
+        if plan.cached_result:
+            return self._finish_cached(ctx, plan)
+        
+        try:
+            prompt, docs = self._prepare_prompt(ctx, plan)
+            answer = self._call_llm(ctx, plan, prompt, 'llm_answer')
+        except Exception as e:
+            if not plan.semantic:
+                raise
+            return self._semantic_error(ctx, e)
+        
+        return self._finish(ctx, plan, answer, docs)
+    
+    async def _aexecute_plan(self, ctx: RequestContext, plan: GenerationPlan) -> Dict[str, Any]:
+        if not plan.cached_result:
+            await self._acheck_similar_cache(ctx, plan)
+        if plan.cached_result:
+            return self._finish_cached(ctx, plan)
+        
+        try:
+            prompt, docs = await self._aprepare_prompt(ctx, plan)
+            answer = await self._acall_llm(ctx, plan, prompt, 'llm_answer')
+        except Exception as e:
+            if not plan.semantic:
+                raise
+            return self._semantic_error(ctx, e)
+        
+        return self._finish(ctx, plan, answer, docs)
+    
+    def _stream_plan(self, ctx: RequestContext, plan: GenerationPlan) -> Iterator[Dict[str, Any]]:
+        """Streaming-Ausführung: Token-Events, am Ende ein 'final'-Event"""
+        if not plan.cached_result:
+            self._check_similar_cache(ctx, plan)
+        if plan.cached_result:
+            result = self._finish_cached(ctx, plan)
+            yield {'type': 'token', 'content': result['result']}
+            yield {'type': 'final', **result}
+            return
+        
+        try:
+            prompt, docs = self._prepare_prompt(ctx, plan)
+        except Exception as e:
+            if not plan.semantic:
+                raise
+            yield {'type': 'final', **self._semantic_error(ctx, e)}
+            return
+        
+        parts = []
+        try:
+            with self._llm_stage(ctx, plan, prompt, 'llm_answer') as entry:
+                start = time.perf_counter()
+                # Slot bleibt belegt, solange das LLM Tokens liefert
+                self._llm_slots.acquire()
+                stream = self.llm.stream(prompt)
+                try:
+                    for chunk in stream:
+                        if chunk.content:
+                            content = chunk.content
+                            if not parts:
+                                entry['first_token_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                                # Präfix erst mit dem ersten LLM-Token → Time-to-first-token misst das Modell
+                                content = plan.answer_prefix + content
+                            parts.append(chunk.content)
+                            yield {'type': 'token', 'content': content}
+                finally:
+                    # Auch bei GeneratorExit (Client bricht ab, Streamlit-Rerun): LLM-Stream schließen
+                    # und den Slot sofort freigeben statt erst bei der Garbage Collection
+                    stream.close()
+                    self._llm_slots.release()
+                entry['completion_tokens'] = estimate_tokens("".join(parts))
+        except Exception as e:
+            if not plan.semantic:
+                raise
+            yield {'type': 'final', **self._semantic_error(ctx, e)}
+            return
+        
+        yield {'type': 'final', **self._finish(ctx, plan, "".join(parts), docs)}
+    
+    def _prepare_prompt(self, ctx: RequestContext, plan: GenerationPlan) -> Tuple[str, List[Document]]:
+        """Offene Schritte vor der Generierung (Condense, Vektor-Retrieval)"""
+        if plan.semantic:
+            question, vector = ctx.query, plan.query_vector
+            if self._should_condense(ctx, plan):
+                plan.history_dependent = True
+                if self.condense_mode == 'local':
+                    question = self._rewrite_locally(ctx)
+                else:
+                    question = self._call_llm(ctx, plan, self._build_condense_prompt(ctx), 'llm_condense').strip()
+                vector = None
+            with ctx.trace.stage('retrieval'):
+                retrieved = self._retrieve(question, vector, plan.filter_law)
+            with ctx.trace.stage('context'):
+                return self._build_semantic_prompt(plan, question, retrieved)
+        
+        if plan.supplement_prompt:
+            with ctx.trace.stage('retrieval'):
+                retrieved = self._retrieve(ctx.query, plan.query_vector, plan.filter_law)
+            with ctx.trace.stage('context'):
+                return self._build_supplement_prompt(plan, retrieved)
+        
+        return plan.prompt, plan.source_documents
+    
+    async def _aprepare_prompt(self, ctx: RequestContext, plan: GenerationPlan) -> Tuple[str, List[Document]]:
+        if plan.semantic:
+            question, vector = ctx.query, plan.query_vector
+            if self._should_condense(ctx, plan):
+                plan.history_dependent = True
+                if self.condense_mode == 'local':
+                    question = self._rewrite_locally(ctx)
+                else:
+                    question = (await self._acall_llm(ctx, plan, self._build_condense_prompt(ctx), 'llm_condense')).strip()
+                vector = None
+            with ctx.trace.stage('retrieval'):
+                retrieved = await self._aretrieve(question, vector, plan.filter_law)
+            with ctx.trace.stage('context'):
+                return self._build_semantic_prompt(plan, question, retrieved)
+        
+        if plan.supplement_prompt:
+            with ctx.trace.stage('retrieval'):
+                retrieved = await self._aretrieve(ctx.query, plan.query_vector, plan.filter_law)
+            with ctx.trace.stage('context'):
+                return self._build_supplement_prompt(plan, retrieved)
+        
+        return plan.prompt, plan.source_documents
+    
+    @contextmanager
+    def _llm_stage(self, ctx: RequestContext, plan: GenerationPlan, prompt: str, stage: str) -> Iterator[Dict[str, Any]]:
+        """Zählt LLM-Call + Prompt-Tokens der Anfrage und misst den Call als eigene Stufe"""
+        prompt_tokens = estimate_tokens(prompt)
+        plan.prompt_tokens += prompt_tokens
+        plan.llm_calls += 1
+        with ctx.trace.stage(stage, prompt_tokens=prompt_tokens) as entry:
+            yield entry
+    
+    def _call_llm(self, ctx: RequestContext, plan: GenerationPlan, prompt: str, stage: str) -> str:
+        with self._llm_stage(ctx, plan, prompt, stage) as entry:
+            answer = self._invoke_llm(prompt)
+            entry['completion_tokens'] = estimate_tokens(answer)
+        return answer
+    
+    async def _acall_llm(self, ctx: RequestContext, plan: GenerationPlan, prompt: str, stage: str) -> str:
+        with self._llm_stage(ctx, plan, prompt, stage) as entry:
+            answer = await self._ainvoke_llm(prompt)
+            entry['completion_tokens'] = estimate_tokens(answer)
+        return answer
+    
+    def _retrieve(
+        self,
+        question: str,
+        vector: Optional[List[float]],
+        filter_law: Optional[str] = None
+    ) -> List[Document]:
+        """
+        Hybrid-Retrieval (Vektor + BM25, siehe HybridRetriever)
+        - Mit bereits berechnetem Query-Vektor kein zweiter Embedding-Call
+        - Gesetzesfilter als Qdrant Payload-Filter bzw. BM25-Maske → immer k passende Dokumente
+        """
+        return self.retriever.retrieve(question, vector=vector, filter_law=filter_law)
+    
+    async def _aretrieve(
+        self,
+        question: str,
+        vector: Optional[List[float]],
+        filter_law: Optional[str] = None
+    ) -> List[Document]:
+        return await self.retriever.aretrieve(question, vector=vector, filter_law=filter_law)
+    
+    def _check_similar_cache(self, ctx: RequestContext, plan: GenerationPlan):
+        """Zweite Cache-Stufe: Query einmal einbetten, Vektor bleibt für das Retrieval im Plan"""
+        if not self._uses_similar_cache(ctx, plan):
+            return
+        with ctx.trace.stage('similar_cache'):
+            try:
+                plan.query_vector = self.embeddings.embed_query(ctx.query)
+            except Exception as e:
+                logger.warning(f"⚠️ Query-Embedding für Ähnlichkeits-Cache fehlgeschlagen: {e}")
+                return
+            self._apply_similar_hit(ctx, plan)
+    
+    async def _acheck_similar_cache(self, ctx: RequestContext, plan: GenerationPlan):
+        if not self._uses_similar_cache(ctx, plan):
+            return
+        with ctx.trace.stage('similar_cache'):
+            try:
+                plan.query_vector = await self.embeddings.aembed_query(ctx.query)
+            except Exception as e:
+                logger.warning(f"⚠️ Query-Embedding für Ähnlichkeits-Cache fehlgeschlagen: {e}")
+                return
+            self._apply_similar_hit(ctx, plan)
+    
+    def _uses_similar_cache(self, ctx: RequestContext, plan: GenerationPlan) -> bool:
+        """Nur Semantic-Pläne ohne Condense: nur dann nutzt das Retrieval denselben Query-Vektor"""
+        return (
+            plan.cache_key is not None
+            and self.similar_answer_cache is not None
+            and plan.semantic
+            and not self._should_condense(ctx, plan)
+        )
+    
+    def _apply_similar_hit(self, ctx: RequestContext, plan: GenerationPlan):
+        scope = self.similar_answer_cache.scope_for(plan.cache_key, plan.query_details, ctx.session.session_id)
+        cached = self.similar_answer_cache.get(plan.query_vector, scope)
+        if cached is not None:
+            logger.info("⚡ Antwort aus Ähnlichkeits-Cache")
+            plan.cached_result = cached
+    
+    def _should_condense(self, ctx: RequestContext, plan: GenerationPlan) -> bool:
+        """Eigenständige Fragen (ohne Kontext-Signale) gehen direkt ins Retrieval"""
+        if not ctx.history:
+            return False
+        return plan.condense or self.condense_mode == 'always'
+    
+    def _rewrite_locally(self, ctx: RequestContext) -> str:
+        """Folgefrage ohne LLM eigenständig machen: vorherige Nutzerfrage als Bezug anhängen"""
+        previous = next((msg.content for msg in reversed(ctx.history) if msg.type == 'human'), None)
+        if not previous:
+            return ctx.query
+        return f"{ctx.query} (Bezug: {previous})"
+    
+    def _build_condense_prompt(self, ctx: RequestContext) -> str:
+        """Prompt für Folgefrage → eigenständige Frage (wie ConversationalRetrievalChain)"""
+        chat_history = "\n".join(
+            f"{'Human' if msg.type == 'human' else 'Assistant'}: {msg.content}"
+            for msg in ctx.history
+        )
+        return self.condense_prompt.format(question=ctx.query, chat_history=chat_history)
+    
+    def _build_semantic_prompt(
+        self,
+        plan: GenerationPlan,
+        question: str,
+        retrieved: List[Document]
+    ) -> Tuple[str, List[Document]]:
+        # Gesetzesfilter wurde bereits in der Qdrant-Suche angewendet
+        packed = self.context_packer.pack(retrieved, question, 'semantic')
+        context = "\n\n".join(packed.texts)
+        prompt = self.semantic_prompt.format(context=context, question=question)
+        
+        logger.info(f"✅ Semantic Pipeline: {len(packed.documents)} Quellen (~{packed.tokens} Tokens Kontext)")
+        return prompt, packed.documents
+    
+    def _build_supplement_prompt(self, plan: GenerationPlan, retrieved: List[Document]) -> Tuple[str, List[Document]]:
+        prompt, docs = plan.supplement_prompt(retrieved[:2])
+        return prompt, docs
+    
+    def _finish(self, ctx: RequestContext, plan: GenerationPlan, answer: str, docs: List[Document]) -> Dict[str, Any]:
+        with ctx.trace.stage('memory'):
+            self._save_to_memory(ctx, answer)
+        
+        result = {
+            'result': plan.answer_prefix + answer,
+            'source_documents': docs,
+            'pipeline_used': plan.pipeline_used
+        }
+        
+        if plan.cache_key is not None and not plan.history_dependent:
+            with ctx.trace.stage('answer_cache'):
+                self.answer_cache.put(plan.cache_key, result)
+                if plan.query_vector is not None and self.similar_answer_cache is not None:
+                    scope = self.similar_answer_cache.scope_for(
+                        plan.cache_key, plan.query_details, ctx.session.session_id
+                    )
+                    self.similar_answer_cache.put(plan.query_vector, scope, result)
+        
+        logger.info(f"🧮 LLM-Calls: {plan.llm_calls} | Prompt-Tokens (geschätzt): {plan.prompt_tokens}")
+        return self._complete(ctx, {
+            **result, 'cache_hit': False, 'prompt_tokens': plan.prompt_tokens, 'llm_calls': plan.llm_calls
+        })
+    
+    def _finish_cached(self, ctx: RequestContext, plan: GenerationPlan) -> Dict[str, Any]:
+        result = plan.cached_result
+        with ctx.trace.stage('memory'):
+            self._save_to_memory(ctx, result['result'])
+        return self._complete(ctx, {**result, 'cache_hit': True, 'prompt_tokens': 0, 'llm_calls': 0})
+    
+    def _semantic_error(self, ctx: RequestContext, error: Exception) -> Dict[str, Any]:
+        logger.error(f"❌ Semantic Pipeline Fehler: {str(error)}")
+        return self._complete(ctx, {
+            'result': f"Entschuldigung, es ist ein Fehler aufgetreten: {str(error)}",
+            'source_documents': [],
+            'pipeline_used': 'semantic_error'
+        })
+    
+    def _complete(self, ctx: RequestContext, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Trace abschließen, ins Latenz-Histogramm übernehmen und an das Ergebnis hängen"""
+        trace = ctx.trace.to_dict()
+        pipeline = 'cache' if result.get('cache_hit') else result['pipeline_used']
+        self.latency.record(pipeline, trace)
+        logger.info(f"⏱️ {trace['total_ms']:.1f}ms: " + ", ".join(
+            f"{entry['stage']} {entry['ms']:.1f}" for entry in trace['stages']
+        ))
+        return {**result, 'trace': trace}
+    
+    
+    def _invoke_llm(self, prompt: str) -> str:
+        """LLM-Call über begrenzte Slots (schützt vor unbegrenzten Verbindungen)"""
+        with self._llm_slots:
+            return self.llm.invoke(prompt).content
+    
+    async def _ainvoke_llm(self, prompt: str) -> str:
+        """Async LLM-Call über begrenzte Slots des aktuellen Event-Loops"""
+        async with self._get_async_llm_slots():
+            return (await self.llm.ainvoke(prompt)).content
+    
+    def _get_async_llm_slots(self) -> asyncio.Semaphore:
+        # asyncio.Semaphore ist an einen Event-Loop gebunden → pro Loop anlegen
+        loop = asyncio.get_running_loop()
+        if self._async_llm_slots is None or self._async_llm_slots[0] is not loop:
+            self._async_llm_slots = (loop, asyncio.Semaphore(self.max_concurrent_llm_calls))
+        return self._async_llm_slots[1]
+    
+    def _save_to_memory(self, ctx: RequestContext, response: str):
+        """Save to conversation memory"""
+        ctx.session.add_exchange(ctx.query, response)
+    
+    def clear_memory(self, session_id: str = DEFAULT_SESSION_ID):
+        """Clear conversation memory"""
+        self.sessions.get(session_id).clear()
+    
+    def get_memory_stats(self, session_id: str = DEFAULT_SESSION_ID) -> Dict[str, Any]:
+        """Get memory statistics"""
+        stats = self.sessions.get(session_id).get_stats()
+        stats['active_sessions'] = len(self.sessions)
+        return stats
+    
+    def get_answer_cache_stats(self) -> Dict[str, Any]:
+        """Get answer cache statistics (exakt + ähnlich)"""
+        stats = self.answer_cache.get_stats()
+        if self.similar_answer_cache is not None:
+            stats['similar'] = self.similar_answer_cache.get_stats()
+        return stats
+    
+    def get_context_stats(self) -> Dict[str, Any]:
+        """Kontext-Tokens pro Pipeline (Durchschnitt, Maximum, gekürzte/verworfene Chunks)"""
+        return self.context_packer.get_stats()
+    
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """Latenz-Histogramme pro Pipeline und Stufe (p50/p95/p99 + Buckets)"""
+        return self.latency.get_stats()
+
+
+# ==============================================================================
+# CORPUS REGISTRY - ✅ NEU IN V3.1
+# ==============================================================================
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    """
+    Deklarative Beschreibung eines Korpus-Dokuments
+    - key: Schlüssel in document_paths
+    - headers: Markdown-Header-Schema für den Splitter
+    - metadata: feste Zusatz-Metadata pro Chunk (z.B. artikel)
+    - enrich: Anreicherung pro Chunk (Modul-Funktion, da im Worker-Prozess ausgeführt)
+    """
+    key: str
+    label: str
+    law: str
+    source_type: str
+    headers: Tuple[Tuple[str, str], ...]
+    metadata: Tuple[Tuple[str, str], ...] = ()
+    enrich: Optional[Callable[[Document], None]] = None
+
+
+def enrich_ewg_number(chunk: Document, patterns: Tuple[Tuple[str, int], ...]):
+    """EWG-Nummer aus dem Chunk-Text in die Metadata übernehmen (erstes passendes Pattern)"""
+    for pattern, flags in patterns:
+        ewg_match = re.search(pattern, chunk.page_content, flags)
+        if ewg_match:
+            chunk.metadata['ewg_nummer'] = ewg_match.group(1)
+            chunk.metadata['artikel'] = f"EWG {ewg_match.group(1)}"
+            return
+
+
+EWG_PATTERNS = (
+    (r'Erwägungsgrund\s+(\d+)', re.IGNORECASE),
+    (r'#\s*\((\d+)\)', 0),
+)
+
+CHUNK_ID_HEADER_WORDS = 2
+
+HEADERS_CORPUS = (("#", "Kapitel"), ("##", "Abschnitt"), ("###", "Artikel"))
+
+CORPUS_REGISTRY: Tuple[CorpusSpec, ...] = (
+    CorpusSpec('ki_vo_corpus', 'Corpus', 'KI-Verordnung', 'Corpus', HEADERS_CORPUS),
+    CorpusSpec('ki_vo_anhaenge', 'Anhänge', 'KI-Verordnung', 'Anhang', (("#", "Anhang"), ("##", "Abschnitt"))),
+    CorpusSpec(
+        'ki_vo_ewg', 'Erwägungsgründe', 'KI-Verordnung', 'Erwägungsgründe', (("#", "Erwägungsgrund"),),
+        enrich=partial(enrich_ewg_number, patterns=EWG_PATTERNS)
+    ),
+    CorpusSpec(
+        'ki_vo_begriffe', 'Begriffsbestimmungen', 'KI-Verordnung', 'Begriffsbestimmungen', (("###", "Begriff"),),
+        metadata=(('artikel', 'Artikel 3'),)
+    ),
+    CorpusSpec('dsgvo_corpus', 'Corpus', 'DSGVO', 'Corpus', HEADERS_CORPUS),
+    CorpusSpec(
+        'dsgvo_ewg', 'Erwägungsgründe', 'DSGVO', 'Erwägungsgründe', (("#", "Erwägungsgrund"),),
+        enrich=partial(enrich_ewg_number, patterns=EWG_PATTERNS + ((r'^\((\d+)\)', re.MULTILINE),))
+    ),
+    CorpusSpec(
+        'dsgvo_begriffe', 'Begriffsbestimmungen', 'DSGVO', 'Begriffsbestimmungen', (("###", "Begriff"),),
+        metadata=(('artikel', 'Artikel 4'),)
+    ),
+)
+
+
+def header_label(value: str) -> str:
+    """Kurzform eines Header-Werts für die Chunk-ID: die ersten CHUNK_ID_HEADER_WORDS Wörter ("Artikel 6", "EWG 47")"""
+    return ' '.join(re.split(r'[\s:]+', value.strip())[:CHUNK_ID_HEADER_WORDS])
+
+
+def assign_chunk_ids(chunks: List[Document], spec: CorpusSpec):
+    """
+    Stabile Chunk-ID in die Metadata: Gesetz / Quelltyp / Header-Pfad # Ordinalzahl
+    z.B. 'DSGVO/Corpus/KAPITEL II/Artikel 6#0'
+    - Header-Pfad aus dem Header-Schema des Korpus (gekürzte Header-Werte)
+    - Ordinalzahl unterscheidet Chunks mit gleichem Pfad (Reihenfolge im Dokument)
+    - Unabhängig vom Chunk-Text → Tippfehlerkorrekturen im Dokument behalten die ID
+    """
+    occurrences: Dict[str, int] = {}
+    for chunk in chunks:
+        path = '/'.join(
+            header_label(str(chunk.metadata[name]))
+            for _, name in spec.headers
+            if name in chunk.metadata
+        )
+        prefix = f"{spec.law}/{spec.source_type}/{path}"
+        ordinal = occurrences.get(prefix, 0)
+        occurrences[prefix] = ordinal + 1
+        chunk.metadata['chunk_id'] = f"{prefix}#{ordinal}"
+
+
+def load_corpus(spec: CorpusSpec, path: Optional[str]) -> Tuple[List[Document], Optional[str]]:
+    """
+    Parse + Split eines Korpus (läuft im Worker-Prozess)
+    
+    Returns:
+        (chunks, Fehlermeldung oder None)
+    """
+    try:
+        if not path:
+            raise KeyError(f"Kein Pfad für '{spec.key}'")
+        
+        pages = Docx2txtLoader(path).load()
+        splitter = MarkdownHeaderTextSplitter(headers_to_split_on=list(spec.headers), strip_headers=False)
+        chunks = splitter.split_text(pages[0].page_content)
+        
+        for chunk in chunks:
+            chunk.metadata['source_type'] = spec.source_type
+            chunk.metadata['source_law'] = spec.law
+            chunk.metadata.update(spec.metadata)
+            if spec.enrich:
+                spec.enrich(chunk)
+        assign_chunk_ids(chunks, spec)
+        
+        return chunks, None
+    except Exception as e:
+        return [], str(e)
+
+
+# ==============================================================================
+# QDRANT COLLECTION SYNC - ✅ NEU IN V3.1
+# ==============================================================================
+
+class CollectionSync:
+    """
+    Inkrementeller Abgleich einer Qdrant-Collection mit den aktuellen Chunks
+    - upsert(): pro fertigem Embedding-Batch, nur Points die noch fehlen
+    - finish(): löscht entfernte Chunks (erst nach allen Upserts → Collection nie leer)
+    - Geänderte Vektorgröße → Collection wird neu angelegt
+    """
+    
+    def __init__(self, client: QdrantClient, collection_name: str, chunks: List[Document], point_ids: List[str]):
+        self.client = client
+        self.collection_name = collection_name
+        self.chunks = chunks
+        self.point_ids = point_ids
+        self.existing_ids = self._get_point_ids() if client.collection_exists(collection_name) else set()
+        self.upserted = 0
+        self._collection_ready = False
+    
+    def upsert(self, indices: List[int], vectors: List[List[float]]):
+        if not vectors:
+            return
+        self._ensure_collection(len(vectors[0]))
+        
+        points = [
+            PointStruct(
+                id=self.point_ids[i],
+                vector=vector,
+                payload={'page_content': self.chunks[i].page_content, 'metadata': self.chunks[i].metadata}
+            )
+            for i, vector in zip(indices, vectors)
+            if self.point_ids[i] not in self.existing_ids
+        ]
+        
+        for start in range(0, len(points), 256):
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=points[start:start + 256]
+            )
+        self.upserted += len(points)
+    
+    def finish(self):
+        stale_ids = list(self.existing_ids - set(self.point_ids))
+        for start in range(0, len(stale_ids), 256):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=stale_ids[start:start + 256]
+            )
+        
+        unchanged = len(set(self.point_ids)) - self.upserted
+        print(f"   🔄 Qdrant-Sync: {self.upserted} neu, {len(stale_ids)} entfernt, {unchanged} unverändert")
+    
+    def _ensure_collection(self, vector_size: int):
+        if self._collection_ready:
+            return
+        
+        if self.client.collection_exists(self.collection_name):
+            existing_size = self.client.get_collection(self.collection_name).config.params.vectors.size
+            if existing_size != vector_size:
+                print(f"   ⚠️ Vektorgröße geändert ({existing_size} → {vector_size}) - Collection wird neu angelegt")
+                self.client.delete_collection(self.collection_name)
+                self.existing_ids = set()
+        
+        if not self.client.collection_exists(self.collection_name):
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+            )
+            
+            # ✅ Payload-Index für Filter (INDEXED_METADATA_FIELDS)
+            for field_name in INDEXED_METADATA_FIELDS:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=f"metadata.{field_name}",
+                    field_schema=PayloadSchemaType.KEYWORD
+                )
+        
+        self._collection_ready = True
+    
+    def _get_point_ids(self) -> set:
+        """Alle Point-IDs der Collection (ohne Payload/Vektoren)"""
+        point_ids = set()
+        offset = None
+        
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1024,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            point_ids.update(str(record.id) for record in records)
+            if offset is None:
+                return point_ids
 
-Du bist Rechtsexperte. Der Nutzer fragt nach {prompt_type} {ewg_nums if prompt_type != "GENERIC" else ""}.
 
-STRUKTUR:
+# ==============================================================================
+# INDEX SNAPSHOT - ✅ NEU IN V3.1
+# ==============================================================================
 
-1. Gib den VOLLSTÄNDIGEN Originaltext in Anführungszeichen wieder mit Quellenangabe
-2. Erkläre die Bedeutung in 3-5 Sätzen mit praktischem Beispiel
-3. Stelle eine weiterführende Frage
-4. Liste Quellen auf
+SNAPSHOT_VERSION = 3   # v3: Chunk-IDs in der Metadata, Indizes über Chunk-IDs
 
-KONTEXT:
-{context}
 
-FRAGE: {query}
+# Namespace für deterministische Qdrant Point-IDs
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "trusttroiai/chunks")
 
-ANTWORT:"""
-        
-        response = self.llm.invoke(prompt)
-        self._save_to_memory(query, response.content)
-        
-        logger.info("✅ Keyword-Metadata Pipeline erfolgreich")
-        
-        return {
-            'result': response.content,
-            'source_documents': docs,
-            'pipeline_used': 'keyword_metadata'
-        }
+
+def compute_point_ids(chunks: List[Document], model_name: str) -> List[str]:
+    """
+    Deterministische Qdrant Point-IDs aus der Chunk-Identität
+    - Embedding-Modell + Metadata + Inhalt → gleiche Chunks behalten ihre ID über Neustarts
+    - Identische Chunks werden über ihr Vorkommen (#n) unterschieden
+    """
+    point_ids = []
+    occurrences = {}
     
-    def _handle_semantic(self, query: str, filter_law: Optional[str]) -> Dict[str, Any]:
-        """Handle Semantic-Pipeline"""
-        logger.info("🔵 Semantic Pipeline gestartet")
-        
-        try:
-            result = self.qa_chain({"question": query})
-            
-            docs = result.get('source_documents', [])
-            
-            if filter_law and docs:
-                docs = [d for d in docs if d.metadata.get('source_law') == filter_law]
-            
-            logger.info(f"✅ Semantic Pipeline: {len(docs)} Quellen")
-            
-            return {
-                'result': result.get('answer', ''),
-                'source_documents': docs,
-                'pipeline_used': 'semantic'
-            }
-        except Exception as e:
-            logger.error(f"❌ Semantic Pipeline Fehler: {str(e)}")
-            return {
-                'result': f"Entschuldigung, es ist ein Fehler aufgetreten: {str(e)}",
-                'source_documents': [],
-                'pipeline_used': 'semantic_error'
-            }
+    for chunk in chunks:
+        hasher = hashlib.sha256()
+        hasher.update(model_name.encode("utf-8"))
+        hasher.update(b"\0")
+        hasher.update(json.dumps(chunk.metadata, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        hasher.update(b"\0")
+        hasher.update(chunk.page_content.encode("utf-8"))
+        digest = hasher.hexdigest()
+        
+        occurrence = occurrences.get(digest, 0)
+        occurrences[digest] = occurrence + 1
+        point_ids.append(str(uuid.uuid5(POINT_ID_NAMESPACE, f"{digest}#{occurrence}")))
     
-    def _get_chat_history_text(self) -> str:
-        """Get formatted chat history"""
-        messages = self.qa_chain.memory.chat_memory.messages
-        
-        if not messages:
-            return ""
-        
-        history_lines = []
-        for msg in messages[-6:]:
-            if msg.type == "human":
-                history_lines.append(f"User: {msg.content}")
-            else:
-                history_lines.append(f"Assistant: {msg.content}")
-        
-        if history_lines:
-            return "BISHERIGE KONVERSATION:\n" + "\n".join(history_lines) + "\n"
-        
-        return ""
+    return point_ids
+
+
+def compute_document_fingerprints(document_paths: Dict[str, str]) -> Dict[str, str]:
+    """Fingerprint pro Quelldokument (SHA-256 über den Inhalt)"""
+    fingerprints = {}
     
-    def _save_to_memory(self, query: str, response: str):
-        """Save to conversation memory"""
-        self.qa_chain.memory.chat_memory.add_message(HumanMessage(content=query))
-        self.qa_chain.memory.chat_memory.add_message(AIMessage(content=response))
+    for key, path in document_paths.items():
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        fingerprints[key] = digest.hexdigest()
     
-    def clear_memory(self):
-        """Clear conversation memory"""
-        self.qa_chain.memory.clear()
+    return fingerprints
+
+
+def compute_source_fingerprint(
+    document_paths: Dict[str, str],
+    document_fingerprints: Optional[Dict[str, str]] = None
+) -> str:
+    """Fingerprint über alle Quelldokumente (aus den Fingerprints pro Dokument)"""
+    if document_fingerprints is None:
+        document_fingerprints = compute_document_fingerprints(document_paths)
     
-    def get_memory_stats(self) -> Dict[str, Any]:
-        """Get memory statistics"""
-        messages = self.qa_chain.memory.chat_memory.messages
-        return {
-            'total_messages': len(messages),
-            'capacity': self.qa_chain.memory.k
-        }
+    digest = hashlib.sha256()
+    for key in sorted(document_fingerprints):
+        digest.update(f"{key}\0{document_fingerprints[key]}\0".encode("utf-8"))
+    
+    return digest.hexdigest()
 
 
 # ==============================================================================
@@ -989,25 +3444,117 @@ ANTWORT:"""
 # ==============================================================================
 
 class RAGBackend:
-    def __init__(self, mistral_api_key: str):
+    def __init__(
+        self,
+        mistral_api_key: str,
+        cache_dir: Optional[str] = None,
+        embeddings: Optional[Embeddings] = None,
+        llm=None,
+        max_concurrent_llm_calls: int = 8,
+        answer_cache_size: int = 512,
+        answer_cache_ttl: float = 3600,
+        similar_answer_threshold: Optional[float] = 0.92,
+        similar_answer_per_session: bool = False,
+        qdrant_path: Optional[str] = None,
+        corpus_registry: Tuple[CorpusSpec, ...] = CORPUS_REGISTRY,
+        ingest_workers: Optional[int] = None,
+        embedding_concurrency: int = 4,
+        hybrid_retrieval: bool = True,
+        rerank_candidates: int = 30,
+        rerank_scorer: Optional[Callable[[str, List[Document]], Any]] = None,
+        context_budgets: Optional[Dict[str, int]] = None,
+        condense_mode: str = "auto"
+    ):
+        """
+        Args:
+            mistral_api_key: API Key für Mistral
+            cache_dir: Verzeichnis für persistente Caches (Default: $TRUSTTROIAI_CACHE_DIR oder .cache)
+            embeddings: Optionales Embeddings-Modell (z.B. Fake für Offline-Betrieb)
+            llm: Optionales Chat-Modell (z.B. Fake für Offline-Betrieb)
+            max_concurrent_llm_calls: Max. parallele Mistral-Calls über alle Sessions
+            answer_cache_size: Max. Einträge im Antwort-Cache (0 = aus)
+            answer_cache_ttl: Lebensdauer gecachter Antworten in Sekunden
+            similar_answer_threshold: Cosine-Threshold für ähnlich formulierte Fragen (None = aus)
+            similar_answer_per_session: Ähnlichkeits-Cache nur innerhalb einer Session nutzen
+            qdrant_path: Verzeichnis der lokalen Qdrant-Collection (Default: <cache_dir>/qdrant, ":memory:" möglich)
+            corpus_registry: Korpus-Beschreibungen (Default: die 7 Dokumente von KI-VO und DSGVO)
+            ingest_workers: Prozesse für das Parsing (Default: CPU-Kerne)
+            embedding_concurrency: Max. parallele Embedding-Requests beim Index-Aufbau
+            hybrid_retrieval: Semantic-Pipeline mit BM25 + Vektor-Suche (False = nur Vektor-Suche)
+            rerank_candidates: Kandidaten für das Reranking der Semantic-Pipeline (0 = aus)
+            rerank_scorer: Eigener Scorer (query, docs) → Scores, z.B. CrossEncoderScorer (Default: LexicalScorer)
+            context_budgets: Token-Budgets für den Kontext pro Pipeline (Default: ContextPacker.DEFAULT_BUDGETS)
+            condense_mode: Umformulieren von Folgefragen: "auto" (nur mit Kontext-Bezug), "local" (ohne LLM),
+                           "always" (jede Semantic-Anfrage mit Historie, wie ConversationalRetrievalChain)
+        """
         self.mistral_api_key = mistral_api_key
         self.initialized = False
-        
+
+        self.cache_dir = cache_dir or os.environ.get("TRUSTTROIAI_CACHE_DIR", ".cache")
+        self._base_embeddings = embeddings
+        self._base_llm = llm
+        self.max_concurrent_llm_calls = max_concurrent_llm_calls
+        self.answer_cache_size = answer_cache_size
+        self.answer_cache_ttl = answer_cache_ttl
+        self.similar_answer_threshold = similar_answer_threshold
+        self.similar_answer_per_session = similar_answer_per_session
+        self.qdrant_path = qdrant_path or os.path.join(self.cache_dir, "qdrant")
+        self.corpus_registry = corpus_registry
+        self.ingest_workers = ingest_workers
+        self.embedding_concurrency = embedding_concurrency
+        self.hybrid_retrieval = hybrid_retrieval
+        self.rerank_candidates = rerank_candidates
+        self.rerank_scorer = rerank_scorer
+        self.context_budgets = context_budgets
+        self.condense_mode = condense_mode
+
         self.vectorstore = None
         self.qdrant_client = None
         self.embeddings = None
         self.llm = None
         self.triple_pipeline = None
         self.all_chunks = []
-        
+        self.chunk_vectors = []
+        self.source_fingerprint = None
+        self.document_fingerprints = {}
+        self.corpus_chunks = {}
+        self.point_ids = []
+        self.snapshot_path = None
+        self._refresh_lock = threading.Lock()
+        # ✅ Pro-Session Konversationen (überleben Neuaufbau der Pipeline)
+        self.sessions = SessionStore()
+        # ✅ Latenz-Histogramme (überleben Neuaufbau der Pipeline)
+        self.latency = LatencyRecorder()
+
         self.COLLECTION_NAME = "legal_compliance_v3"
+        self.EMBEDDING_MODEL = "mistral-embed"
     
-    def setup(self, document_paths: Dict[str, str]):
+    def setup(
+        self,
+        document_paths: Dict[str, str],
+        snapshot_path: Optional[str] = None,
+        use_snapshot: bool = True
+    ):
+        """
+        Baue Backend auf (oder lade Snapshot)
+
+        Args:
+            document_paths: Pfade zu den Korpus-Dokumenten (Keys wie in corpus_registry)
+            snapshot_path: Pfad zum Index-Snapshot (Default: <cache_dir>/index_snapshot.pkl)
+            use_snapshot: Snapshot laden/speichern (veraltete Snapshots werden neu gebaut)
+        """
         print("\n" + "="*70)
         print("🔧 SETUP VERSION 3.0 - MIT QUERY PREPROCESSING")
         print("="*70)
         
+        snapshot_path = snapshot_path or os.path.join(self.cache_dir, "index_snapshot.pkl")
+        self.snapshot_path = snapshot_path if use_snapshot else None
+        
         try:
+            # 0. Warm Start aus Snapshot
+            if use_snapshot and self.load_snapshot(snapshot_path, document_paths):
+                return
+            
             # 1. Dokumente laden
             print("\n📚 LADE ALLE DOKUMENTE...")
             self.all_chunks = self._load_all_documents(document_paths)
@@ -1029,6 +3576,8 @@ class RAGBackend:
             print("\n🔧 ERSTELLE ENHANCED TRIPLE PIPELINE...")
             self._create_triple_pipeline()
             
+            self.document_fingerprints = compute_document_fingerprints(document_paths)
+            self.source_fingerprint = compute_source_fingerprint(document_paths, self.document_fingerprints)
             self.initialized = True
             print("\n✅ SETUP ABGESCHLOSSEN (v3.0)!")
             print("   🔄 Query Preprocessing: AKTIV")
@@ -1036,240 +3585,190 @@ class RAGBackend:
             print("   🟢 Keyword Pipeline: ENHANCED")
             print("   🟡 Definition Pipeline: AKTIV")
             
+            # 5. Snapshot für den nächsten Start
+            if use_snapshot:
+                self.save_snapshot(snapshot_path)
+            
         except Exception as e:
             print(f"\n❌ FEHLER: {e}")
             raise
     
     def _load_all_documents(self, paths: Dict[str, str]) -> List[Document]:
-        """Load all documents - aus v2.0"""
-        all_chunks = []
-        
-        # KI-VO Corpus
-        try:
-            print("\n🔵 KI-VERORDNUNG:")
-            print("   1/7 Corpus...")
-            loader = Docx2txtLoader(paths['ki_vo_corpus'])
-            pages = loader.load()
-            headers = [("#", "Kapitel"), ("##", "Abschnitt"), ("###", "Artikel")]
-            splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers, strip_headers=False)
-            chunks = splitter.split_text(pages[0].page_content)
-            
-            for chunk in chunks:
-                chunk.metadata['source_type'] = 'Corpus'
-                chunk.metadata['source_law'] = 'KI-Verordnung'
-            
-            all_chunks.extend(chunks)
-            print(f"      ✅ {len(chunks)} Chunks")
-        except Exception as e:
-            print(f"      ❌ Fehler: {e}")
+        """Lade alle Korpora aus der Registry (Chunks in Registry-Reihenfolge)"""
+        self.corpus_chunks = self._parse_corpora(self.corpus_registry, paths)
+        return self._merge_corpora()
+    
+    def _merge_corpora(self) -> List[Document]:
+        return [
+            chunk
+            for spec in self.corpus_registry
+            for chunk in self.corpus_chunks.get(spec.key, [])
+        ]
+    
+    def _parse_corpora(self, specs: Tuple[CorpusSpec, ...], paths: Dict[str, str]) -> Dict[str, List[Document]]:
+        """
+        Parse Korpora parallel (Prozess-Pool)
+        - Größte Dateien zuerst → Wall-Time ≈ größtes Dokument statt Summe
+        - Fehlerhafte Korpora fehlen im Ergebnis
+        """
+        workers = min(len(specs), self.ingest_workers or os.cpu_count() or 1)
         
-        # KI-VO Anhänge
-        try:
-            print("   2/7 Anhänge...")
-            loader = Docx2txtLoader(paths['ki_vo_anhaenge'])
-            pages = loader.load()
-            headers = [("#", "Anhang"), ("##", "Abschnitt")]
-            splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers, strip_headers=False)
-            chunks = splitter.split_text(pages[0].page_content)
-            
-            for chunk in chunks:
-                chunk.metadata['source_type'] = 'Anhang'
-                chunk.metadata['source_law'] = 'KI-Verordnung'
-            
-            all_chunks.extend(chunks)
-            print(f"      ✅ {len(chunks)} Chunks")
-        except Exception as e:
-            print(f"      ❌ Fehler: {e}")
+        def file_size(spec: CorpusSpec) -> int:
+            path = paths.get(spec.key)
+            return os.path.getsize(path) if path and os.path.exists(path) else 0
         
-        # KI-VO EWG
-        try:
-            print("   3/7 Erwägungsgründe...")
-            loader = Docx2txtLoader(paths['ki_vo_ewg'])
-            pages = loader.load()
-            headers = [("#", "Erwägungsgrund")]
-            splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers, strip_headers=False)
-            chunks = splitter.split_text(pages[0].page_content)
-            
-            for chunk in chunks:
-                chunk.metadata['source_type'] = 'Erwägungsgründe'
-                chunk.metadata['source_law'] = 'KI-Verordnung'
-                
-                ewg_match = re.search(r'Erwägungsgrund\s+(\d+)', chunk.page_content, re.IGNORECASE)
-                if not ewg_match:
-                    ewg_match = re.search(r'#\s*\((\d+)\)', chunk.page_content)
-                
-                if ewg_match:
-                    chunk.metadata['ewg_nummer'] = ewg_match.group(1)
-                    chunk.metadata['artikel'] = f"EWG {ewg_match.group(1)}"
-            
-            all_chunks.extend(chunks)
-            print(f"      ✅ {len(chunks)} Chunks")
-        except Exception as e:
-            print(f"      ❌ Fehler: {e}")
+        start_time = time.time()
         
-        # KI-VO Begriffe
-        try:
-            print("   4/7 Begriffsbestimmungen...")
-            loader = Docx2txtLoader(paths['ki_vo_begriffe'])
-            pages = loader.load()
-            headers = [("###", "Begriff")]
-            splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers, strip_headers=False)
-            chunks = splitter.split_text(pages[0].page_content)
-            
-            for chunk in chunks:
-                chunk.metadata['source_type'] = 'Begriffsbestimmungen'
-                chunk.metadata['source_law'] = 'KI-Verordnung'
-                chunk.metadata['artikel'] = 'Artikel 3'
-            
-            all_chunks.extend(chunks)
-            print(f"      ✅ {len(chunks)} Chunks")
-        except Exception as e:
-            print(f"      ❌ Fehler: {e}")
+        if workers > 1:
+            # spawn statt fork: sicher auch aus Streamlits Multi-Thread-Prozess
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {
+                    spec.key: pool.submit(load_corpus, spec, paths.get(spec.key))
+                    for spec in sorted(specs, key=file_size, reverse=True)
+                }
+                results = [futures[spec.key].result() for spec in specs]
+        else:
+            results = [load_corpus(spec, paths.get(spec.key)) for spec in specs]
         
-        # DSGVO Corpus
-        try:
-            print("\n🟢 DSGVO:")
-            print("   5/7 Corpus...")
-            loader = Docx2txtLoader(paths['dsgvo_corpus'])
-            pages = loader.load()
-            headers = [("#", "Kapitel"), ("##", "Abschnitt"), ("###", "Artikel")]
-            splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers, strip_headers=False)
-            chunks = splitter.split_text(pages[0].page_content)
-            
-            for chunk in chunks:
-                chunk.metadata['source_type'] = 'Corpus'
-                chunk.metadata['source_law'] = 'DSGVO'
-            
-            all_chunks.extend(chunks)
-            print(f"      ✅ {len(chunks)} Chunks")
-        except Exception as e:
-            print(f"      ❌ Fehler: {e}")
+        corpus_chunks = {}
+        current_law = None
         
-        # DSGVO EWG
-        try:
-            print("   6/7 Erwägungsgründe...")
-            loader = Docx2txtLoader(paths['dsgvo_ewg'])
-            pages = loader.load()
-            headers = [("#", "Erwägungsgrund")]
-            splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers, strip_headers=False)
-            chunks = splitter.split_text(pages[0].page_content)
+        for i, (spec, (chunks, error)) in enumerate(zip(specs, results), 1):
+            if spec.law != current_law:
+                current_law = spec.law
+                print(f"\n📖 {spec.law.upper()}:")
             
-            for chunk in chunks:
-                chunk.metadata['source_type'] = 'Erwägungsgründe'
-                chunk.metadata['source_law'] = 'DSGVO'
-                
-                ewg_match = re.search(r'Erwägungsgrund\s+(\d+)', chunk.page_content, re.IGNORECASE)
-                if not ewg_match:
-                    ewg_match = re.search(r'#\s*\((\d+)\)', chunk.page_content)
-                if not ewg_match:
-                    ewg_match = re.search(r'^\((\d+)\)', chunk.page_content, re.MULTILINE)
-                
-                if ewg_match:
-                    chunk.metadata['ewg_nummer'] = ewg_match.group(1)
-                    chunk.metadata['artikel'] = f"EWG {ewg_match.group(1)}"
+            print(f"   {i}/{len(specs)} {spec.label}...")
+            if error:
+                print(f"      ❌ Fehler: {error}")
+                continue
             
-            all_chunks.extend(chunks)
+            corpus_chunks[spec.key] = chunks
             print(f"      ✅ {len(chunks)} Chunks")
-        except Exception as e:
-            print(f"      ❌ Fehler: {e}")
         
-        # DSGVO Begriffe
-        try:
-            print("   7/7 Begriffsbestimmungen...")
-            loader = Docx2txtLoader(paths['dsgvo_begriffe'])
-            pages = loader.load()
-            headers = [("###", "Begriff")]
-            splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers, strip_headers=False)
-            chunks = splitter.split_text(pages[0].page_content)
-            
-            for chunk in chunks:
-                chunk.metadata['source_type'] = 'Begriffsbestimmungen'
-                chunk.metadata['source_law'] = 'DSGVO'
-                chunk.metadata['artikel'] = 'Artikel 4'
-            
-            all_chunks.extend(chunks)
-            print(f"      ✅ {len(chunks)} Chunks")
-        except Exception as e:
-            print(f"      ❌ Fehler: {e}")
+        elapsed = time.time() - start_time
+        print(f"   ⏱️ Parsing in {elapsed:.1f}s ({workers} Prozesse)")
         
-        return all_chunks
+        return corpus_chunks
     
     def _initialize_models(self):
         """Initialize AI models"""
-        self.embeddings = MistralAIEmbeddings(
-            model="mistral-embed",
-            mistral_api_key=self.mistral_api_key
-        )
-        
-        self.llm = ChatMistralAI(
-            model="mistral-small-latest",
-            temperature=0,
-            mistral_api_key=self.mistral_api_key,
-            timeout=120,
-        )
-        
+        if self._base_embeddings is not None:
+            base_embeddings = self._base_embeddings
+            model_name = getattr(base_embeddings, 'model', None) or type(base_embeddings).__name__
+        else:
+            base_embeddings = MistralAIEmbeddings(
+                model=self.EMBEDDING_MODEL,
+                mistral_api_key=self.mistral_api_key
+            )
+            # ✅ 429/5xx als HTTPStatusError sichtbar machen (Basis für Retries)
+            base_embeddings.client.event_hooks['response'].append(raise_for_status)
+            base_embeddings.async_client.event_hooks['response'].append(araise_for_status)
+            model_name = self.EMBEDDING_MODEL
+
+        # ✅ Embeddings immer über den Disk-Cache, Index-Aufbau gebatcht mit Retries
+        cache_store = EmbeddingCacheStore(os.path.join(self.cache_dir, "embeddings.sqlite3"))
+        batcher = BatchEmbedder(base_embeddings, max_concurrency=self.embedding_concurrency)
+        self.embeddings = CachedEmbeddings(base_embeddings, cache_store, model_name, batcher)
+
+        if self._base_llm is not None:
+            self.llm = self._base_llm
+        else:
+            self.llm = ChatMistralAI(
+                model="mistral-small-latest",
+                temperature=0,
+                mistral_api_key=self.mistral_api_key,
+                timeout=120,
+            )
+
         print("   ✅ Models bereit")
     
-    def _create_vectorstore(self):
-        """Create vector database"""
+    def _create_vectorstore(self, vectors: Optional[List[List[float]]] = None):
+        """Create vector database (Vektoren optional aus Snapshot)"""
         if not self.all_chunks:
             raise ValueError("all_chunks ist leer!")
         
-        self.qdrant_client = QdrantClient(":memory:")
+        start_time = time.time()
         
-        self.qdrant_client.create_collection(
-            collection_name=self.COLLECTION_NAME,
-            vectors_config=VectorParams(size=1024, distance=Distance.COSINE)
-        )
+        # ✅ Ein persistenter Client für alles (Vectorstore, Stats, Definitions-Retriever)
+        if self.qdrant_client is None:
+            self.qdrant_client = self._open_qdrant_client()
         
-        print(f"   📥 Indexiere {len(self.all_chunks)} Chunks...")
+        point_ids = compute_point_ids(self.all_chunks, self.embeddings.model_name)
+        sync = CollectionSync(self.qdrant_client, self.COLLECTION_NAME, self.all_chunks, point_ids)
         
-        start_time = time.time()
+        if vectors is None:
+            print(f"   📥 Indexiere {len(self.all_chunks)} Chunks...")
+            # Upsert in Qdrant sobald ein Batch fertig ist
+            vectors = self.embeddings.embed_documents(
+                [chunk.page_content for chunk in self.all_chunks],
+                on_batch=sync.upsert
+            )
+            
+            cache_stats = self.embeddings.get_stats()
+            print(f"   💾 Embedding-Cache: {cache_stats['hits']} Treffer, {cache_stats['misses']} neu eingebettet, "
+                  f"{cache_stats['duplicates']} Duplikate ({cache_stats['batching']['batches']} Batches, {cache_stats['batching']['retries']} Retries)")
+        else:
+            sync.upsert(list(range(len(vectors))), vectors)
         
-        self.vectorstore = Qdrant.from_documents(
-            self.all_chunks,
-            self.embeddings,
-            location=":memory:",
-            collection_name=self.COLLECTION_NAME
+        sync.finish()
+        self.chunk_vectors = vectors
+        self.point_ids = point_ids
+        
+        self.vectorstore = Qdrant(
+            client=self.qdrant_client,
+            collection_name=self.COLLECTION_NAME,
+            embeddings=self.embeddings
         )
         
         elapsed = time.time() - start_time
         print(f"   ✅ Indexierung in {elapsed:.1f}s")
     
-    def _create_triple_pipeline(self):
-        """Create enhanced triple pipeline with preprocessing"""
-        
-        # Extract defined terms
-        def extract_defined_terms(chunks: List[Document]) -> List[str]:
-            terms = []
-            for chunk in chunks:
-                matches = re.finditer(r'###\s*(\d+)\.\s*(.+?)(?:\n|$)', chunk.page_content)
-                for match in matches:
-                    term = match.group(2).strip()
-                    term = term.strip('"\'„"')
-                    term = term.lower()
-                    terms.append(term)
-            return sorted(list(set(terms)))
-        
-        defs_ki_vo = [c for c in self.all_chunks if c.metadata.get('source_law') == 'KI-Verordnung' 
-                      and c.metadata.get('source_type') == 'Begriffsbestimmungen']
-        defs_dsgvo = [c for c in self.all_chunks if c.metadata.get('source_law') == 'DSGVO' 
-                      and c.metadata.get('source_type') == 'Begriffsbestimmungen']
-        
-        DEFINED_TERMS_KI_VO = extract_defined_terms(defs_ki_vo)
-        DEFINED_TERMS_DSGVO = extract_defined_terms(defs_dsgvo)
+    def _open_qdrant_client(self) -> QdrantClient:
+        """Lokaler Qdrant im Embedded-Modus (kein Server), persistent unter qdrant_path"""
+        if self.qdrant_path == ":memory:":
+            return QdrantClient(":memory:")
+        
+        os.makedirs(self.qdrant_path, exist_ok=True)
+        return QdrantClient(path=self.qdrant_path)
+    
+    def _extract_defined_terms(self, chunks: List[Document]) -> List[str]:
+        """Extract defined terms aus Begriffsbestimmungen"""
+        terms = []
+        for chunk in chunks:
+            matches = re.finditer(r'###\s*(\d+)\.\s*(.+?)(?:\n|$)', chunk.page_content)
+            for match in matches:
+                term = match.group(2).strip()
+                term = term.strip('"\'„"')
+                term = term.lower()
+                terms.append(term)
+        return sorted(list(set(terms)))
+    
+    def _create_triple_pipeline(self, prebuilt: Optional[Dict[str, Any]] = None):
+        """
+        Create enhanced triple pipeline with preprocessing
+        
+        Args:
+            prebuilt: Bereits gebaute Indizes aus Snapshot
+                      (defined_terms_ki_vo, defined_terms_dsgvo, metadata_index, definitions_index)
+        """
+        
+        if prebuilt:
+            DEFINED_TERMS_KI_VO = prebuilt['defined_terms_ki_vo']
+            DEFINED_TERMS_DSGVO = prebuilt['defined_terms_dsgvo']
+        else:
+            defs_ki_vo = [c for c in self.all_chunks if c.metadata.get('source_law') == 'KI-Verordnung' 
+                          and c.metadata.get('source_type') == 'Begriffsbestimmungen']
+            defs_dsgvo = [c for c in self.all_chunks if c.metadata.get('source_law') == 'DSGVO' 
+                          and c.metadata.get('source_type') == 'Begriffsbestimmungen']
+            
+            DEFINED_TERMS_KI_VO = self._extract_defined_terms(defs_ki_vo)
+            DEFINED_TERMS_DSGVO = self._extract_defined_terms(defs_dsgvo)
         
         print(f"   🔵 KI-VO: {len(DEFINED_TERMS_KI_VO)} Begriffe")
         print(f"   🟢 DSGVO: {len(DEFINED_TERMS_DSGVO)} Begriffe")
         
-        # Memory
-        conversation_memory = ConversationBufferWindowMemory(
-            k=5,
-            memory_key="chat_history",
-            return_messages=True,
-            output_key="answer"
-        )
-        
         semantic_template = """Du bist ein Compliance-Assistent für die EU KI-Verordnung und DSGVO.
 
 Beantworte die Frage natürlich und verständlich. Nutze die bereitgestellten Dokumente und beziehe dich bei Bedarf auf vorherige Fragen aus der Konversation.
@@ -1299,28 +3798,47 @@ ANTWORT:
             template=semantic_template
         )
         
-        qa_chain = ConversationalRetrievalChain.from_llm(
-            llm=self.llm,
-            retriever=self.vectorstore.as_retriever(search_kwargs={"k": 3}),
-            memory=conversation_memory,
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": QA_PROMPT},
-            verbose=False
-        )
+        # ✅ NEU IN V3.1: BM25 über alle Chunks (in-memory, bei jedem Pipeline-Aufbau neu)
+        sparse_index = None
+        if self.hybrid_retrieval:
+            sparse_index = BM25Index(self.all_chunks)
+            print(f"   🔤 BM25-Index: {sparse_index.get_stats()['vocabulary']} Tokens in {sparse_index.build_time * 1000:.0f}ms")
+        
+        # ✅ NEU IN V3.1: Over-Fetch + Reranking vor dem Prompt
+        reranker = None
+        if self.rerank_candidates > 0:
+            reranker = Reranker(
+                scorer=self.rerank_scorer or LexicalScorer(sparse_index),
+                candidates=self.rerank_candidates
+            )
         
-        # ✅ Enhanced Router with Preprocessing
-        advanced_router = AdvancedQueryRouter(DEFINED_TERMS_KI_VO, DEFINED_TERMS_DSGVO)
+        retriever = HybridRetriever(vectorstore=self.vectorstore, sparse_index=sparse_index, reranker=reranker, k=3)
+        
+        # ✅ NEU IN V3.1: Ein Chunk-Store für alle Indizes (Indizes halten nur Chunk-IDs)
+        chunk_store = ChunkStore(self.all_chunks)
         
         # Keyword Retriever
-        keyword_retriever = KeywordMetadataRetriever(self.vectorstore, self.all_chunks)
+        keyword_retriever = KeywordMetadataRetriever(
+            self.vectorstore,
+            chunk_store,
+            metadata_index=prebuilt['metadata_index'] if prebuilt else None
+        )
         
         # Definitions Retriever
         definitions_retriever = DefinitionsRetriever(
             self.vectorstore,
             self.qdrant_client,
             self.COLLECTION_NAME,
-            self.all_chunks,
-            self.embeddings
+            chunk_store,
+            self.embeddings,
+            definitions_index=prebuilt['definitions_index'] if prebuilt else None
+        )
+        
+        # ✅ Enhanced Router with Preprocessing (teilt den Term-Index des Definitions Retrievers)
+        advanced_router = AdvancedQueryRouter(
+            DEFINED_TERMS_KI_VO,
+            DEFINED_TERMS_DSGVO,
+            term_index=definitions_retriever.term_index
         )
         
         # Triple Pipeline Manager
@@ -1329,53 +3847,369 @@ ANTWORT:
             qdrant_client=self.qdrant_client,
             collection_name=self.COLLECTION_NAME,
             llm=self.llm,
-            qa_chain=qa_chain,
+            retriever=retriever,
+            semantic_prompt=QA_PROMPT,
             advanced_router=advanced_router,
             keyword_retriever=keyword_retriever,
-            definitions_retriever=definitions_retriever
+            definitions_retriever=definitions_retriever,
+            session_store=self.sessions,
+            max_concurrent_llm_calls=self.max_concurrent_llm_calls,
+            answer_cache=AnswerCache(self.answer_cache_size, self.answer_cache_ttl),
+            similar_answer_cache=self._create_similar_answer_cache(),
+            context_packer=ContextPacker(self.context_budgets),
+            condense_mode=self.condense_mode,
+            latency_recorder=self.latency
         )
         
         print("   ✅ Enhanced Triple Pipeline bereit (v3.0)")
     
+    def _create_similar_answer_cache(self) -> Optional[SimilarAnswerCache]:
+        if self.similar_answer_threshold is None or self.answer_cache_size <= 0:
+            return None
+        return SimilarAnswerCache(
+            threshold=self.similar_answer_threshold,
+            max_entries=self.answer_cache_size,
+            ttl_seconds=self.answer_cache_ttl,
+            per_session=self.similar_answer_per_session
+        )
+    
+    def save_snapshot(self, path: str):
+        """
+        Speichere den kompletten Index-Zustand als versioniertes Artefakt
+        (Chunks, Vektoren, Metadata-Index, Definitions-Index, Begriffslisten)
+        """
+        if not self.initialized:
+            raise RuntimeError("Backend not initialized!")
+        
+        start_time = time.time()
+        
+        # Indizes referenzieren Chunks über ihre Chunk-IDs (in der Chunk-Metadata)
+        pipeline = self.triple_pipeline
+        metadata_index = {
+            index_type: {key: list(chunk_ids) for key, chunk_ids in sub_index.items()}
+            for index_type, sub_index in pipeline.keyword_retriever.metadata_index.items()
+        }
+        definitions_index = {
+            variant: list(chunk_ids)
+            for variant, chunk_ids in pipeline.definitions_retriever.definitions_index.items()
+        }
+        
+        state = {
+            'version': SNAPSHOT_VERSION,
+            'fingerprint': self.source_fingerprint,
+            'document_fingerprints': self.document_fingerprints,
+            'corpus_sizes': [(spec.key, len(self.corpus_chunks.get(spec.key, []))) for spec in self.corpus_registry],
+            'embedding_model': self.embeddings.model_name,
+            'chunks': [(chunk.page_content, chunk.metadata) for chunk in self.all_chunks],
+            'vectors': [array('d', vector) for vector in self.chunk_vectors],
+            'metadata_index': metadata_index,
+            'definitions_index': definitions_index,
+            'defined_terms_ki_vo': list(pipeline.router.defined_terms_ki_vo),
+            'defined_terms_dsgvo': list(pipeline.router.defined_terms_dsgvo),
+        }
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # Atomar schreiben (kein halber Snapshot bei Abbruch)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        
+        elapsed = time.time() - start_time
+        print(f"   💾 Snapshot gespeichert: {path} ({elapsed:.2f}s)")
+    
+    def load_snapshot(self, path: str, document_paths: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Lade Index-Zustand aus Snapshot (Warm Start ohne Parsing/Embedding)
+        
+        Hinweis: Snapshots sind Pickle-Dateien - nur selbst erzeugte Snapshots laden!
+        
+        Returns:
+            True wenn geladen, False wenn nicht vorhanden, veraltet oder inkompatibel
+        """
+        if not os.path.exists(path):
+            return False
+        
+        start_time = time.time()
+        
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Snapshot nicht lesbar ({e}) - baue neu")
+            return False
+        
+        if state.get('version') != SNAPSHOT_VERSION:
+            print(f"   ⚠️ Snapshot-Version {state.get('version')} != {SNAPSHOT_VERSION} - baue neu")
+            return False
+        
+        document_fingerprints = (
+            compute_document_fingerprints(document_paths) if document_paths else state['document_fingerprints']
+        )
+        if state['fingerprint'] != compute_source_fingerprint(document_paths, document_fingerprints):
+            print("   ⚠️ Quelldokumente geändert - Snapshot veraltet, baue neu")
+            return False
+        
+        if self.embeddings is None or self.llm is None:
+            self._initialize_models()
+        
+        if state['embedding_model'] != self.embeddings.model_name:
+            print(f"   ⚠️ Snapshot mit anderem Embedding-Modell ({state['embedding_model']}) - baue neu")
+            return False
+        
+        self.all_chunks = [
+            Document(page_content=content, metadata=metadata)
+            for content, metadata in state['chunks']
+        ]
+        
+        # Chunks pro Korpus (Basis für refresh)
+        self.corpus_chunks = {}
+        start = 0
+        for key, size in state['corpus_sizes']:
+            self.corpus_chunks[key] = self.all_chunks[start:start + size]
+            start += size
+        
+        self._create_vectorstore(vectors=[vector.tolist() for vector in state['vectors']])
+        self._create_triple_pipeline(prebuilt={
+            'defined_terms_ki_vo': state['defined_terms_ki_vo'],
+            'defined_terms_dsgvo': state['defined_terms_dsgvo'],
+            'metadata_index': state['metadata_index'],
+            'definitions_index': state['definitions_index'],
+        })
+        
+        self.source_fingerprint = state['fingerprint']
+        self.document_fingerprints = state['document_fingerprints']
+        self.initialized = True
+        
+        elapsed = time.time() - start_time
+        print(f"\n⚡ SNAPSHOT GELADEN: {len(self.all_chunks)} Chunks in {elapsed:.2f}s")
+        return True
+    
+    def refresh(self, document_paths: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Inkrementelles Re-Indexing geänderter Quelldokumente
+        - Nur Dokumente mit neuem Fingerprint werden neu geparst
+        - Chunk-Diff über Point-IDs: nur neue Chunks werden eingebettet/upserted, entfernte gelöscht
+        - Indizes, Begriffslisten und Router werden neu aufgebaut und die Pipeline
+          atomar getauscht → laufende Anfragen arbeiten mit den alten Indizes zu Ende
+        - Qdrant-Collection ist geteilt: neue Points werden vor dem Tausch upserted (die alte
+          Pipeline kann sie in diesem Fenster bereits finden), entfernte erst nach dem Tausch
+          gelöscht (danach fehlen noch laufenden alten Anfragen höchstens entfernte Chunks)
+        
+        Returns:
+            {'changed': [...], 'added': int, 'removed': int, 'elapsed': float}
+        """
+        if not self.initialized:
+            raise RuntimeError("Backend not initialized!")
+        
+        with self._refresh_lock:
+            start_time = time.time()
+            
+            document_fingerprints = compute_document_fingerprints(document_paths)
+            changed = [
+                spec for spec in self.corpus_registry
+                if document_fingerprints.get(spec.key) != self.document_fingerprints.get(spec.key)
+            ]
+            
+            if not changed:
+                print("   ✅ Keine geänderten Dokumente")
+                return {'changed': [], 'added': 0, 'removed': 0, 'elapsed': time.time() - start_time}
+            
+            print(f"\n🔄 REFRESH: {', '.join(f'{spec.law} {spec.label}' for spec in changed)}")
+            
+            # 1. Nur geänderte Korpora neu parsen (bei Fehler alten Stand behalten)
+            parsed = self._parse_corpora(tuple(changed), document_paths)
+            for spec in changed:
+                if spec.key not in parsed:
+                    document_fingerprints[spec.key] = self.document_fingerprints.get(spec.key)
+            
+            corpus_chunks = {**self.corpus_chunks, **parsed}
+            all_chunks = [
+                chunk
+                for spec in self.corpus_registry
+                for chunk in corpus_chunks.get(spec.key, [])
+            ]
+            
+            # 2. Chunk-Diff: Vektoren unveränderter Chunks wiederverwenden
+            point_ids = compute_point_ids(all_chunks, self.embeddings.model_name)
+            known_vectors = dict(zip(self.point_ids, self.chunk_vectors))
+            missing = [i for i, point_id in enumerate(point_ids) if point_id not in known_vectors]
+            
+            sync = CollectionSync(self.qdrant_client, self.COLLECTION_NAME, all_chunks, point_ids)
+            new_vectors = self.embeddings.embed_documents(
+                [all_chunks[i].page_content for i in missing],
+                on_batch=lambda batch, vectors: sync.upsert([missing[j] for j in batch], vectors)
+            )
+            vectors = [known_vectors.get(point_id) for point_id in point_ids]
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+            
+            removed = len(set(self.point_ids) - set(point_ids))
+            
+            # 3. Zustand übernehmen und Pipeline neu bauen (Tausch ist eine Zuweisung)
+            self.corpus_chunks = corpus_chunks
+            self.all_chunks = all_chunks
+            self.chunk_vectors = vectors
+            self.point_ids = point_ids
+            self.document_fingerprints = document_fingerprints
+            self.source_fingerprint = compute_source_fingerprint(document_paths, document_fingerprints)
+            
+            self._create_triple_pipeline()
+            
+            # Entfernte Points erst nach dem Tausch löschen → neue Anfragen brauchen sie nicht mehr
+            sync.finish()
+            
+            if self.snapshot_path:
+                self.save_snapshot(self.snapshot_path)
+            
+            elapsed = time.time() - start_time
+            print(f"   ✅ Refresh in {elapsed:.1f}s: {len(missing)} neu, {removed} entfernt")
+            
+            return {
+                'changed': [spec.key for spec in changed],
+                'added': len(missing),
+                'removed': removed,
+                'elapsed': elapsed
+            }
+    
     def query(
         self,
         question: str,
         filter_law: Optional[str] = None,
-        show_sources: bool = False
+        show_sources: bool = False,
+        session_id: str = DEFAULT_SESSION_ID
     ) -> Dict[str, Any]:
-        """Query the system"""
+        """Query the system (Konversation pro session_id)"""
         if not self.initialized:
             raise RuntimeError("Backend not initialized!")
         
-        result = self.triple_pipeline.process_query(question, filter_law)
+        result = self.triple_pipeline.process_query(question, filter_law, session_id=session_id)
+        return self._format_response(result, show_sources)
+    
+    async def aquery(
+        self,
+        question: str,
+        filter_law: Optional[str] = None,
+        show_sources: bool = False,
+        session_id: str = DEFAULT_SESSION_ID
+    ) -> Dict[str, Any]:
+        """Async query (viele Anfragen parallel auf einem Event-Loop)"""
+        if not self.initialized:
+            raise RuntimeError("Backend not initialized!")
+        
+        result = await self.triple_pipeline.aprocess_query(question, filter_law, session_id=session_id)
+        return self._format_response(result, show_sources)
+    
+    def stream_query(
+        self,
+        question: str,
+        filter_law: Optional[str] = None,
+        show_sources: bool = False,
+        session_id: str = DEFAULT_SESSION_ID
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the answer token by token
+        
+        Yields:
+            {'type': 'token', 'content': str} - sobald das LLM Tokens liefert
+            {'type': 'final', 'answer', 'sources', 'pipeline_used', 'prompt_tokens', 'llm_calls', 'trace', 'timestamp',
+             'time_to_first_token', 'total_latency'} - genau einmal am Ende
+        """
+        if not self.initialized:
+            raise RuntimeError("Backend not initialized!")
         
+        start_time = time.perf_counter()
+        time_to_first_token = None
+        
+        # Bricht der Aufrufer ab (close(), Streamlit-Rerun), wird der Pipeline-Stream sofort geschlossen
+        with closing(self.triple_pipeline.stream_query(question, filter_law, session_id=session_id)) as events:
+            for event in events:
+                if event['type'] == 'token':
+                    if time_to_first_token is None:
+                        time_to_first_token = time.perf_counter() - start_time
+                    yield event
+                    continue
+                
+                total_latency = time.perf_counter() - start_time
+                if time_to_first_token is None:
+                    time_to_first_token = total_latency
+                
+                logger.info(f"⏱️ Time-to-first-token: {time_to_first_token:.2f}s | Gesamt: {total_latency:.2f}s")
+                
+                response = self._format_response(event, show_sources)
+                response['time_to_first_token'] = time_to_first_token
+                response['total_latency'] = total_latency
+                yield {'type': 'final', **response}
+    
+    def _format_response(self, result: Dict[str, Any], show_sources: bool) -> Dict[str, Any]:
         return {
             'answer': result.get('result', ''),
             'sources': result.get('source_documents', []) if show_sources else [],
             'pipeline_used': result.get('pipeline_used', 'unknown'),
+            'cache_hit': result.get('cache_hit', False),
+            'prompt_tokens': result.get('prompt_tokens', 0),
+            'llm_calls': result.get('llm_calls', 0),
+            'trace': result.get('trace', {}),
             'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")
         }
     
-    def clear_memory(self):
+    def clear_memory(self, session_id: str = DEFAULT_SESSION_ID):
         """Clear conversation memory"""
         if self.triple_pipeline:
-            self.triple_pipeline.clear_memory()
+            self.triple_pipeline.clear_memory(session_id)
     
-    def get_memory_stats(self) -> Dict[str, Any]:
+    def get_memory_stats(self, session_id: str = DEFAULT_SESSION_ID) -> Dict[str, Any]:
         """Get memory statistics"""
         if self.triple_pipeline:
-            return self.triple_pipeline.get_memory_stats()
+            return self.triple_pipeline.get_memory_stats(session_id)
         return {}
     
     def get_vectordb_stats(self) -> Dict[str, Any]:
         """Get vector database statistics"""
         if self.qdrant_client:
             info = self.qdrant_client.get_collection(self.COLLECTION_NAME)
-            return {
+            stats = {
                 'collection': self.COLLECTION_NAME,
-                'vectors_count': info.vectors_count,
-                'status': info.status
+                'vectors_count': info.points_count,
+                'status': info.status,
+                'path': self.qdrant_path
             }
+            retriever = self.triple_pipeline.retriever if self.triple_pipeline else None
+            if retriever is not None and retriever.sparse_index is not None:
+                stats['bm25'] = retriever.sparse_index.get_stats()
+            if retriever is not None and retriever.reranker is not None:
+                stats['rerank'] = retriever.reranker.get_stats()
+            return stats
+        return {}
+
+    def get_answer_cache_stats(self) -> Dict[str, Any]:
+        """Get answer cache statistics (Treffer/Fehlschläge/Bypass)"""
+        if self.triple_pipeline:
+            return self.triple_pipeline.get_answer_cache_stats()
+        return {}
+
+    def get_context_stats(self) -> Dict[str, Any]:
+        """Get context packing statistics (Tokens pro Pipeline)"""
+        if self.triple_pipeline:
+            return self.triple_pipeline.get_context_stats()
+        return {}
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """Get latency histograms per pipeline and stage (p50/p95/p99 + Buckets)"""
+        return self.latency.get_stats()
+
+    def export_latency_stats(self, path: str):
+        """Schreibe die Latenz-Histogramme als JSON (z.B. für Vergleiche zwischen Deployments)"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.get_latency_stats(), f, indent=2, ensure_ascii=False)
+
+    def get_embedding_cache_stats(self) -> Dict[str, Any]:
+        """Get embedding cache statistics (Treffer/Fehlschläge)"""
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.get_stats()
         return {}
 
 